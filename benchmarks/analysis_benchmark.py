@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "github_secret_finder"))
+
+from core.analysis import PatchAnalyzer
+from core.analysis.blacklist_matcher import BlacklistMatcher
+from core.findings.finding import Finding
+from core.github.models import GithubCommit
+from core.slack import SlackFindingSender
+
+fixtures = Path(__file__).parent / "fixtures"
+default_blacklist_file = Path(__file__).parent.parent / "src" / "github_secret_finder" / "data" / "default-blacklist.json"
+huge_patch_files = 300  # The most files returned with a commit by the API.
+blacklist_sizes = [10, 100, 1000]
+finding_count = 10000
+
+
+def measure(function, number, repeat=5):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def load_patches():
+    # The huge patch repeats the small one in as many files as the API returns with a commit.
+    small_patch = (fixtures / "patches" / "small.patch").read_text()
+    huge_patch = "".join(small_patch.replace("--- ", "--- src/module%d/" % i).replace("+++ ", "+++ src/module%d/" % i) for i in range(huge_patch_files))
+    return {
+        "small": small_patch,
+        "huge": huge_patch,
+        "vendored": (fixtures / "patches" / "vendored.patch").read_text()
+    }
+
+
+def write_blacklist(directory, size):
+    # None of the rules match, so every rule is evaluated, like the user rules appended to the default blacklist.
+    rules = []
+    for i in range(size):
+        rule_type = i % 3
+        if rule_type == 0:
+            rules.append({"file": "^vendor/library%d/.*\\.min\\.js$" % i})
+        elif rule_type == 1:
+            rules.append({"secret": "^fixture-%d-[0-9a-f]{32}$" % i})
+        else:
+            rules.append({"code": "test_password_%d\\s*=" % i, "file": "\\.py$"})
+    file_name = Path(directory) / ("blacklist_%d.json" % size)
+    file_name.write_text(json.dumps(rules))
+    return str(file_name)
+
+
+def create_findings(secrets, count):
+    # The findings are grouped by commit and file, like the unsent findings read from the database.
+    findings = []
+    commit_index = 0
+    while len(findings) < count:
+        sha = "%040x" % commit_index
+        commit = GithubCommit(sha, "https://api.github.com/repos/acme/payments-api/commits/" + sha, "https://github.com/acme/payments-api/commit/" + sha, None)
+        findings.extend(Finding(commit, s) for s in secrets)
+        commit_index += 1
+    return findings[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the analysis of patches and the formatting of the findings.')
+    parser.add_argument('--number', '-n', action='store', dest='number', type=int, default=1, help='Number of runs of the slowest measures per repeat. Defaults to 1.')
+    parser.add_argument('--output', '-o', action='store', dest='output', default=None, help='JSON file in which the results are written.')
+    args = parser.parse_args()
+
+    results = {"patches": {}, "blacklists": {}, "findings": {}}
+    patch_analyzer = PatchAnalyzer(str(default_blacklist_file))
+    patches = load_patches()
+    for name, patch in patches.items():
+        secret_count = len(list(patch_analyzer.find_secrets(patch)))
+        seconds = measure(lambda: list(patch_analyzer.find_secrets(patch)), args.number, repeat=3)
+        results["patches"][name] = {"size": len(patch), "secrets": secret_count, "find_secrets": seconds}
+        print("%-8s patch (%4d KB, %3d secrets)  %8.1f ms" % (name, len(patch) // 1000, secret_count, seconds * 1e3))
+
+    # The blacklist is evaluated for each secret found, with the line, file and value of the secret.
+    secrets = list(PatchAnalyzer(None).find_secrets(patches["small"]))
+    candidates = [(s.line, s.file_name, s.value) for s in secrets]
+    with tempfile.TemporaryDirectory() as directory:
+        blacklists = [("default", str(default_blacklist_file))] + [(str(size), write_blacklist(directory, size)) for size in blacklist_sizes]
+        for name, blacklist_file in blacklists:
+            matcher = BlacklistMatcher(blacklist_file)
+            rule_count = len(json.loads(Path(blacklist_file).read_text()))
+            seconds = measure(lambda: [matcher.is_blacklisted(*c) for c in candidates], args.number * 100) / len(candidates)
+            results["blacklists"][name] = {"rules": rule_count, "is_blacklisted": seconds}
+            print("%-8s blacklist (%4d rules)          %8.1f µs per secret" % (name, rule_count, seconds * 1e6))
+
+    findings = create_findings(secrets, finding_count)
+    sender = SlackFindingSender(None, None)
+    message_count = len(list(sender._findings_to_messages(findings)))
+    results["findings"] = {
+        "count": len(findings),
+        "messages": message_count,
+        "to_slack_string": measure(lambda: [f.secret.to_slack_string() for f in findings], args.number) / len(findings),
+        "findings_to_messages": measure(lambda: list(sender._findings_to_messages(findings)), args.number)
+    }
+    print("%d findings in %d messages" % (len(findings), message_count))
+    print("  %-20s %8.1f µs per finding" % ("to_slack_string", results["findings"]["to_slack_string"] * 1e6))
+    print("  %-20s %8.1f ms" % ("findings_to_messages", results["findings"]["findings_to_messages"] * 1e3))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
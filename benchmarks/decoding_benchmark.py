@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "github_secret_finder"))
+
+from core.github.models import BaseGithubCommit, GithubCommit, GithubCommitWithUsers
+from core.util import fast_json
+
+fixtures = Path(__file__).parent / "fixtures"
+items_per_page = 100
+
+
+def load_page(file_name, items_selector):
+    # The recorded pages are repeated to the size of a page returned by the API.
+    page = json.loads((fixtures / file_name).read_text())
+    items = items_selector(page)
+    items = (items * (items_per_page // len(items) + 1))[:items_per_page]
+    if isinstance(page, dict):
+        page = dict(page, items=items)
+    else:
+        page = items
+    return json.dumps(page).encode("utf-8")
+
+
+def parse_date_with_strptime(s):
+    # The parser used before the fast path.
+    try:
+        if len(s) >= 25:
+            return datetime.strptime(s[:19], "%Y-%m-%dT%H:%M:%S") + (1 if s[19] == '-' else -1) * timedelta(hours=int(s[20:22]), minutes=int(s[23:25]))
+        else:
+            return datetime.strptime(s, "%Y-%m-%dT%H:%M:%SZ")
+    except ValueError:
+        return datetime.min
+
+
+def measure(function, number):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the decoding of commit pages.')
+    parser.add_argument('--number', '-n', action='store', dest='number', type=int, default=200, help='Number of pages decoded per measure. Defaults to 200.')
+    parser.add_argument('--output', '-o', action='store', dest='output', default=None, help='JSON file in which the results are written.')
+    args = parser.parse_args()
+
+    pages = [("commits", load_page("commits_page.json", lambda p: p), lambda p: p),
+             ("search", load_page("search_commits_page.json", lambda p: p["items"]), lambda p: p["items"])]
+
+    results = {"fast_json_parser": fast_json.orjson is not None, "items_per_page": items_per_page, "pages": {}}
+    for name, content, items_selector in pages:
+        items = items_selector(json.loads(content))
+        dates = [i["commit"]["committer"]["date"] for i in items]
+        measures = {
+            "json": measure(lambda: json.loads(content), args.number),
+            "fast_json": measure(lambda: fast_json.loads(content), args.number),
+            "strptime_dates": measure(lambda: [parse_date_with_strptime(d) for d in dates], args.number),
+            "fast_dates": measure(lambda: [BaseGithubCommit._parse_date(d) for d in dates], args.number),
+            "commits": measure(lambda: [GithubCommit.from_json(i) for i in items], args.number),
+            "commits_with_users": measure(lambda: [GithubCommitWithUsers.from_json(i) for i in items], args.number),
+            "page": measure(lambda: [GithubCommit.from_json(i) for i in items_selector(fast_json.loads(content))], args.number)
+        }
+        results["pages"][name] = measures
+
+        print("%s page (%d commits, %d KB)" % (name, len(items), len(content) // 1000))
+        for measure_name, seconds in measures.items():
+            print("  %-20s %8.1f µs" % (measure_name, seconds * 1e6))
+
+    if not results["fast_json_parser"]:
+        print("orjson is not installed. fast_json uses the json module.")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+
+import argparse
+import email.utils
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+from recorded_transport import RecordedTransport
+
+GITHUB_API_URL = "https://api.github.com"
+max_search_results = 1000  # The search API does not return the results after the first 1000.
+max_compare_commits = 250  # The commits returned by an unpaginated comparison.
+
+_words = ["payments", "storefront", "billing", "auth", "search", "inventory", "notifications", "reporting", "gateway", "mobile", "infra", "data"]
+_first_names = ["Dana", "Rafael", "Mei", "Sam", "Priya", "Jonas", "Amara", "Luis", "Ingrid", "Kenji", "Noor", "Tomasz"]
+_last_names = ["Whitfield", "Ortiz", "Tanaka", "Okafor", "Raman", "Berg", "Diallo", "Moreno", "Larsen", "Sato", "Haddad", "Nowak"]
+
+# The patches are shaped like the ones of real commits, with correct hunk headers. Some of them contain secrets.
+_patch_templates = [
+    ("src/{module}/handlers.py", "\n".join([
+        "@@ -20,6 +20,9 @@ def handle(event):",
+        "     payload = event[\"payload\"]",
+        "     if not payload:",
+        "         return None",
+        "+    # Retry the delivery before giving up.",
+        "+    if event.get(\"attempt\", 0) < {number}:",
+        "+        return schedule_retry(event)",
+        "     return process(payload)",
+        " ",
+        " "])),
+    ("CHANGELOG.md", "\n".join([
+        "@@ -1,4 +1,7 @@",
+        " # Changelog",
+        " ",
+        "+## {number}.0.0",
+        "+- {message}",
+        "+",
+        " ## 1.0.0",
+        " - First release."])),
+]
+_secret_patch_templates = [
+    (".env.staging", "\n".join([
+        "@@ -0,0 +1,4 @@",
+        "+APP_ENV=staging",
+        "+SLACK_WEBHOOK_URL=https://hooks.slack.com/services/T{key}/B{key}/{secret:.24}",
+        "+GITHUB_TOKEN=ghp_{secret:.36}",
+        "+LOG_LEVEL=debug"])),
+    ("config/settings.py", "\n".join([
+        "@@ -12,6 +12,9 @@ DATABASES = {{",
+        "     }}",
+        " }}",
+        " ",
+        "+AWS_ACCESS_KEY_ID = \"AKIA{key}\"",
+        "+AWS_SECRET_ACCESS_KEY = \"{secret:.40}\"",
+        "+AWS_STORAGE_BUCKET_NAME = \"{module}-assets\"",
+        " CACHES = {{",
+        "     \"default\": {{",
+        "         \"BACKEND\": \"django.core.cache.backends.redis.RedisCache\","])),
+]
+
+
+class _SyntheticCommit(object):
+    __slots__ = ("sha", "repository", "date", "author", "parent", "secret", "history", "index")
+
+    def __init__(self, sha, repository, date, author, parent, secret, history, index):
+        self.sha = sha
+        self.repository = repository
+        self.date = date
+        self.author = author
+        self.parent = parent
+        self.secret = secret
+        self.history = history  # The commits of the branch on which the commit was made, up to index.
+        self.index = index
+
+
+class SyntheticOrganization(object):
+    # Generates an organization from a seed, so the same arguments always serve the same commits. Each repository has a default branch,
+    # and other branches that add commits to it. Forks share the default branch of their parent, which is outside the organization.
+    def __init__(self, name, repository_count, branch_count, commit_count, branch_commit_count, fork_rate, secret_rate, people_count, seed):
+        self.name = name
+        self._secret_rate = secret_rate
+        self._random = random.Random(seed)
+        self._seed = seed
+        self.people = [self._create_person(i) for i in range(people_count)]
+        self.repositories = {}
+        self.commits = {}
+        self._commits_by_person = defaultdict(list)
+
+        start_date = datetime(2022, 1, 1)
+        for i in range(repository_count):
+            short_name = "%s-%d" % (_words[i % len(_words)], i)
+            repository_commit_count = max(1, int(commit_count * self._random.uniform(0.5, 1.5)))
+            date = start_date + timedelta(days=i)
+            if self._random.random() < fork_rate:
+                parent = self._add_repository("upstream-%s/%s" % (name, short_name), None, [], repository_commit_count, 0, date)
+                self._add_repository("%s/%s" % (name, short_name), parent, ["main"] + ["fork-%d" % b for b in range(1, branch_count)], 0, branch_commit_count, date)
+            else:
+                branches = ["main"] + ["feature/%s-%d" % (_words[(i + b) % len(_words)], b) for b in range(1, branch_count)]
+                self._add_repository("%s/%s" % (name, short_name), None, branches, repository_commit_count, branch_commit_count, date)
+
+        for commits in self._commits_by_person.values():
+            commits.sort(key=lambda c: c.date, reverse=True)
+
+    def _create_person(self, index):
+        first_name = _first_names[index % len(_first_names)]
+        last_name = _last_names[(index // len(_first_names)) % len(_last_names)]
+        login = "%s%s%d" % (first_name[0].lower(), last_name.lower(), index)
+        return {"login": login, "id": 10000 + index, "name": "%s %s" % (first_name, last_name), "email": "%s@%s.example.com" % (login, self.name)}
+
+    def _add_repository(self, name, parent, branches, commit_count, branch_commit_count, date):
+        repository = {"name": name, "parent": parent, "index": len(self.repositories), "in_organization": name.startswith(self.name + "/"), "branches": {}}
+        self.repositories[name] = repository
+        if parent is None:
+            default_history = self._add_commits(repository, "main", [], commit_count, date)
+        else:
+            default_history = parent["branches"]["main"]
+        repository["branches"]["main"] = default_history
+
+        for branch_index, branch in enumerate(branches[1:], 1):
+            branch_date = default_history[-1].date + timedelta(minutes=10 * branch_index)
+            repository["branches"][branch] = self._add_commits(repository, branch, default_history, branch_commit_count, branch_date)
+
+        repository["pushed_at"] = max(h[-1].date for h in repository["branches"].values())
+        return repository
+
+    def _add_commits(self, repository, branch, base_history, count, date):
+        history = list(base_history)
+        for i in range(count):
+            sha = hashlib.sha1(("%d/%s/%s/%d" % (self._seed, repository["name"], branch, i)).encode("utf-8")).hexdigest()
+            author = self.people[int(sha[:8], 16) % len(self.people)]
+            secret = int(sha[8:16], 16) % 10000 < self._secret_rate * 10000
+            commit = _SyntheticCommit(sha, repository, date + timedelta(hours=3 * i), author, history[-1].sha if history else None, secret, history, len(history))
+            history.append(commit)
+            self.commits[sha] = commit
+            if repository["in_organization"]:
+                self._commits_by_person[author["login"]].append(commit)
+        return history
+
+    def get_history(self, commit: _SyntheticCommit):
+        # Newest first, like the commits listed by the API.
+        return commit.history[commit.index::-1]
+
+    def find_person(self, qualifier, value):
+        field = {"author": "login", "committer": "login", "author-email": "email", "committer-email": "email", "author-name": "name", "committer-name": "name"}.get(qualifier)
+        return next((p for p in self.people if field and p[field].lower() == value.lower()), None)
+
+    def get_person_commits(self, person):
+        return self._commits_by_person.get(person["login"], [])
+
+    def get_contributors(self, repository):
+        commits = dict((c.sha, c) for h in repository["branches"].values() for c in h)
+        counts = Counter(c.author["login"] for c in commits.values())
+        people = dict((p["login"], p) for p in self.people)
+        return [(people[login], count) for login, count in counts.most_common()]
+
+
+class RateLimiter(object):
+    # Each token has its own quota for each resource, reset at the end of its window, like the primary rate limits of Github.
+    def __init__(self, limits):
+        self._limits = limits
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def take(self, token, resource):
+        limit, window = self._limits[resource]
+        with self._lock:
+            now = time.time()
+            used, reset = self._windows.get((token, resource), (0, 0))
+            if reset <= now:
+                used, reset = 0, int(now + window)
+            allowed = used < limit
+            if allowed:
+                used += 1
+            self._windows[(token, resource)] = (used, reset)
+            return limit, limit - used, reset, allowed
+
+
+class GithubStandIn(object):
+    # Serves the subset of the Github API used by github-secret-finder, from a synthetic organization or from a recorded session.
+    def __init__(self, api_url, organization: SyntheticOrganization = None, transport: RecordedTransport = None, upstream_url=GITHUB_API_URL,
+                 latency=0, latency_sigma=0.5, throttle_rate=0, retry_after=1, rate_limits=None, per_page=30):
+        self._api_url = api_url.rstrip("/")
+        self._organization = organization
+        self._transport = transport
+        self._upstream_url = upstream_url.rstrip("/")
+        self._latency = latency
+        self._latency_sigma = latency_sigma
+        self._throttle_rate = throttle_rate
+        self._retry_after = retry_after
+        self._rate_limiter = RateLimiter(rate_limits or {"core": (5000, 3600), "search": (30, 60), "graphql": (5000, 3600)})
+        self._per_page = per_page
+        self.statuses = Counter()
+        self._lock = threading.Lock()
+
+    def handle(self, method, path, body, token):
+        if self._latency > 0:
+            time.sleep(random.lognormvariate(math.log(self._latency), self._latency_sigma))
+
+        resource = "search" if path.startswith("/search/") else "graphql" if path.startswith("/graphql") else "core"
+        limit, remaining, reset, allowed = self._rate_limiter.take(token, resource)
+        headers = {"X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": str(remaining), "X-RateLimit-Reset": str(reset),
+                   "X-RateLimit-Used": str(limit - remaining), "X-RateLimit-Resource": resource}
+        if not allowed:
+            status, response_headers, content = 403, {}, self._dumps({"message": "API rate limit exceeded for this token.", "documentation_url": "https://docs.github.com/rest/rate-limit"})
+        elif random.random() < self._throttle_rate:
+            status, response_headers, content = 403, {"Retry-After": str(self._retry_after)}, self._dumps(
+                {"message": "You have exceeded a secondary rate limit. Please wait a few minutes before you try again.", "documentation_url": "https://docs.github.com/rest/rate-limit"})
+        elif self._transport is not None:
+            status, response_headers, content = self._replay(method, path, body, token)
+        else:
+            status, response_headers, content = self._serve(method, path, body)
+
+        with self._lock:
+            self.statuses[status] += 1
+        headers.update(response_headers)
+        headers["Date"] = email.utils.formatdate(usegmt=True)
+        headers.setdefault("Content-Type", "application/json; charset=utf-8")
+        return status, headers, content
+
+    def _replay(self, method, path, body, token):
+        # The recorded URLs point to the upstream API. They are rewritten, so the next pages and the commits are requested from the stand-in.
+        response = self._transport.request(method, self._upstream_url + path, json=body, headers={"Authorization": "token " + token})
+        headers = dict((h, v.replace(self._upstream_url, self._api_url)) for h, v in response.headers.items() if h in ["Link", "Content-Type", "Retry-After"])
+        return response.status_code, headers, response.content.replace(self._upstream_url.encode("utf-8"), self._api_url.encode("utf-8"))
+
+    def _serve(self, method, path, body):
+        url = urlparse(path)
+        query = dict(parse_qsl(url.query))
+        if method == "post" and url.path == "/graphql":
+            return self._graphql(body or {})
+
+        routes = [
+            (r"/orgs/([^/]+)/repos", self._get_organization_repositories),
+            (r"/repos/([^/]+/[^/]+)", self._get_repository),
+            (r"/repos/([^/]+/[^/]+)/branches", self._get_branches),
+            (r"/repos/([^/]+/[^/]+)/commits", self._get_commits),
+            (r"/repos/([^/]+/[^/]+)/commits/([0-9a-f]{40})", self._get_commit),
+            (r"/repos/([^/]+/[^/]+)/compare/(.+?)\.\.\.(.+)", self._compare),
+            (r"/repos/([^/]+/[^/]+)/contributors", self._get_contributors),
+            (r"/users/([^/]+)", self._get_user),
+            (r"/search/commits", self._search_commits),
+        ]
+        if method == "get":
+            for pattern, route in routes:
+                match = re.fullmatch(pattern, url.path)
+                if match:
+                    return route(url.path, query, *match.groups())
+        return self._not_found()
+
+    def _get_organization_repositories(self, path, query, organization):
+        if organization != self._organization.name:
+            return self._not_found()
+        repositories = [self._repository_json(r) for r in self._organization.repositories.values() if r["in_organization"]]
+        return self._paginate(path, query, repositories)
+
+    def _get_repository(self, path, query, name):
+        repository = self._organization.repositories.get(name)
+        if repository is None:
+            return self._not_found()
+        return 200, {}, self._dumps(self._repository_json(repository, with_parent=True))
+
+    def _get_branches(self, path, query, name):
+        repository = self._organization.repositories.get(name)
+        if repository is None:
+            return self._not_found()
+        branches = [{"name": b, "commit": {"sha": h[-1].sha, "url": "%s/repos/%s/commits/%s" % (self._api_url, name, h[-1].sha)}, "protected": b == "main"}
+                    for b, h in repository["branches"].items()]
+        return self._paginate(path, query, branches)
+
+    def _get_commits(self, path, query, name):
+        commit = self._organization.commits.get(query.get("sha"))
+        if name not in self._organization.repositories or commit is None:
+            return self._not_found()
+        commits = self._organization.get_history(commit)
+        if "since" in query:
+            commits = [c for c in commits if c.date >= datetime.strptime(query["since"], "%Y-%m-%dT%H:%M:%SZ")]
+        return self._paginate(path, query, commits, self._commit_json)
+
+    def _get_commit(self, path, query, name, sha):
+        commit = self._organization.commits.get(sha)
+        if commit is None:
+            return self._not_found()
+        return 200, {}, self._dumps(self._commit_json(commit, with_files=True))
+
+    def _compare(self, path, query, name, base_name, head_name):
+        # The head is "owner:branch" when a fork is compared with its parent.
+        base_repository = self._organization.repositories.get(name)
+        head_repository = base_repository
+        if ":" in head_name:
+            owner, head_name = head_name.split(":", 1)
+            head_repository = next((r for r in self._organization.repositories.values() if r["name"].startswith(owner + "/") and r["parent"] is base_repository), None)
+        if base_repository is None or head_repository is None or base_name not in base_repository["branches"] or head_name not in head_repository["branches"]:
+            return self._not_found()
+
+        base_history = base_repository["branches"][base_name]
+        base_shas = set(c.sha for c in base_history)
+        commits = [c for c in head_repository["branches"][head_name] if c.sha not in base_shas]
+        result = {"url": self._api_url + path, "status": "ahead" if commits else "identical", "ahead_by": len(commits), "behind_by": 0, "total_commits": len(commits),
+                  "base_commit": self._commit_json(base_history[-1]), "merge_base_commit": self._commit_json(base_history[-1])}
+        if "page" not in query:
+            return 200, {}, self._dumps(dict(result, commits=[self._commit_json(c) for c in commits[:max_compare_commits]]))
+
+        page_commits, links = self._get_page(path, query, commits)
+        return 200, self._get_link_header(links), self._dumps(dict(result, commits=[self._commit_json(c) for c in page_commits]))
+
+    def _get_contributors(self, path, query, name):
+        repository = self._organization.repositories.get(name)
+        if repository is None:
+            return self._not_found()
+        contributors = [dict(self._user_json(person), contributions=count) for person, count in self._organization.get_contributors(repository)]
+        return self._paginate(path, query, contributors)
+
+    def _get_user(self, path, query, login):
+        person = self._organization.find_person("author", login)
+        if person is None:
+            return self._not_found()
+        return 200, {}, self._dumps(dict(self._user_json(person), name=person["name"], email=person["email"]))
+
+    def _search_commits(self, path, query):
+        match = re.fullmatch(r'([a-z-]+):"?([^"]+)"?', query.get("q", "").strip())
+        person = self._organization.find_person(*match.groups()) if match else None
+        commits = self._organization.get_person_commits(person) if person else []
+
+        page_size = min(int(query.get("per_page", self._per_page)), 100)
+        if (int(query.get("page", 1)) - 1) * page_size >= max_search_results:
+            return 422, {}, self._dumps({"message": "Only the first %d search results are available" % max_search_results})
+        page_commits, links = self._get_page(path, query, commits[:max_search_results])
+        items = [dict(self._commit_json(c), repository=self._repository_json(c.repository), score=1.0) for c in page_commits]
+        return 200, self._get_link_header(links), self._dumps({"total_count": len(commits), "incomplete_results": False, "items": items})
+
+    def _graphql(self, body):
+        # Answers the queries made by the GraphQL client, from their variables: the repositories of an organization, the branches of a repository,
+        # or users by login.
+        variables = body.get("variables") or {}
+        if "organization" in variables:
+            if variables["organization"] != self._organization.name:
+                return 200, {}, self._dumps({"data": {"organization": None}, "errors": [{"type": "NOT_FOUND", "message": "Could not resolve to an Organization."}]})
+            repositories = [r for r in self._organization.repositories.values() if r["in_organization"]]
+            start = int(variables.get("cursor") or 0)
+            nodes = [dict(self._repository_graphql_json(r), refs=self._refs_graphql_json(r, None)) for r in repositories[start:start + 25]]
+            page_info = {"hasNextPage": start + 25 < len(repositories), "endCursor": str(start + len(nodes))}
+            return 200, {}, self._dumps({"data": {"organization": {"repositories": {"pageInfo": page_info, "nodes": nodes}}}})
+
+        if "owner" in variables:
+            repository = self._organization.repositories.get("%s/%s" % (variables["owner"], variables["name"]))
+            if repository is None:
+                return 200, {}, self._dumps({"data": {"repository": None}, "errors": [{"type": "NOT_FOUND", "message": "Could not resolve to a Repository."}]})
+            return 200, {}, self._dumps({"data": {"repository": {"refs": self._refs_graphql_json(repository, variables.get("branchesCursor"))}}})
+
+        data = {}
+        for alias, login in re.findall(r'(\w+): user\(login: "([^"]+)"\)', body.get("query", "")):
+            person = self._organization.find_person("author", login)
+            data[alias] = {"login": person["login"], "name": person["name"], "email": person["email"]} if person else None
+        return 200, {}, self._dumps({"data": data})
+
+    def _repository_json(self, repository, with_parent=False):
+        owner, short_name = repository["name"].split("/")
+        json_repository = {"id": 50000 + repository["index"], "node_id": "R_%d" % repository["index"], "name": short_name, "full_name": repository["name"],
+                           "private": repository["in_organization"], "owner": {"login": owner, "type": "Organization", "url": "%s/users/%s" % (self._api_url, owner)},
+                           "html_url": "https://github.com/" + repository["name"], "fork": repository["parent"] is not None,
+                           "url": "%s/repos/%s" % (self._api_url, repository["name"]), "pushed_at": self._format_date(repository["pushed_at"]), "default_branch": "main"}
+        if with_parent and repository["parent"] is not None:
+            json_repository["parent"] = json_repository["source"] = self._repository_json(repository["parent"])
+        return json_repository
+
+    def _repository_graphql_json(self, repository):
+        json_repository = {"nameWithOwner": repository["name"], "isFork": repository["parent"] is not None, "pushedAt": self._format_date(repository["pushed_at"]),
+                           "defaultBranchRef": {"name": "main"}, "parent": None}
+        if repository["parent"] is not None:
+            json_repository["parent"] = self._repository_graphql_json(repository["parent"])
+        return json_repository
+
+    @staticmethod
+    def _refs_graphql_json(repository, cursor):
+        branches = list(repository["branches"].items())
+        start = int(cursor or 0)
+        nodes = [{"name": b, "target": {"oid": h[-1].sha}} for b, h in branches[start:start + 100]]
+        return {"pageInfo": {"hasNextPage": start + 100 < len(branches), "endCursor": str(start + len(nodes))}, "nodes": nodes}
+
+    def _user_json(self, person):
+        return {"login": person["login"], "id": person["id"], "url": "%s/users/%s" % (self._api_url, person["login"]), "html_url": "https://github.com/" + person["login"],
+                "type": "User", "site_admin": False}
+
+    def _commit_json(self, commit: _SyntheticCommit, with_files=False):
+        name = commit.repository["name"]
+        author = {"name": commit.author["name"], "email": commit.author["email"], "date": self._format_date(commit.date)}
+        json_commit = {
+            "sha": commit.sha,
+            "commit": {"author": author, "committer": author, "message": "Change %d of %s" % (commit.index, name), "comment_count": 0,
+                       "url": "%s/repos/%s/git/commits/%s" % (self._api_url, name, commit.sha)},
+            "url": "%s/repos/%s/commits/%s" % (self._api_url, name, commit.sha),
+            "html_url": "https://github.com/%s/commit/%s" % (name, commit.sha),
+            "author": self._user_json(commit.author),
+            "committer": self._user_json(commit.author),
+            "parents": [{"sha": commit.parent, "url": "%s/repos/%s/commits/%s" % (self._api_url, name, commit.parent)}] if commit.parent else []
+        }
+        if with_files:
+            file_name, patch = self._get_patch(commit)
+            additions, deletions = patch.count("\n+"), patch.count("\n-")
+            json_commit["stats"] = {"total": additions + deletions, "additions": additions, "deletions": deletions}
+            json_commit["files"] = [{"sha": commit.sha, "filename": file_name, "status": "modified", "additions": additions, "deletions": deletions,
+                                     "changes": additions + deletions, "patch": patch}]
+        return json_commit
+
+    @staticmethod
+    def _get_patch(commit: _SyntheticCommit):
+        # The secrets differ between commits, so each one is a new finding.
+        templates = _secret_patch_templates if commit.secret else _patch_templates
+        file_name, template = templates[int(commit.sha[16:20], 16) % len(templates)]
+        module = commit.repository["name"].split("/")[1].replace("-", "_")
+        secret = hashlib.sha256(commit.sha.encode("utf-8")).hexdigest()
+        return file_name.format(module=module), template.format(module=module, number=commit.index % 100, message="Change %d." % commit.index,
+                                                                key=commit.sha[:16].upper(), secret=secret[:20] + secret[20:].upper())
+
+    def _paginate(self, path, query, items, item_json=None):
+        page_items, links = self._get_page(path, query, items)
+        if item_json is not None:
+            page_items = [item_json(i) for i in page_items]
+        return 200, self._get_link_header(links), self._dumps(page_items)
+
+    def _get_page(self, path, query, items):
+        page = max(1, int(query.get("page", 1)))
+        page_size = min(int(query.get("per_page", self._per_page)), 100)
+        last_page = max(1, (len(items) + page_size - 1) // page_size)
+
+        def get_page_url(p):
+            return "%s%s?%s" % (self._api_url, urlparse(path).path, urlencode(dict(query, page=str(p))))
+
+        links = {}
+        if page < last_page:
+            links["next"] = get_page_url(page + 1)
+            links["last"] = get_page_url(last_page)
+        if page > 1:
+            links["first"] = get_page_url(1)
+            links["prev"] = get_page_url(page - 1)
+        return items[(page - 1) * page_size:page * page_size], links
+
+    @staticmethod
+    def _get_link_header(links):
+        if not links:
+            return {}
+        return {"Link": ", ".join('<%s>; rel="%s"' % (url, rel) for rel, url in links.items())}
+
+    def _not_found(self):
+        return 404, {}, self._dumps({"message": "Not Found", "documentation_url": "https://docs.github.com/rest"})
+
+    @staticmethod
+    def _format_date(date):
+        return date.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    @staticmethod
+    def _dumps(value):
+        return json.dumps(value).encode("utf-8")
+
+
+def create_server(stand_in: GithubStandIn, host, port, verbose=False) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self._handle("get")
+
+        def do_POST(self):
+            self._handle("post")
+
+        def _handle(self, method):
+            body = None
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > 0:
+                body = json.loads(self.rfile.read(length))
+            token = self.headers.get("Authorization", "").replace("token ", "", 1)
+            status, headers, content = stand_in.handle(method, self.path, body, token)
+            self.send_response(status)
+            for header, value in headers.items():
+                self.send_header(header, value)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serves a stand-in of the Github API, from a synthetic organization or a recorded session, for load tests. '
+                                                 'Point github-secret-finder to it with --api-url.')
+    parser.add_argument('--host', action='store', dest='host', default="127.0.0.1", help='Interface on which the stand-in listens. Defaults to 127.0.0.1.')
+    parser.add_argument('--port', '-p', action='store', dest='port', type=int, default=8080, help='Port on which the stand-in listens. Defaults to 8080.')
+    parser.add_argument('--organization', action='store', dest='organization', default="acme", help='Name of the synthetic organization. Defaults to acme.')
+    parser.add_argument('--repositories', action='store', dest='repositories', type=int, default=20, help='Number of repositories of the organization. Defaults to 20.')
+    parser.add_argument('--branches', action='store', dest='branches', type=int, default=3, help='Number of branches of each repository. Defaults to 3.')
+    parser.add_argument('--commits', action='store', dest='commits', type=int, default=200, help='Average number of commits on the default branch of each repository. Defaults to 200.')
+    parser.add_argument('--branch-commits', action='store', dest='branch_commits', type=int, default=5, help='Number of commits added by each other branch. Defaults to 5.')
+    parser.add_argument('--fork-rate', action='store', dest='fork_rate', type=float, default=0.1, help='Fraction of the repositories that are forks. Defaults to 0.1.')
+    parser.add_argument('--secret-rate', action='store', dest='secret_rate', type=float, default=0.05, help='Fraction of the commits that add secrets. Defaults to 0.05.')
+    parser.add_argument('--people', action='store', dest='people', type=int, default=50, help='Number of committers. Defaults to 50.')
+    parser.add_argument('--seed', action='store', dest='seed', type=int, default=0, help='Seed of the synthetic organization. Defaults to 0.')
+    parser.add_argument('--replay', action='store', dest='replay', default=None, help='Serves the responses recorded in this fixture instead of a synthetic organization.')
+    parser.add_argument('--record', action='store', dest='record', default=None, help='Forwards the requests to the upstream API and records the responses in this fixture.')
+    parser.add_argument('--upstream', action='store', dest='upstream', default=GITHUB_API_URL, help='API of the recorded responses, to record and replay them. Defaults to %s.' % GITHUB_API_URL)
+    parser.add_argument('--latency', action='store', dest='latency', type=float, default=0, help='Median latency of the responses, in milliseconds. Defaults to 0.')
+    parser.add_argument('--latency-sigma', action='store', dest='latency_sigma', type=float, default=0.5, help='Spread of the log-normal latency distribution. Defaults to 0.5.')
+    parser.add_argument('--throttle-rate', action='store', dest='throttle_rate', type=float, default=0, help='Fraction of the requests answered with a secondary rate limit (403). Defaults to 0.')
+    parser.add_argument('--retry-after', action='store', dest='retry_after', type=int, default=1, help='Seconds in the Retry-After header of the throttled requests. Defaults to 1.')
+    parser.add_argument('--rate-limit', action='store', dest='rate_limit', type=int, default=5000, help='Calls of each token per window, for the core and GraphQL APIs. Defaults to 5000.')
+    parser.add_argument('--search-rate-limit', action='store', dest='search_rate_limit', type=int, default=30, help='Calls of each token per minute, for the search API. Defaults to 30.')
+    parser.add_argument('--rate-limit-window', action='store', dest='rate_limit_window', type=int, default=3600, help='Seconds before the core and GraphQL limits are reset. Defaults to 3600.')
+    parser.add_argument('--verbose', '-v', action='store_true', dest='verbose', default=False, help='Logs each request.')
+    args = parser.parse_args()
+
+    api_url = "http://%s:%d" % (args.host, args.port)
+    rate_limits = {"core": (args.rate_limit, args.rate_limit_window), "graphql": (args.rate_limit, args.rate_limit_window), "search": (args.search_rate_limit, 60)}
+    organization = None
+    transport = None
+    if args.replay or args.record:
+        transport = RecordedTransport(args.replay or args.record, record=args.record is not None)
+        print("%s %s on %s" % ("Recording" if args.record else "Replaying", args.replay or args.record, api_url), flush=True)
+    else:
+        start = time.perf_counter()
+        organization = SyntheticOrganization(args.organization, args.repositories, args.branches, args.commits, args.branch_commits, args.fork_rate, args.secret_rate,
+                                             args.people, args.seed)
+        print("Serving %s: %d repositories and %d commits, generated in %.1f s, on %s" % (args.organization, len(organization.repositories), len(organization.commits),
+                                                                                           time.perf_counter() - start, api_url), flush=True)
+
+    stand_in = GithubStandIn(api_url, organization, transport, args.upstream, args.latency / 1000, args.latency_sigma, args.throttle_rate, args.retry_after, rate_limits)
+    server = create_server(stand_in, args.host, args.port, args.verbose)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if transport is not None:
+            transport.save()
+        print("Responses: %s" % ", ".join("%d %d" % (count, status) for status, count in sorted(stand_in.statuses.items())))
+
+
+if __name__ == "__main__":
+    main()
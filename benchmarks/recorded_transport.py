@@ -0,0 +1,88 @@
+import json
+import urllib.parse as urlparse
+from pathlib import Path
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Only the headers read by the requester are recorded.
+_recorded_headers = ["Date", "Content-Type", "Link", "Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "X-RateLimit-Resource"]
+
+
+class RecordedTransport(object):
+    # Replays the responses recorded in a fixture instead of calling the Github API, so a scan can be benchmarked offline.
+    # The clients create their own requesters, so requests.request is replaced while the transport is active.
+    # In record mode, the requests are made and their responses are added to the fixture.
+    def __init__(self, fixture_file, record=False):
+        self._fixture_file = Path(fixture_file)
+        self._record = record
+        self._request = requests.request
+        self._responses = {}
+        self.requests = 0
+        self.missed_requests = []
+        if self._fixture_file.exists():
+            for entry in json.loads(self._fixture_file.read_text()):
+                self._responses[self._get_key(entry["method"], entry["url"], entry.get("body"))] = entry
+
+    def __enter__(self):
+        requests.request = self.request
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        requests.request = self._request
+        if exc_type is None:
+            self.save()
+
+    def save(self):
+        if not self._record:
+            return
+        entries = sorted(list(self._responses.values()), key=lambda e: (e["method"], e["url"], json.dumps(e.get("body"), sort_keys=True)))
+        self._fixture_file.write_text(json.dumps(entries, indent=1, ensure_ascii=False) + "\n")
+
+    def request(self, method, url, json=None, **kwargs):
+        self.requests += 1
+        key = self._get_key(method, url, json)
+        if self._record and key not in self._responses:
+            response = self._request(method, url, json=json, **kwargs)
+            self._responses[key] = self._to_entry(method, url, json, response)
+
+        entry = self._responses.get(key)
+        if entry is None:
+            self.missed_requests.append(url)
+            return self._to_response(url, 404, {}, b'{"message": "Not Found"}')
+        content = entry["text"].encode("utf-8") if "text" in entry else _dumps(entry["json"])
+        return self._to_response(url, entry["status"], entry["headers"], content)
+
+    @staticmethod
+    def _to_entry(method, url, body, response):
+        entry = {"method": method.lower(), "url": url}
+        if body is not None:
+            entry["body"] = body
+        entry["status"] = response.status_code
+        entry["headers"] = {h: response.headers[h] for h in _recorded_headers if h in response.headers}
+        try:
+            entry["json"] = response.json()
+        except ValueError:
+            entry["text"] = response.text
+        return entry
+
+    @staticmethod
+    def _to_response(url, status_code, headers, content) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict(headers)
+        response.url = url
+        response.encoding = "utf-8"
+        response._content = content
+        return response
+
+    @staticmethod
+    def _get_key(method, url, body):
+        # The query parameters are sorted, since the requester adds the pagination parameters in any order.
+        url_parts = list(urlparse.urlparse(url))
+        url_parts[4] = urlparse.urlencode(sorted(urlparse.parse_qsl(url_parts[4])))
+        return method.lower(), urlparse.urlunparse(url_parts), json.dumps(body, sort_keys=True) if body is not None else None
+
+
+def _dumps(value):
+    return json.dumps(value).encode("utf-8")
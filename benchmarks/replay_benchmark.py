@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlitedict import SqliteDict
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "github_secret_finder"))
+
+from core.github import GithubApi, GithubApiClient, GithubSearchClient
+from core.github.github_commit_information_fetcher import get_table_name
+from core.github.models import GithubCommit
+from core.secret_finder import SecretFinder
+from recorded_transport import RecordedTransport
+
+fixtures = Path(__file__).parent / "fixtures"
+blacklist_file = Path(__file__).parent.parent / "src" / "github_secret_finder" / "data" / "default-blacklist.json"
+organization = "acme"
+cached_commit_count = 10000
+cached_query = "author:dwhitfield"
+
+
+def fill_cache(db_file, count):
+    # The recorded page is repeated, with distinct SHAs, to the size of a large search.
+    items = json.loads((fixtures / "commits_page.json").read_text())
+    with SqliteDict(db_file, tablename=get_table_name(GithubApi.COMMITS_TABLE_PREFIX, cached_query)) as db:
+        for i in range(count):
+            commit = GithubCommit.from_json(items[i % len(items)])
+            commit.sha = "%040x" % i
+            db[commit.sha] = commit
+        db.commit()
+
+
+def replay_cached_commits(db_file):
+    api = GithubApi(GithubApiClient(["unused"]), GithubSearchClient(["unused"]), db_file, cache_only=True)
+    return sum(1 for _ in api.search_commits(cached_query))
+
+
+def scan_organization(transport, tokens, graphql):
+    # Each scan starts from an empty database, so every commit is listed, fetched and analyzed.
+    with tempfile.TemporaryDirectory() as directory:
+        requests_before = transport.requests
+        start = time.perf_counter()
+        with SecretFinder(tokens, os.path.join(directory, "benchmark.sqlite"), str(blacklist_file), False, graphql=graphql) as finder:
+            findings = list(finder.find_by_organization(organization))
+        return time.perf_counter() - start, len(findings), transport.requests - requests_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the scan of an organization from recorded Github API responses.')
+    parser.add_argument('--number', '-n', action='store', dest='number', type=int, default=3, help='Number of runs of each measure. Defaults to 3.')
+    parser.add_argument('--output', '-o', action='store', dest='output', default=None, help='JSON file in which the results are written.')
+    parser.add_argument('--record', action='store_true', dest='record', default=False,
+                        help='Requests the responses missing from the fixture from the Github API, with the token in GITHUB_TOKEN, and adds them to the fixture.')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    results = {"cached_commits": {}, "scans": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = os.path.join(directory, "cache.sqlite")
+        fill_cache(db_file, cached_commit_count)
+        replay_cached_commits(db_file)
+        times = []
+        for _ in range(args.number):
+            start = time.perf_counter()
+            commit_count = replay_cached_commits(db_file)
+            times.append(time.perf_counter() - start)
+        results["cached_commits"] = {"count": commit_count, "replay": min(times)}
+        print("%d cached commits replayed in %.1f ms" % (commit_count, min(times) * 1e3))
+
+    # The recorded responses do not depend on the token, so any token replays them.
+    tokens = [os.environ["GITHUB_TOKEN"]] if args.record else ["unused"]
+    with RecordedTransport(fixtures / "recorded_organization.json", record=args.record) as transport:
+        for name, graphql in [("rest", False), ("graphql", True)]:
+            scans = [scan_organization(transport, tokens, graphql) for _ in range(args.number)]
+            seconds = min(s[0] for s in scans)
+            _, finding_count, request_count = scans[0]
+            results["scans"][name] = {"requests": request_count, "findings": finding_count, "scan": seconds}
+            print("%-8s scan of %s: %3d requests, %3d findings in %.1f ms" % (name, organization, request_count, finding_count, seconds * 1e3))
+
+    if transport.missed_requests:
+        print("%d requests are not in the fixture, so the results are not comparable. Record them with --record:" % len(transport.missed_requests))
+        for url in sorted(set(transport.missed_requests)):
+            print("  " + url)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(1 if transport.missed_requests else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+benchmarks_directory = Path(__file__).parent
+benchmarks = ["decoding", "analysis", "replay", "startup"]
+
+# Listed to explain a regression, not measured against the baseline.
+diagnostic_keys = {"slowest_imports"}
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=str(benchmarks_directory), stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(name):
+    # Each benchmark runs in its own process, so the modules it imports and the caches it fills do not affect the others.
+    with tempfile.TemporaryDirectory() as directory:
+        output_file = Path(directory) / "results.json"
+        process = subprocess.run([sys.executable, str(benchmarks_directory / ("%s_benchmark.py" % name)), "--output", str(output_file)])
+        results = json.loads(output_file.read_text()) if output_file.exists() else {}
+        return results, process.returncode == 0
+
+
+def get_timings(results, path=""):
+    # The timings are the float values. Counts and sizes are integers, so they are only compared by reading the results.
+    timings = {}
+    for key, value in results.items():
+        if key in diagnostic_keys:
+            continue
+        if isinstance(value, dict):
+            timings.update(get_timings(value, path + key + "."))
+        elif isinstance(value, float):
+            timings[path + key] = value
+    return timings
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    timings = get_timings(results["benchmarks"])
+    baseline_timings = get_timings(baseline["benchmarks"])
+    for key, value in sorted(timings.items()):
+        baseline_value = baseline_timings.get(key)
+        if not baseline_value:
+            continue
+        change = value / baseline_value - 1
+        if change > threshold:
+            regressions.append(key)
+        print("%-60s %+7.1f%%%s" % (key, change * 100, "  REGRESSION" if change > threshold else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the benchmarks and compares their results with the results of another commit.')
+    parser.add_argument('--output', '-o', action='store', dest='output', default=None, help='JSON file in which the results of all the benchmarks are written.')
+    parser.add_argument('--baseline', '-b', action='store', dest='baseline', default=None, help='JSON file written by a previous run, to compare the results with.')
+    parser.add_argument('--threshold', action='store', dest='threshold', type=float, default=10, help='Slowdown, in percent, reported as a regression. Defaults to 10.')
+    parser.add_argument('--benchmark', action='append', dest='benchmarks', choices=benchmarks, default=None, help='Benchmark to run. Defaults to all of them.')
+    args = parser.parse_args()
+
+    results = {"commit": get_commit(), "date": datetime.utcnow().isoformat(), "python": platform.python_version(), "benchmarks": {}}
+    failed = []
+    for name in args.benchmarks or benchmarks:
+        print("# %s" % name)
+        results["benchmarks"][name], passed = run_benchmark(name)
+        if not passed:
+            failed.append(name)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        print("# Compared with %s" % (baseline.get("commit") or args.baseline))
+        regressions = compare(results, baseline, args.threshold / 100)
+
+    if failed:
+        print("Failed: %s" % ", ".join(failed))
+    if regressions:
+        print("%d measures are more than %g%% slower than the baseline." % (len(regressions), args.threshold))
+    sys.exit(1 if failed or regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
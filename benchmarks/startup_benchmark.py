@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+main_file = Path(__file__).parent.parent / "src" / "github_secret_finder" / "main.py"
+
+# Target wall times, in milliseconds, of the commands that do not analyze commits.
+targets = {
+    "help": 80,
+    "results": 100
+}
+
+
+def run(arguments, cwd, import_time=False):
+    command = [sys.executable] + (["-X", "importtime"] if import_time else []) + [str(main_file)] + arguments
+    start = time.perf_counter()
+    process = subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        raise Exception("%s failed: %s" % (" ".join(arguments), process.stderr))
+    return elapsed, process.stderr
+
+
+def get_slowest_imports(import_times, count):
+    # Each line of -X importtime is "import time: self | cumulative | name". Only the top-level imports are kept.
+    imports = []
+    for line in import_times.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            imports.append((name.strip(), int(cumulative) / 1000))
+    return sorted(imports, key=lambda i: i[1], reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the startup time of the commands that do not analyze commits.')
+    parser.add_argument('--number', '-n', action='store', dest='number', type=int, default=10, help='Number of runs of each command. Defaults to 10.')
+    parser.add_argument('--output', '-o', action='store', dest='output', default=None, help='JSON file in which the results are written.')
+    args = parser.parse_args()
+
+    results = {"commands": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        commands = {
+            "help": ["--help"],
+            "results": ["--results", "--tokens", "unused", "--database", os.path.join(directory, "benchmark.sqlite")]
+        }
+
+        failed = False
+        for name, arguments in commands.items():
+            # The first run creates the database and fills the bytecode cache.
+            run(arguments, directory)
+            times = [run(arguments, directory)[0] * 1000 for _ in range(args.number)]
+            _, import_times = run(arguments, directory, import_time=True)
+
+            median = statistics.median(times)
+            passed = median <= targets[name]
+            failed |= not passed
+            results["commands"][name] = {
+                "median_ms": median,
+                "min_ms": min(times),
+                "target_ms": targets[name],
+                "passed": passed,
+                "slowest_imports": dict(get_slowest_imports(import_times, 10))
+            }
+
+            print("%-8s median %6.1f ms, min %6.1f ms (target %d ms) %s" % (name, median, min(times), targets[name], "ok" if passed else "SLOW"))
+            for module, milliseconds in get_slowest_imports(import_times, 5):
+                print("  %-40s %6.1f ms" % (module, milliseconds))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,9 @@ setup(
         'detect_secrets',
         'sqlitedict'
     ],
+    extras_require={
+        'fast': ['orjson']
+    },
     entry_points={
         'console_scripts': ['github-secret-finder = github_secret_finder.main:main'],
     },
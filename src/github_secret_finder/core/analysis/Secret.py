@@ -1,3 +1,6 @@
+import hashlib
+
+
 class Secret(object):
     def __init__(self, secret_type, file_name, line_number, value, line, verified):
         self.line = line
@@ -7,6 +10,11 @@ class Secret(object):
         self.value = value
         self.verified = verified
 
+    def get_fingerprint(self):
+        # The same secret found in different commits, files or lines has the same fingerprint.
+        value = self.value.strip().strip("\"'`")
+        return hashlib.sha256(("%s:%s" % (self.secret_type, value)).encode("utf-8")).hexdigest()
+
     def to_slack_string(self):
         line = self._escape_markdown(self.line)
         secret_value = self._escape_markdown(self.value)
@@ -1 +1,3 @@
 from .patch_analyzer import PatchAnalyzer
+from .merge_patch import get_conflict_resolution_patch
+from .secret_verifier import SecretVerifier
@@ -0,0 +1,33 @@
+from typing import List, Dict, Set
+
+
+def get_conflict_resolution_patch(first_parent_patch: str, other_parent_patches: List[str]) -> str:
+    # A line added by a merge commit compared to each of its parents was in none of them, so it was written while resolving the merge.
+    # The other added lines are kept as context lines, so the line numbers do not change.
+    from unidiff import PatchSet, LINE_TYPE_CONTEXT
+
+    other_added_lines = [_get_added_lines(p) for p in other_parent_patches]
+    patch_set = PatchSet.from_string(first_parent_patch)
+
+    has_added_lines = False
+    for patch_file in patch_set:
+        for hunk in patch_file:
+            for line in hunk:
+                if not line.is_added:
+                    continue
+                if all(line.value in added_lines.get(patch_file.path, ()) for added_lines in other_added_lines):
+                    has_added_lines = True
+                else:
+                    line.line_type = LINE_TYPE_CONTEXT
+                    hunk.source_length += 1
+
+    return str(patch_set) if has_added_lines else ""
+
+
+def _get_added_lines(patch: str) -> Dict[str, Set[str]]:
+    from unidiff import PatchSet
+
+    added_lines = {}
+    for patch_file in PatchSet.from_string(patch):
+        added_lines[patch_file.path] = set(line.value for hunk in patch_file for line in hunk if line.is_added)
+    return added_lines
@@ -1,10 +1,6 @@
-from detect_secrets.core.plugins.util import get_mapping_from_secret_type_to_class
-from detect_secrets import SecretsCollection
-from detect_secrets.settings import transient_settings
-from unidiff import PatchSet
-
 from .blacklist_matcher import BlacklistMatcher
 from .Secret import Secret
+from ..util.profiler import profiler
 
 
 class PatchAnalyzer(object):
@@ -12,6 +8,12 @@ class PatchAnalyzer(object):
         self._blacklist = BlacklistMatcher(blacklist_file)
 
     def find_secrets(self, diff):
+        # detect_secrets loads its plugins when imported, which is only needed by the commands that analyze patches.
+        from detect_secrets.core.plugins.util import get_mapping_from_secret_type_to_class
+        from detect_secrets import SecretsCollection
+        from detect_secrets.settings import transient_settings
+        from unidiff import PatchSet
+
         changes = None
 
         secrets_collection = SecretsCollection()
@@ -19,7 +21,8 @@ class PatchAnalyzer(object):
             settings.disable_filters(
                 'detect_secrets.filters.common.is_invalid_file',
             )
-            secrets_collection.scan_diff(diff)
+            with profiler.time("scan_diff"):
+                secrets_collection.scan_diff(diff)
 
         for file_name, secret in secrets_collection:
             if len(secret.secret_value) < 6:
@@ -27,14 +30,17 @@ class PatchAnalyzer(object):
 
             # Only parse the diff if at least one secret was found.
             if not changes:
-                patch_set = PatchSet.from_string(diff)
-                changes = {}
-                for patch_file in patch_set:
-                    lines = dict((line.target_line_no, line.value.strip()) for chunk in patch_file for line in chunk.target_lines() if line.is_added)
-                    changes[patch_file.path] = lines
+                with profiler.time("parse_patch"):
+                    patch_set = PatchSet.from_string(diff)
+                    changes = {}
+                    for patch_file in patch_set:
+                        lines = dict((line.target_line_no, line.value.strip()) for chunk in patch_file for line in chunk.target_lines() if line.is_added)
+                        changes[patch_file.path] = lines
 
             line = changes[secret.filename][secret.line_number]
-            if self._blacklist.is_blacklisted(line, file_name, secret.secret_value):
+            with profiler.time("blacklist"):
+                blacklisted = self._blacklist.is_blacklisted(line, file_name, secret.secret_value)
+            if blacklisted:
                 continue
 
             # detect_secrets sometimes return a lowercase version of the secret. Find the real string.
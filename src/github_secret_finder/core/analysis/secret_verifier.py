@@ -0,0 +1,171 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlitedict import SqliteDict
+
+from .Secret import Secret
+from ..util.legacy_unpickler import legacy_decode
+
+
+class SecretVerification(object):
+    def __init__(self, verified: Optional[bool]):
+        self.verified = verified
+        self.verified_at = datetime.utcnow()
+
+
+class ProviderRateLimiter(object):
+    # Spaces the calls to each provider, so verifying many secrets of the same type does not get the scanner blocked.
+    def __init__(self):
+        self._next_call_times = {}
+        self._lock = threading.Lock()
+
+    def wait(self, provider, calls_per_second):
+        with self._lock:
+            now = time.monotonic()
+            call_time = max(now, self._next_call_times.get(provider, now))
+            self._next_call_times[provider] = call_time + 1 / calls_per_second
+        if call_time > now:
+            time.sleep(call_time - now)
+
+
+class SecretVerifier(object):
+    _table_name = "secret_verifications"
+    _default_settings = {"rate": 1.0, "timeout": 10}
+
+    def __init__(self, db_file, config_file=None, workers=8, ttl=timedelta(days=1), plugins: Dict[str, 'BasePlugin'] = None):
+        self._db_file = db_file
+        self._settings = self._load_settings(config_file)
+        self.workers = workers
+        self._ttl = ttl
+        self._plugins = plugins or {}
+        self._rate_limiter = ProviderRateLimiter()
+        self._in_progress = {}
+        self._lock = threading.Lock()
+        self.verified_count = 0
+        self.cached_count = 0
+
+    @staticmethod
+    def _load_settings(config_file):
+        # The settings of each provider are keyed by secret type, e.g. {"Slack Token": {"rate": 0.5, "timeout": 5}}.
+        if config_file:
+            with open(config_file, "r") as f:
+                return json.load(f)
+        return {}
+
+    def __enter__(self):
+        if not hasattr(self, '_db') or self._db is None:
+            self._db = SqliteDict(self._db_file, tablename=self._table_name, autocommit=True, decode=legacy_decode)
+            self._executor = ThreadPoolExecutor(self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._executor.shutdown(wait=False)
+        self._db.close()
+        if self.verified_count > 0 or self.cached_count > 0:
+            logging.info("Secret verification: %d verified, %d cached." % (self.verified_count, self.cached_count))
+
+    def verify_secrets(self, secrets: List[Secret], patch) -> Dict[str, Optional[bool]]:
+        # Returns whether each secret is live, by fingerprint. None means that it could not be verified.
+        futures = {}
+        context_lines = None
+        for secret in secrets:
+            plugin = self._get_plugin(secret.secret_type)
+            if plugin is None:
+                continue
+
+            if context_lines is None:
+                context_lines = self._get_context_lines(patch)
+            futures[secret.get_fingerprint()] = (secret, self._get_verification(secret, plugin, context_lines.get(secret.file_name, [])))
+
+        results = {}
+        for fingerprint, (secret, future) in futures.items():
+            try:
+                results[fingerprint] = future.result(timeout=self._get_setting(secret.secret_type, "timeout"))
+            except TimeoutError:
+                logging.warning("Verification of a %s timed out." % secret.secret_type)
+                results[fingerprint] = None
+        return results
+
+    def _get_verification(self, secret: Secret, plugin: 'BasePlugin', context_lines) -> Future:
+        # Concurrent verifications of the same secret share the same call to the provider.
+        fingerprint = secret.get_fingerprint()
+        with self._lock:
+            if fingerprint in self._in_progress:
+                return self._in_progress[fingerprint]
+
+            verification = self._db.get(fingerprint)
+            if verification is not None and datetime.utcnow() - verification.verified_at < self._ttl:
+                self.cached_count += 1
+                future = Future()
+                future.set_result(verification.verified)
+                return future
+
+            future = self._executor.submit(self._verify, secret, plugin, context_lines)
+            self._in_progress[fingerprint] = future
+            return future
+
+    def _verify(self, secret: Secret, plugin: 'BasePlugin', context_lines) -> Optional[bool]:
+        from detect_secrets.constants import VerifiedResult
+        from detect_secrets.util.inject import call_function_with_arguments
+
+        fingerprint = secret.get_fingerprint()
+        try:
+            self._rate_limiter.wait(secret.secret_type, self._get_setting(secret.secret_type, "rate"))
+            context = self._get_code_snippet(context_lines, secret.line_number)
+            result = call_function_with_arguments(plugin.verify, secret=secret.value, context=context)
+        except Exception as e:
+            # Not cached, so the secret is verified again by the next scan. Plugins also fail on unexpected provider responses.
+            logging.warning("Could not verify a %s: %s" % (secret.secret_type, e))
+            return None
+        finally:
+            with self._lock:
+                self._in_progress.pop(fingerprint, None)
+
+        verified = {VerifiedResult.VERIFIED_TRUE: True, VerifiedResult.VERIFIED_FALSE: False}.get(result)
+        with self._lock:
+            self.verified_count += 1
+        self._db[fingerprint] = SecretVerification(verified)
+        return verified
+
+    def _get_plugin(self, secret_type) -> Optional['BasePlugin']:
+        # Plugins without their own verification always return UNVERIFIED, so they are not called.
+        from detect_secrets.core.plugins.util import get_mapping_from_secret_type_to_class
+        from detect_secrets.plugins.base import BasePlugin
+
+        if secret_type not in self._plugins:
+            plugin = None
+            plugin_type = get_mapping_from_secret_type_to_class().get(secret_type)
+            if plugin_type is not None and plugin_type.verify is not BasePlugin.verify:
+                try:
+                    plugin = plugin_type()
+                except TypeError:
+                    pass
+            self._plugins[secret_type] = plugin
+        return self._plugins[secret_type]
+
+    def _get_setting(self, secret_type, name):
+        return self._settings.get(secret_type, {}).get(name, self._settings.get("default", {}).get(name, self._default_settings[name]))
+
+    @staticmethod
+    def _get_context_lines(patch) -> Dict[str, List]:
+        # Multi-factor plugins look for the other parts of the credential around the secret, e.g. the AWS secret access key.
+        from unidiff import PatchSet
+
+        context_lines = {}
+        for patch_file in PatchSet.from_string(patch):
+            context_lines[patch_file.path] = [(line.target_line_no, line.value.rstrip("\n")) for chunk in patch_file for line in chunk.target_lines()]
+        return context_lines
+
+    @staticmethod
+    def _get_code_snippet(context_lines, line_number):
+        from detect_secrets.util.code_snippet import get_code_snippet
+
+        line_numbers = [n for n, _ in context_lines]
+        if line_number not in line_numbers:
+            return get_code_snippet([], 1)
+        return get_code_snippet([v for _, v in context_lines], line_numbers.index(line_number) + 1)
@@ -0,0 +1,2 @@
+from .patch_archive import PatchArchive
+from .patch_rescanner import PatchRescanner
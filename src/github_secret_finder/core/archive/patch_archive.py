@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterable, Tuple, Optional
+
+from sqlitedict import SqliteDict
+
+from ..github.models import GithubCommit
+from ..util.legacy_unpickler import legacy_decode
+
+
+class ArchivedPatch(object):
+    def __init__(self, commit: GithubCommit, content_hash, size, compressed_size):
+        self.commit = commit
+        self.content_hash = content_hash
+        self.size = size
+        self.compressed_size = compressed_size
+        self.archived_at = datetime.utcnow()
+
+
+class PatchArchiveStatistics(object):
+    def __init__(self):
+        self.commit_count = 0
+        self.blob_count = 0
+        self.size = 0
+        self.compressed_size = 0
+        self.oldest = None
+
+    def __str__(self):
+        return "%d patches, %d unique, %.1f MB compressed from %.1f MB." % (self.commit_count, self.blob_count, self.compressed_size / 1e6, self.size / 1e6)
+
+
+class PatchArchive(object):
+    # Patches are compressed and stored once per content, so identical patches (cherry-picks, forks) share their storage.
+    def __init__(self, archive_file, max_size=None, max_age: timedelta = None):
+        self._archive_file = archive_file
+        self._max_size = max_size
+        self._max_age = max_age
+
+    def __enter__(self):
+        if not hasattr(self, '_commits_db') or self._commits_db is None:
+            self._commits_db = SqliteDict(self._archive_file, tablename="commits", autocommit=True, decode=legacy_decode)
+            self._blobs_db = SqliteDict(self._archive_file, tablename="blobs", autocommit=True)
+            self._references_db = SqliteDict(self._archive_file, tablename="blob_references", autocommit=True)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.evict()
+        self._commits_db.close()
+        self._blobs_db.close()
+        self._references_db.close()
+
+    def __contains__(self, commit_sha):
+        return commit_sha in self._commits_db
+
+    def add(self, commit: GithubCommit, patch: str):
+        if commit.sha in self._commits_db:
+            return
+
+        content = patch.encode("utf-8")
+        content_hash = hashlib.sha256(content).hexdigest()
+        if content_hash in self._blobs_db:
+            compressed_size = len(self._blobs_db[content_hash])
+        else:
+            compressed = zlib.compress(content, 9)
+            compressed_size = len(compressed)
+            self._blobs_db[content_hash] = compressed
+
+        self._references_db[content_hash] = self._references_db.get(content_hash, 0) + 1
+        self._commits_db[commit.sha] = ArchivedPatch(commit, content_hash, len(content), compressed_size)
+
+    def get_patch(self, commit_sha) -> Optional[str]:
+        if commit_sha not in self._commits_db:
+            return None
+        return zlib.decompress(self._blobs_db[self._commits_db[commit_sha].content_hash]).decode("utf-8")
+
+    def get_commits(self) -> Iterable[GithubCommit]:
+        for archived_patch in self._commits_db.itervalues():
+            yield archived_patch.commit
+
+    def get_patches(self) -> Iterable[Tuple[GithubCommit, str]]:
+        for archived_patch in self._commits_db.itervalues():
+            yield archived_patch.commit, zlib.decompress(self._blobs_db[archived_patch.content_hash]).decode("utf-8")
+
+    def get_statistics(self) -> PatchArchiveStatistics:
+        statistics = PatchArchiveStatistics()
+        blobs = set()
+        for archived_patch in self._commits_db.itervalues():
+            statistics.commit_count += 1
+            statistics.size += archived_patch.size
+            if archived_patch.content_hash not in blobs:
+                blobs.add(archived_patch.content_hash)
+                statistics.compressed_size += archived_patch.compressed_size
+            if statistics.oldest is None:
+                statistics.oldest = archived_patch.archived_at
+        statistics.blob_count = len(blobs)
+        return statistics
+
+    def evict(self):
+        # The patches are iterated from the oldest, since they are stored in the order they were archived.
+        if self._max_size is None and self._max_age is None:
+            return
+
+        compressed_size = self.get_statistics().compressed_size if self._max_size is not None else 0
+        evicted_count = 0
+        for commit_sha, archived_patch in self._commits_db.iteritems():
+            too_old = self._max_age is not None and datetime.utcnow() - archived_patch.archived_at > self._max_age
+            too_large = self._max_size is not None and compressed_size > self._max_size
+            if not too_old and not too_large:
+                break
+
+            if self._remove(commit_sha, archived_patch):
+                compressed_size -= archived_patch.compressed_size
+            evicted_count += 1
+
+        if evicted_count > 0:
+            logging.info("Evicted %d patches from the archive." % evicted_count)
+
+    def _remove(self, commit_sha, archived_patch: ArchivedPatch) -> bool:
+        del self._commits_db[commit_sha]
+        references = self._references_db.get(archived_patch.content_hash, 1) - 1
+        if references > 0:
+            self._references_db[archived_patch.content_hash] = references
+            return False
+
+        del self._references_db[archived_patch.content_hash]
+        del self._blobs_db[archived_patch.content_hash]
+        return True
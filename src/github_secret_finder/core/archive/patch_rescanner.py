@@ -0,0 +1,68 @@
+import logging
+from typing import Iterable
+
+from .patch_archive import PatchArchive
+from ..analysis import PatchAnalyzer
+from ..findings import FindingsDatabase
+from ..findings.finding import Finding
+
+_patch_analyzer = None
+
+
+def _initialize_worker(blacklist_file):
+    global _patch_analyzer
+    _patch_analyzer = PatchAnalyzer(blacklist_file)
+
+
+def _find_secrets(item):
+    commit, patch = item
+    return commit, list(_patch_analyzer.find_secrets(patch))
+
+
+class PatchRescanner(object):
+    # Analyzing is CPU bound, so the patches are analyzed in separate processes.
+    def __init__(self, archive: PatchArchive, findings_db: FindingsDatabase, blacklist_file, processes=None):
+        self._archive = archive
+        self._findings_db = findings_db
+        self._blacklist_file = blacklist_file
+        PatchAnalyzer(blacklist_file)  # Fails here on an invalid blacklist, since a failing worker would be restarted endlessly.
+        self._processes = processes
+        self.analyzed_count = 0
+        self.added_count = 0
+        self.retired_count = 0
+        self.restored_count = 0
+
+    def rescan(self) -> Iterable[Finding]:
+        from multiprocessing import Pool
+
+        found_fingerprints = set()
+        with Pool(self._processes, _initialize_worker, (self._blacklist_file,)) as pool:
+            for commit, secrets in pool.imap_unordered(_find_secrets, self._archive.get_patches(), chunksize=16):
+                self.analyzed_count += 1
+                for secret in secrets:
+                    found_fingerprints.add(secret.get_fingerprint())
+                    finding = self._findings_db.create(commit, secret)
+                    if finding:
+                        self.added_count += 1
+                        yield finding
+
+        self._reconcile(found_fingerprints)
+        logging.info("Rescanned %d patches: %d findings added, %d retired, %d restored." % (self.analyzed_count, self.added_count, self.retired_count, self.restored_count))
+
+    def _reconcile(self, found_fingerprints):
+        # A finding is only retired when every commit containing it was rescanned, since the others could still contain it.
+        for finding in list(self._findings_db.get_findings(lambda f: True)):
+            fingerprint = finding.secret.get_fingerprint()
+            if fingerprint in found_fingerprints:
+                if finding.retired:
+                    self._findings_db.restore(finding)
+                    self.restored_count += 1
+                continue
+
+            if finding.retired:
+                continue
+
+            occurrences = self._findings_db.get_occurrences(fingerprint) or [finding]
+            if all(o.commit.sha in self._archive for o in occurrences):
+                self._findings_db.retire(finding)
+                self.retired_count += 1
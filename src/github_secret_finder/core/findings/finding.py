@@ -5,8 +5,21 @@ from ..github.models import GithubCommit
 
 
 class Finding(object):
-    def __init__(self, commit: GithubCommit, secret: Secret):
+    fingerprint = None  # Not available on findings created by previous versions.
+    retired = False
+    verified = None  # Whether the secret is live, when it was verified with its provider.
+
+    def __init__(self, commit: GithubCommit, secret: Secret, verified=None):
         self.id = str(uuid.uuid4())
         self.commit = commit
         self.secret = secret
+        self.fingerprint = secret.get_fingerprint()
         self.notification_sent = False
+        self.verified = verified
+
+
+class FindingOccurrence(object):
+    def __init__(self, commit: GithubCommit, file_name, line_number):
+        self.commit = commit
+        self.file_name = file_name
+        self.line_number = line_number
@@ -1,27 +1,116 @@
-from typing import Iterable
+import itertools
+from typing import Iterable, Optional, List
 
 from sqlitedict import SqliteDict
 
-from .finding import Finding
+from .finding import Finding, FindingOccurrence
 from ..util.legacy_unpickler import legacy_decode
 
 
 class FindingsDatabase(object):
     def __init__(self, db_file):
         self._findings_db = SqliteDict(db_file, tablename="findings", autocommit=True, decode=legacy_decode)
+        self._outbox_db = SqliteDict(db_file, tablename="notification_outbox", autocommit=True, decode=legacy_decode)
+        self._fingerprints_db = SqliteDict(db_file, tablename="finding_fingerprints", autocommit=True, decode=legacy_decode)
+        self._occurrences_db = SqliteDict(db_file, tablename="finding_occurrences", autocommit=True, decode=legacy_decode)
 
     def close(self):
         self._findings_db.close()
+        self._outbox_db.close()
+        self._fingerprints_db.close()
+        self._occurrences_db.close()
 
     def get_findings(self, finding_filter) -> Iterable[Finding]:
         for result in self._findings_db.itervalues():
             if finding_filter(result):
                 yield result
 
-    def create(self, commit, secret):
-        finding = Finding(commit, secret)
+    def get_findings_by_commits(self, commit_shas: Iterable[str]) -> Iterable[Finding]:
+        # The commits are streamed against an index of the findings, which is much smaller than the commits of an organization.
+        # Includes the findings of secrets that were first seen in other commits.
+        finding_ids_by_commit = {}
+        for finding in self.get_findings(lambda f: not f.retired):
+            finding_ids_by_commit.setdefault(finding.commit.sha, set()).add(finding.id)
+        for fingerprint, occurrences in self._occurrences_db.iteritems():
+            if fingerprint in self._fingerprints_db:
+                for o in occurrences:
+                    finding_ids_by_commit.setdefault(o.commit.sha, set()).add(self._fingerprints_db[fingerprint])
+
+        returned_ids = set()
+        for commit_sha in commit_shas:
+            for finding_id in finding_ids_by_commit.get(commit_sha, ()):
+                if finding_id in returned_ids:
+                    continue
+                returned_ids.add(finding_id)
+                finding = self._findings_db.get(finding_id)
+                if finding is not None and not finding.retired:
+                    yield finding
+
+    def get_occurrences(self, fingerprint) -> List[FindingOccurrence]:
+        return self._occurrences_db.get(fingerprint, [])
+
+    def create(self, commit, secret, verified=None) -> Optional[Finding]:
+        # Only the first sighting of a secret creates a finding. The others are added to its occurrences.
+        fingerprint = secret.get_fingerprint()
+        occurrences = self.get_occurrences(fingerprint)
+        if not any(o.commit.sha == commit.sha and o.file_name == secret.file_name and o.line_number == secret.line_number for o in occurrences):
+            occurrences.append(FindingOccurrence(commit, secret.file_name, secret.line_number))
+            self._occurrences_db[fingerprint] = occurrences
+
+        if fingerprint in self._fingerprints_db:
+            return None
+
+        finding = Finding(commit, secret, verified)
         self._findings_db[finding.id] = finding
+        self._fingerprints_db[fingerprint] = finding.id
+        self._outbox_db[finding.id] = None
         return finding
 
     def update(self, finding):
         self._findings_db[finding.id] = finding
+
+    def retire(self, finding):
+        # Retired findings are kept, so a rescan with another blacklist can restore them.
+        finding.retired = True
+        self.update(finding)
+        if finding.id in self._outbox_db:
+            del self._outbox_db[finding.id]
+
+    def restore(self, finding):
+        finding.retired = False
+        self.update(finding)
+        if not finding.notification_sent:
+            self._outbox_db[finding.id] = None
+
+    def get_unsent_findings(self, max_count) -> Iterable[Finding]:
+        # The outbox only contains the findings for which no notification was sent, so the findings table is not scanned.
+        for finding_id in list(itertools.islice(self._outbox_db.iterkeys(), max_count)):
+            if finding_id in self._findings_db:
+                yield self._findings_db[finding_id]
+            else:
+                del self._outbox_db[finding_id]
+
+    def mark_notification_sent(self, finding):
+        finding.notification_sent = True
+        self.update(finding)
+        if finding.id in self._outbox_db:
+            del self._outbox_db[finding.id]
+
+    def enqueue_unsent_findings(self):
+        # Findings created before the outbox existed.
+        for finding in self.get_findings(lambda f: not f.notification_sent and not f.retired):
+            if finding.id not in self._outbox_db:
+                self._outbox_db[finding.id] = None
+
+    def index_fingerprints(self):
+        # Findings created before the fingerprint index existed. Duplicates among them are kept.
+        if len(self._fingerprints_db) > 0:
+            return
+
+        for finding in self.get_findings(lambda f: True):
+            fingerprint = finding.secret.get_fingerprint()
+            if fingerprint not in self._fingerprints_db:
+                self._fingerprints_db[fingerprint] = finding.id
+            occurrences = self.get_occurrences(fingerprint)
+            occurrences.append(FindingOccurrence(finding.commit, finding.secret.file_name, finding.secret.line_number))
+            self._occurrences_db[fingerprint] = occurrences
@@ -1,9 +1,17 @@
 import argparse
+import hashlib
+import heapq
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from enum import Enum
+from typing import Optional, Tuple, List, Iterable, Dict
+
+from sqlitedict import SqliteDict
 
 from .github import GithubApiClient, GithubSearchClient, GithubApi
 from .github.models import GithubUser
+from .util.disjoint_set import DisjointSet
+from .util.legacy_unpickler import legacy_decode
 
 
 class UserSourceType(Enum):
@@ -11,17 +19,47 @@ class UserSourceType(Enum):
     Search = 2
 
 
-class UserRelation(object):
-    def __init__(self, user: GithubUser, user_source: UserSourceType):
-        self.user = user
-        self.relations = set()
-        self.parents = set()
-        self.user_source = user_source
+LOGINS = "logins"
+EMAILS = "emails"
+NAMES = "names"
+
+
+class IdentityGraph(object):
+    # Each node is an (identity type, value) tuple. The users connect their login, email and name.
+    def __init__(self):
+        self._sets = DisjointSet()
+        self._sources = {}
+
+    def __contains__(self, node):
+        return node in self._sets
+
+    def __len__(self):
+        return len(self._sets)
 
-    def add_relation(self, relation):
-        if not any(r.user == relation.user for r in self.relations):
-            self.relations.add(relation)
-            relation.parents.add(self)
+    def add_user(self, user: GithubUser, source: UserSourceType, linked_node=None) -> List[Tuple[str, str]]:
+        nodes = [(identity_type, value) for value, identity_type, is_blacklisted in [(user.login, LOGINS, is_login_blacklisted),
+                                                                                    (user.email, EMAILS, is_email_blacklisted),
+                                                                                    (user.name, NAMES, is_name_blacklisted)]
+                 if value and not is_blacklisted(value)]
+        if linked_node is not None:
+            nodes.append(linked_node)
+
+        for node in nodes:
+            self._sets.add(node)
+            # The edge's source is kept on both of its nodes.
+            self._sources.setdefault(node, set()).add(source)
+            self._sets.union(nodes[0], node)
+
+        return [n for n in nodes if n != linked_node]
+
+    def get_clusters(self) -> Iterable[Dict[str, List[Tuple[str, UserSourceType]]]]:
+        for nodes in self._sets.get_groups().values():
+            cluster = {LOGINS: [], EMAILS: [], NAMES: []}
+            for identity_type, value in nodes:
+                # A value found in the organization and by a search is shown as coming from the organization.
+                source = UserSourceType.Organization if UserSourceType.Organization in self._sources[(identity_type, value)] else UserSourceType.Search
+                cluster[identity_type].append((value, source))
+            yield cluster
 
 
 def get_users_from_contributors(api: GithubApi, repo):
@@ -48,107 +86,142 @@ def is_name_blacklisted(name):
     return not name or name in ["web-flow", "github", "unknown", "first last"] or not " " in name  # The name probably won't be generic enough if there is no space in it.
 
 
-def get_users_from_organizations(api: GithubApi, organizations):
-    user_relations = {}
+def get_users_from_organizations(api: GithubApi, organizations) -> IdentityGraph:
+    identities = IdentityGraph()
     for org in organizations:
         logging.info("Fetching repositories from %s" % org)
         for repo in api.get_organization_repositories(org):
             for source, log_string in [(get_users_from_contributors, "Fetching contributors"), (get_users_from_commits, "Fetching commit users")]:
                 logging.info("%s from %s" % (log_string, repo.name))
                 for user, count in source(api, repo):
-                    new_relation = UserRelation(user, UserSourceType.Organization)
-                    for value, is_blacklisted in [(user.login, is_login_blacklisted),
-                                                  (user.email, is_email_blacklisted),
-                                                  (user.name, is_name_blacklisted)]:
-                        if not value or (is_blacklisted and is_blacklisted(value)):
-                            continue
-                        if value in user_relations:
-                            user_relations[value].add_relation(new_relation)
-                        else:
-                            user_relations[value] = new_relation
-    return user_relations
-
-
-def get_user_informations_hierarchy(api, organizations):
-    emails_operation = "emails"
-    logins_operation = "logins"
-    names_operation = "names"
-
-    user_relations = get_users_from_organizations(api, organizations)
-
-    emails = list(set(r.user.email for r in user_relations.values() if r.user.email))
-    logins = list(set(r.user.login for r in user_relations.values() if r.user.login))
-    names = list(set(r.user.name for r in user_relations.values() if r.user.name))
-
-    operations = [logins_operation, emails_operation, names_operation]
-    inputs = {emails_operation: emails, logins_operation: logins, names_operation: names}
-    results = {emails_operation: set(), logins_operation: set(), names_operation: set()}
-    query_suffixes = {emails_operation: "-email", logins_operation: "", names_operation: "-name"}
-
-    while True:
-        operation = next((o for o in operations if len(inputs[o]) > 0), None)
-        if operation is None:
-            break
-
-        # Start with the most specific queries.
-        value_to_query = max(inputs[operation], key=len)
-        inputs[operation].remove(value_to_query)
-
-        if value_to_query not in user_relations:
-            continue
-        results[operation].add(value_to_query)
-
-        user_type_selector = {"author": lambda x: x.author, "committer": lambda x: x.committer}
-
-        for prefix, selector in user_type_selector.items():
-            query = "%s%s:\"%s\"" % (prefix, query_suffixes[operation], value_to_query)
-            logging.info(query)
-            for commit_with_user in api.search_users_from_commits(query):
-                user = selector(commit_with_user)
-
-                new_relation = UserRelation(user, UserSourceType.Search)
-                user_relations[value_to_query].add_relation(new_relation)
-
-                for value, operation, is_blacklisted in [(user.login, logins_operation, is_login_blacklisted),
-                                                         (user.email, emails_operation, is_email_blacklisted),
-                                                         (user.name, names_operation, is_name_blacklisted)]:
-                    if not value:
-                        continue
-                    value = value.lower()
-                    if not is_blacklisted(value) and value not in results[operation] and value not in inputs[operation]:
-                        inputs[operation].append(value)
-                        if value in user_relations:
-                            user_relations[value].add_relation(new_relation)
-                        else:
-                            user_relations[value] = new_relation
-
-    returned_relations = set()
-    for r in user_relations.values():
-        if len(r.parents) > 0 or r in returned_relations:
-            continue
-        returned_relations.add(r)
-        yield r
-
-
-def flatten_relations(relation: UserRelation):
-    names = set()
-    logins = set()
-    emails = set()
-
-    user = relation.user
-    for value, col, is_blacklisted in [(user.name, names, is_name_blacklisted),
-                                       (user.login, logins, is_login_blacklisted),
-                                       (user.email, emails, is_email_blacklisted)]:
-        if value and not is_blacklisted(value):
-            col.add((relation.user_source, value))
-
-    for r in relation.relations:
-        relation_logins, relation_emails, relation_names = flatten_relations(r)
-        logins.update(relation_logins)
-        emails.update(relation_emails)
-        names.update(relation_names)
-
-    return logins, emails, names
+                    identities.add_user(user, UserSourceType.Organization)
+    return identities
+
+
+class IdentityFrontier(object):
+    _pending = -1  # Completed values are stored with their completion order instead.
+
+    def __init__(self, db_file, organizations, operations):
+        h = hashlib.sha1()
+        h.update(",".join(sorted(organizations)).encode("utf-8"))
+        self._db = SqliteDict(db_file, tablename="osint_frontier_%s" % h.hexdigest(), autocommit=True, decode=legacy_decode)
+        self._priorities = dict((o, i) for i, o in enumerate(operations))
+        self._heap = []
+        self._known = set()
+        self._completed_count = 0
+
+    def close(self):
+        self._db.close()
+
+    def get_completed(self) -> List[Tuple[str, str]]:
+        # The values completed before an interruption, in the order they were completed.
+        completed = []
+        for key, order in self._db.iteritems():
+            if order != self._pending:
+                operation, value = key.split(":", 1)
+                completed.append((order, operation, value))
+        self._completed_count = len(completed)
+        return [(operation, value) for _, operation, value in sorted(completed)]
+
+    def push(self, operation, value) -> bool:
+        if (operation, value) in self._known:
+            return False
+        self._known.add((operation, value))
+
+        key = "%s:%s" % (operation, value)
+        order = self._db.get(key)
+        if order is None:
+            self._db[key] = self._pending
+        if order is None or order == self._pending:
+            heapq.heappush(self._heap, self._get_heap_item(operation, value))
+        return True
+
+    def pop(self) -> Optional[Tuple[str, str]]:
+        if len(self._heap) == 0:
+            return None
+        _, _, value, operation = heapq.heappop(self._heap)
+        return operation, value
+
+    def complete(self, operation, value):
+        self._db["%s:%s" % (operation, value)] = self._completed_count
+        self._completed_count += 1
+
+    def clear(self):
+        self._db.clear()
+
+    def _get_heap_item(self, operation, value):
+        # Expand the operations in order and start with the most specific (longest) values.
+        return self._priorities[operation], -len(value), value, operation
+
+
+def search_users(api: GithubApi, query_suffix, value, cached=False) -> List[GithubUser]:
+    users = []
+    user_type_selector = {"author": lambda x: x.author, "committer": lambda x: x.committer}
+
+    for prefix, selector in user_type_selector.items():
+        query = "%s%s:\"%s\"" % (prefix, query_suffix, value)
+        logging.info(query)
+        for commit_with_user in api.search_users_from_commits(query, cached=cached):
+            users.append(selector(commit_with_user))
+    return users
+
+
+def get_identity_clusters(api, organizations, db_file, concurrency=1):
+    operations = [LOGINS, EMAILS, NAMES]
+    query_suffixes = {EMAILS: "-email", LOGINS: "", NAMES: "-name"}
+
+    identities = get_users_from_organizations(api, organizations)
+
+    def add_search_results(operation, value_to_query, users):
+        for user in users:
+            for node in identities.add_user(user, UserSourceType.Search, (operation, value_to_query)):
+                frontier.push(*node)
+
+    frontier = IdentityFrontier(db_file, organizations, operations)
+    try:
+        for cluster in identities.get_clusters():
+            for operation, values in cluster.items():
+                for value, _ in values:
+                    frontier.push(operation, value)
+
+        # The searches completed before an interruption are replayed from the cache to rebuild the clusters.
+        completed = frontier.get_completed()
+        if len(completed) > 0:
+            logging.info("Resuming the expansion. Replaying %d cached searches." % len(completed))
+        for operation, value in completed:
+            add_search_results(operation, value, search_users(api, query_suffixes[operation], value, cached=True))
+
+        # The searches run concurrently, but the results are added to the clusters by this thread only.
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            running = {}
+            while True:
+                while len(running) < concurrency:
+                    item = frontier.pop()
+                    if item is None:
+                        break
+                    operation, value_to_query = item
+                    running[executor.submit(search_users, api, query_suffixes[operation], value_to_query)] = item
+
+                if len(running) == 0:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    operation, value_to_query = running.pop(future)
+                    add_search_results(operation, value_to_query, future.result())
+                    frontier.complete(operation, value_to_query)
+
+        frontier.clear()
+    finally:
+        frontier.close()
+
+    return identities.get_clusters()
+
+
+def export_values(file_name, values):
+    with open(file_name, "w") as f:
+        for value in sorted(values):
+            f.write(value + "\n")
 
 
 def main():
@@ -157,6 +230,10 @@ def main():
     parser.add_argument('--organizations', '-O', action='store', dest='organizations', help='File containing organizations to monitor.')
     parser.add_argument('--tokens', '-t', action="store", dest='tokens', help="Github tokens separated by a comma (,)", required=True)
     parser.add_argument('--cached', '-c', action="store_true", dest='cached', default=False, help="Only use cached values.")
+    parser.add_argument('--concurrency', '-C', action="store", dest='concurrency', type=int, default=None, help="Number of concurrent searches. Defaults to the number of tokens.")
+    parser.add_argument('--export-users', action="store", dest='export_users', help="File in which to write the logins, for the --users option of github-secret-finder.")
+    parser.add_argument('--export-emails', action="store", dest='export_emails', help="File in which to write the emails, for the --emails option of github-secret-finder.")
+    parser.add_argument('--export-names', action="store", dest='export_names', help="File in which to write the names, for the --names option of github-secret-finder.")
     parser.add_argument('--verbose', '-V', action="store_true", dest='verbose', default=False, help="Increases output verbosity.")
     args = parser.parse_args()
 
@@ -165,7 +242,8 @@ def main():
         logging.getLogger().setLevel(logging.INFO)
 
     tokens = [t.strip() for t in args.tokens.split(",")]
-    api = GithubApi(GithubApiClient(tokens), GithubSearchClient(tokens), "github-secret-finder.sqlite", args.cached)
+    db_file = "github-secret-finder.sqlite"
+    api = GithubApi(GithubApiClient(tokens), GithubSearchClient(tokens), db_file, args.cached)
 
     if args.organizations:
         with open(args.organizations) as f:
@@ -173,22 +251,20 @@ def main():
     else:
         organizations = [args.organization]
 
-    for relation in get_user_informations_hierarchy(api, organizations):
+    exported_values = {LOGINS: set(), EMAILS: set(), NAMES: set()}
+    for cluster in get_identity_clusters(api, organizations, db_file, args.concurrency or len(tokens)):
         print("============================")
-        logins, emails, names = flatten_relations(relation)
-        displayed_logins = set()
-        displayed_names = set()
-        displayed_emails = set()
-
         for source_type in [UserSourceType.Organization, UserSourceType.Search]:
-            for values, description, displayed in [(logins, "Logins", displayed_logins),
-                                                   (names, "Names", displayed_names),
-                                                   (emails, "Emails", displayed_emails)]:
-                values = [x[1] for x in values if x[0] == source_type and x[1] not in displayed]
-                displayed.update(values)
+            for identity_type, description in [(LOGINS, "Logins"), (NAMES, "Names"), (EMAILS, "Emails")]:
+                values = [value for value, source in cluster[identity_type] if source == source_type]
+                exported_values[identity_type].update(values)
                 if len(values) > 0:
                     print("%s (%s): %s" % (description, source_type.name, ", ".join(values)))
 
+    for file_name, identity_type in [(args.export_users, LOGINS), (args.export_emails, EMAILS), (args.export_names, NAMES)]:
+        if file_name:
+            export_values(file_name, exported_values[identity_type])
+
 
 if __name__ == "__main__":
     main()
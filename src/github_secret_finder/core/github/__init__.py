@@ -1,3 +1,4 @@
 from .github_api_client import GithubApiClient
+from .github_graphql_api_client import GithubGraphqlApiClient
 from .github_search_client import GithubSearchClient
 from .github_api import GithubApi
@@ -0,0 +1,68 @@
+import logging
+import threading
+import time
+from typing import List, Optional, Hashable
+
+
+class _ConcurrencyWindow(object):
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.paused_until = 0.0
+
+    def has_capacity(self, now):
+        return self.paused_until <= now and self.in_flight < max(1, int(self.limit))
+
+
+class AdaptiveConcurrencyController(object):
+    # Secondary rate limits are not announced in advance, so the number of concurrent requests allowed for each token and resource is
+    # probed: it grows by one per window of successful requests and is halved on every secondary rate limit, which also pauses the token.
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=32, default_pause=60):
+        self._initial_limit = initial_limit
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._default_pause = default_pause
+        self._windows = {}
+        self._condition = threading.Condition()
+
+    def acquire(self, tokens: List[Hashable], resource) -> Hashable:
+        # Returns the first token with capacity, in the order of preference. Waits until one has capacity.
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                for token in tokens:
+                    window = self._get_window(token, resource)
+                    if window.has_capacity(now):
+                        window.in_flight += 1
+                        return token
+
+                paused_until = min(self._get_window(t, resource).paused_until for t in tokens)
+                self._condition.wait(paused_until - now if paused_until > now else None)
+
+    def release(self, token: Hashable, resource, throttled=False, retry_after: Optional[float] = None):
+        with self._condition:
+            window = self._get_window(token, resource)
+            saturated = window.in_flight >= max(1, int(window.limit))
+            window.in_flight -= 1
+            if throttled:
+                # The requests that were in flight when the limit was reached are throttled too, but only decrease the limit once.
+                now = time.monotonic()
+                if window.paused_until <= now:
+                    window.limit = max(self._min_limit, window.limit / 2)
+                pause = retry_after if retry_after is not None else self._default_pause
+                window.paused_until = max(window.paused_until, now + pause)
+                logging.warning("Secondary rate limit reached on %s. Pausing the token %d seconds and allowing %d concurrent requests." % (resource, pause, max(1, int(window.limit))))
+            elif saturated:
+                # The limit only grows when it is reached, otherwise it would grow without being tested.
+                window.limit = min(self._max_limit, window.limit + 1 / window.limit)
+            self._condition.notify_all()
+
+    def get_limit(self, token: Hashable, resource):
+        with self._condition:
+            return self._get_window(token, resource).limit
+
+    def _get_window(self, token, resource) -> _ConcurrencyWindow:
+        key = (token, resource)
+        if key not in self._windows:
+            self._windows[key] = _ConcurrencyWindow(self._initial_limit)
+        return self._windows[key]
@@ -1,41 +1,67 @@
-import hashlib
-from typing import Iterable, Union
+import copy
+import functools
+import itertools
+from datetime import datetime, timedelta
+from typing import Iterable, Union, Callable
 
 from sqlitedict import SqliteDict
 
 from .github_api_client import GithubApiClient
-from .github_commit_information_fetcher import GithubCommitInformationFetcher
+from .github_commit_information_fetcher import GithubCommitInformationFetcher, get_table_name
 from .github_search_client import GithubSearchClient
+from .repository_commit_walker import RepositoryCommitWalker
 from .models import GithubCommit, GithubRepository, GithubBranch, GithubCommitWithUsers, GithubUser
 from ..util.legacy_unpickler import legacy_decode
 
 
 class GithubApi(object):
-    _commits_table_prefix = "commits"
-    _commit_users_table_prefix = "commit_users"
-    _repos_table_prefix = "repos"
-    _contributors_table_prefix = "contributors"
-    _branches_table_prefix = "branches"
-    _users_table = "users"
-
-    def __init__(self, api_client: GithubApiClient, search_client: GithubSearchClient, db_file: str, cache_only: bool):
+    COMMITS_TABLE_PREFIX = "commits"
+    COMMIT_USERS_TABLE_PREFIX = "commit_users"
+    REPOS_TABLE_PREFIX = "repos"
+    CONTRIBUTORS_TABLE_PREFIX = "contributors"
+    BRANCHES_TABLE_PREFIX = "branches"
+    USERS_TABLE = "users"
+    _users_ttl = timedelta(days=30)
+
+    def __init__(self, api_client: GithubApiClient, search_client: GithubSearchClient, db_file: str, cache_only: bool, repository_workers=8):
         self._cache_only = cache_only
+        self._repository_workers = repository_workers
         self._api_client = api_client
         self._db_file = db_file
         self._search_client = search_client
-        self._commit_fetcher = GithubCommitInformationFetcher(api_client, search_client, self.get_repository_branches, db_file, self._commits_table_prefix, cache_only, GithubCommit.from_json)
-        self._commits_with_users_fetcher = GithubCommitInformationFetcher(api_client, search_client, self.get_repository_branches, db_file, self._commit_users_table_prefix, cache_only, GithubCommitWithUsers.from_json)
+        self._commit_fetcher = GithubCommitInformationFetcher(api_client, search_client, self.get_repository_branches, db_file, self.COMMITS_TABLE_PREFIX, cache_only, GithubCommit.from_json)
+        self._commits_with_users_fetcher = GithubCommitInformationFetcher(api_client, search_client, self.get_repository_branches, db_file, self.COMMIT_USERS_TABLE_PREFIX, cache_only, GithubCommitWithUsers.from_json)
 
-    def search_commits(self, query) -> Iterable[GithubCommit]:
-        return self._commit_fetcher.search_commits(query)
+    def log_statistics(self):
+        self._api_client.log_statistics()
 
-    def search_users_from_commits(self, query) -> Iterable[GithubCommitWithUsers]:
-        # Assume that if a query returns more than 3000 results, it's too generic.
-        return self._commits_with_users_fetcher.search_commits(query, max_results=3000)
+    def search_commits(self, query, checkpoint=None) -> Iterable[GithubCommit]:
+        return self._commit_fetcher.search_commits(query, checkpoint=checkpoint)
 
-    def get_organization_commits(self, organization) -> Iterable[GithubCommit]:
-        for repo in self.get_organization_repositories(organization):
-            for commit in self._commit_fetcher.get_repository_commits(repo):
+    def search_users_from_commits(self, query, cached=False) -> Iterable[GithubCommitWithUsers]:
+        # Assume that if a query returns more than 3000 results, it's too generic.
+        return self._commits_with_users_fetcher.search_commits(query, max_results=3000, cached=cached)
+
+    def get_organization_commits(self, organization, checkpoint=None) -> Iterable[GithubCommit]:
+        # The repositories are walked concurrently as they are listed.
+        repos = self.get_organization_repositories(organization, checkpoint)
+        if not checkpoint:
+            return RepositoryCommitWalker(self._commit_fetcher.get_repository_commits, self._repository_workers).walk(repos)
+
+        repos = (r for r in repos if r.name not in checkpoint.completed_repositories)
+        walker = RepositoryCommitWalker(lambda r: self._get_repository_commits(r, checkpoint), self._repository_workers)
+        return walker.walk(repos, lambda r: checkpoint.complete_repository(r.name))
+
+    def _get_repository_commits(self, repo: GithubRepository, checkpoint) -> Iterable[Union[GithubCommit, Callable]]:
+        # The commits are consumed by another thread. The repository's checkpoint is saved by the consumer, after the commits listed
+        # before it, so a page is never recorded while some of its commits were not consumed.
+        snapshots = []
+        repo_checkpoint = checkpoint.get_repository_checkpoint(repo.name)
+        repo_checkpoint.attach(lambda c: snapshots.append(copy.copy(c)))
+        for commit in itertools.chain(self._commit_fetcher.get_repository_commits(repo, repo_checkpoint), [None]):
+            while snapshots:
+                yield functools.partial(checkpoint.save_repository_checkpoint, repo.name, snapshots.pop(0))
+            if commit is not None:
                 yield commit
 
     def get_repository_commit_users(self, repo: GithubRepository) -> Iterable[GithubCommitWithUsers]:
@@ -44,19 +70,27 @@ class GithubApi(object):
     def get_commit_patch(self, url) -> str:
         return self._api_client.get_commit_patch(url)
 
-    def get_organization_repositories(self, organization) -> Iterable[GithubRepository]:
-        with self._get_db(self._repos_table_prefix, organization) as db:
-            if not self._cache_only:
-                for repo in self._api_client.get_organization_repositories(organization):
+    def get_organization_repositories(self, organization, checkpoint=None) -> Iterable[GithubRepository]:
+        # The repositories are returned as they are listed, followed by the cached ones that were not listed, e.g. before a resumed page.
+        # They are committed one at a time, so they are never behind the checkpoint's page and the other tables can be written meanwhile.
+        with self._get_db(self.REPOS_TABLE_PREFIX, organization, auto_commit=True) as db:
+            listed_repos = set()
+            listing_completed = checkpoint is not None and checkpoint.repositories_listed
+            if not self._cache_only and not listing_completed:
+                for repo in self._api_client.get_organization_repositories(organization, checkpoint):
                     db[repo.name] = repo
-                db.commit()
+                    listed_repos.add(repo.name)
+                    yield repo
+                if checkpoint:
+                    checkpoint.set_repositories_listed()
 
             for repo in db.itervalues():
-                yield repo
+                if repo.name not in listed_repos:
+                    yield repo
 
-    def get_repository_branches(self, repo: GithubRepository) -> Iterable[GithubBranch]:
-        with self._get_db(self._branches_table_prefix, repo.get_branches_url()) as db:
-            if not self._cache_only:
+    def get_repository_branches(self, repo: GithubRepository, cached=False) -> Iterable[GithubBranch]:
+        with self._get_db(self.BRANCHES_TABLE_PREFIX, repo.get_branches_url()) as db:
+            if not self._cache_only and not cached:
                 for branch in self._api_client.get_repository_branches(repo):
                     db[branch.name] = branch
                 db.commit()
@@ -65,24 +99,26 @@ class GithubApi(object):
                 yield repo
 
     def get_repository_contributors(self, contributors_url) -> Iterable[Union[GithubUser, int]]:
-        with self._get_db(self._contributors_table_prefix, contributors_url) as db:
+        with self._get_db(self.CONTRIBUTORS_TABLE_PREFIX, contributors_url) as db:
             if not self._cache_only:
                 for login, count in self._api_client.get_repository_contributors(contributors_url):
                     db[login] = count
                 db.commit()
 
-                with SqliteDict(self._db_file, tablename=self._users_table, autocommit=True, decode=legacy_decode) as users_db:
-                    for login, count in db.iteritems():
-                        if login in users_db:
-                            yield users_db[login], count
-                        elif not self._cache_only:
-                            user = self._api_client.get_user(login)
-                            if user:
-                                users_db[login] = user
-                                yield user, count
+            with SqliteDict(self._db_file, tablename=self.USERS_TABLE, autocommit=True, decode=legacy_decode) as users_db:
+                contributors = list(db.iteritems())
+
+                if not self._cache_only:
+                    expired_logins = [login for login, _ in contributors if self._is_user_expired(users_db.get(login))]
+                    for login, user in self._api_client.get_users(expired_logins).items():
+                        users_db[login] = user
+
+                for login, count in contributors:
+                    if login in users_db:
+                        yield users_db[login], count
+
+    def _is_user_expired(self, user: GithubUser):
+        return user is None or user.fetched_at is None or datetime.utcnow() - user.fetched_at > self._users_ttl
 
     def _get_db(self, prefix, key, auto_commit=False) -> SqliteDict:
-        h = hashlib.sha1()
-        h.update(key.encode("utf-8"))
-        table_name = "%s_%s" % (prefix, h.hexdigest())
-        return SqliteDict(self._db_file, tablename=table_name, autocommit=auto_commit, decode=legacy_decode)
+        return SqliteDict(self._db_file, tablename=get_table_name(prefix, key), autocommit=auto_commit, decode=legacy_decode)
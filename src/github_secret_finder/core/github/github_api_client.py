@@ -1,14 +1,29 @@
-from typing import Optional, Union, Iterable, TypeVar, Callable, Dict
+import json
+import logging
+from typing import Optional, Union, Iterable, TypeVar, Callable, Dict, List
 
+from .github_memoizing_requester import GithubMemoizingRequester
 from .github_rate_limited_requester import GithubRateLimitedRequester
-from .models import GithubRepository, GithubUser, GithubBranch, BaseGithubCommit
+from .models import GithubRepository, GithubUser, GithubBranch, BaseGithubCommit, GITHUB_API_URL
+from ..util.fast_json import decode_response
+from ..util.metrics import registry as metrics
 
 TCommit = TypeVar('TCommit', bound=BaseGithubCommit)
 
+_patch_bytes = metrics.counter("github_patch_bytes_total", "Size of the commit responses fetched for their patch.")
+
 
 class GithubApiClient(object):
-    def __init__(self, api_tokens):
-        self._requester = GithubRateLimitedRequester(api_tokens)
+    _graphql_url = GITHUB_API_URL + "/graphql"
+    _max_users_per_query = 50
+
+    def __init__(self, api_tokens, api_url=GITHUB_API_URL):
+        self._requester = GithubMemoizingRequester(api_tokens, api_url=api_url)
+        # GraphQL has its own rate limit.
+        self._graphql_requester = GithubRateLimitedRequester(api_tokens, api_url)
+
+    def log_statistics(self):
+        self._requester.log_statistics()
 
     def get_commit_patch(self, url) -> Optional[str]:
         content = ""
@@ -16,7 +31,8 @@ class GithubApiClient(object):
         if not response:
             return None
 
-        json_response = response.json()
+        _patch_bytes.inc(amount=len(response.content))
+        json_response = decode_response(response)
 
         if "files" in json_response:
             for f in json_response["files"]:
@@ -36,12 +52,12 @@ class GithubApiClient(object):
 
         return content
 
-    def get_organization_repositories(self, organization) -> Iterable[GithubRepository]:
-        for repo in self._requester.paginated_get("https://api.github.com/orgs/%s/repos" % organization, lambda x: x):
+    def get_organization_repositories(self, organization, checkpoint=None) -> Iterable[GithubRepository]:
+        for repo in self._requester.paginated_get(GITHUB_API_URL + "/orgs/%s/repos" % organization, lambda x: x, checkpoint=checkpoint):
             if repo["fork"]:
                 response = self._requester.get(repo["url"])
                 if response:
-                    repo = response.json()
+                    repo = decode_response(response)
             yield GithubRepository.from_json(repo)
 
     def get_repository_branches(self, repo: GithubRepository) -> Iterable[GithubBranch]:
@@ -60,25 +76,49 @@ class GithubApiClient(object):
             yield commit
 
     def get_compare_commits(self, repo: GithubRepository, base: GithubBranch, head: GithubBranch, parser: Callable[[Dict], TCommit], compare_with_parent=False) -> Iterable[TCommit]:
-        response = self._requester.get(repo.get_compare_url(base, head, compare_with_parent))
+        url = repo.get_compare_url(base, head, compare_with_parent)
+        response = self._requester.get(url)
         if not response:
             return
-        json_response = response.json()
-
-        # TODO Do something if there are more than 250 commits.
-        for commit in json_response["commits"][::-1]:
+        json_response = decode_response(response)
+        commits = json_response["commits"]
+        total_commits = json_response.get("total_commits", len(commits))
+
+        if total_commits > len(commits):
+            # Only the oldest 250 commits are returned unless the comparison is paginated.
+            logging.info("%d commits in %s. Paginating the comparison." % (total_commits, url))
+            commits = self._requester.paginated_get(url, lambda x: x["commits"], reverse=True)
+        else:
+            commits = commits[::-1]
+        json_response = None
+
+        for commit in commits:
             yield parser(commit)
 
     def get_repository_contributors(self, contributors_url) -> Iterable[Union[str, int]]:
         for contributor in self._requester.paginated_get(contributors_url, lambda x: x):
-            response = self._requester.get(contributor["url"])
-            if response is None:
-                continue
-            json_response = response.json()
-            yield json_response["login"], contributor["contributions"]
+            if "login" in contributor:
+                yield contributor["login"], contributor["contributions"]
 
     def get_user(self, login):
-        response = self._requester.get("https://api.github.com/users/" + login)
+        response = self._requester.get(GITHUB_API_URL + "/users/" + login)
         if not response:
             return None
-        return GithubUser.from_user_json(response.json())
+        return GithubUser.from_user_json(decode_response(response))
+
+    def get_users(self, logins: List[str]) -> Dict[str, GithubUser]:
+        # Many users are fetched with each GraphQL query, using one alias per user.
+        users = {}
+        for i in range(0, len(logins), self._max_users_per_query):
+            batch = logins[i:i + self._max_users_per_query]
+            query = "query { %s }" % " ".join("u%d: user(login: %s) { login name email }" % (j, json.dumps(login)) for j, login in enumerate(batch))
+            response = self._graphql_requester.post(self._graphql_url, {"query": query})
+            if not response:
+                continue
+
+            data = decode_response(response).get("data") or {}
+            for j, login in enumerate(batch):
+                user_json = data.get("u%d" % j)
+                if user_json:
+                    users[login] = GithubUser.from_user_json(user_json)
+        return users
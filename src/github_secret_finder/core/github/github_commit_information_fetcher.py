@@ -7,12 +7,26 @@ from .github_api_client import GithubApiClient
 from .github_search_client import GithubSearchClient
 from .models import GithubRepository, GithubBranch, BaseGithubCommit
 from ..util.legacy_unpickler import legacy_decode
+from ..util.metrics import registry as metrics
 
 T = TypeVar('T', bound=BaseGithubCommit)
 
+_commits = metrics.counter("commits_listed_total", "Commits listed from the cache or from the Github API.", ["table", "source"])
+_branch_scans = metrics.counter("branch_scans_total", "Branches read from the cache only because they did not move, or listed from the Github API.", ["table", "source"])
+
+
+def get_table_name(prefix, key):
+    h = hashlib.sha1()
+    h.update(key.encode("utf-8"))
+    return "%s_%s" % (prefix, h.hexdigest())
+
+
+def get_scan_state_table_name(prefix):
+    return prefix + "_scan_state"
+
 
 class GithubCommitInformationFetcher(Generic[T]):
-    def __init__(self, api_client: GithubApiClient, search_client: GithubSearchClient, get_repository_branches: Callable[[GithubRepository], Iterable[GithubBranch]], db_file: str, table_prefix: str, cache_only: bool, json_parser: Callable[[Dict], T]):
+    def __init__(self, api_client: GithubApiClient, search_client: GithubSearchClient, get_repository_branches: Callable[..., Iterable[GithubBranch]], db_file: str, table_prefix: str, cache_only: bool, json_parser: Callable[[Dict], T]):
         self._get_repository_branches = get_repository_branches
         self._db_file = db_file
         self._table_prefix = table_prefix
@@ -21,21 +35,35 @@ class GithubCommitInformationFetcher(Generic[T]):
         self._search_client = search_client
         self._api_client = api_client
 
-    def search_commits(self, query, max_results=-1) -> Iterable[T]:
-        return self._get_commits(query, lambda x: self._search_client.search_commits(query, self._json_parser, max_results))
+    def search_commits(self, query, max_results=-1, checkpoint=None, cached=False) -> Iterable[T]:
+        if cached:
+            return self._get_cached_commits(query)
+
+        # A resumed search starts in the middle of the results, after commits that were already cached.
+        resuming = checkpoint is not None and checkpoint.page_url is not None
+        return self._get_commits(query, lambda x: self._search_client.search_commits(query, self._json_parser, max_results, checkpoint), stop_at_cached=not resuming)
+
+    def get_repository_commits(self, repo: GithubRepository, checkpoint=None) -> Iterable[T]:
+        with SqliteDict(self._db_file, tablename=get_scan_state_table_name(self._table_prefix), autocommit=True, decode=legacy_decode) as scan_state_db:
+            for commit in self._get_repository_commits(repo, scan_state_db, checkpoint):
+                yield commit
+
+    def _get_repository_commits(self, repo: GithubRepository, scan_state_db: SqliteDict, checkpoint=None) -> Iterable[T]:
+        # Nothing was pushed to the repository since its last completed scan, so only the cache is used.
+        repo_state_key = "repo:" + repo.name
+        repo_unchanged = repo.pushed_at is not None and scan_state_db.get(repo_state_key) == repo.pushed_at
 
-    def get_repository_commits(self, repo: GithubRepository) -> Iterable[T]:
-        branches = list(self._get_repository_branches(repo))
+        branches = list(self._get_repository_branches(repo, cached=repo_unchanged))
         default_branch = [b for b in branches if b.name == repo.default_branch][0]
 
+        # Each step is a branch and the branch it is compared with, if any.
+        steps = []
         if not repo.is_fork or repo.parent is None:
             # Return commits from the default branch.
-            for commit in self._get_commits(self._get_branch_cache_key(repo, default_branch), lambda since_commit: self._api_client.get_branch_commits(repo, default_branch, self._json_parser, since_commit)):
-                yield commit
-
+            steps.append((default_branch, None))
             parent_branches = branches
         else:
-            parent_branches = list(self._get_repository_branches(repo.parent))
+            parent_branches = list(self._get_repository_branches(repo.parent, cached=repo_unchanged))
 
         # For each branch, return commits that are not in the default branch.
         for branch in branches:
@@ -45,42 +73,70 @@ class GithubCommitInformationFetcher(Generic[T]):
                 if branch == default_branch:
                     continue  # The commits for this branch were already returned.
                 base_branch = default_branch
+            steps.append((branch, base_branch))
+
+        if checkpoint:
+            steps = checkpoint.resume_from("branch", steps, lambda step: step[0].name)
+
+        for branch, base_branch in steps:
+            if checkpoint:
+                checkpoint.set_branch(branch.name)
+
+            cache_key = self.get_branch_cache_key(repo, branch)
+            branch_state_key = "branch:" + cache_key
+            if repo_unchanged or scan_state_db.get(branch_state_key) == branch.sha:
+                # The head of the branch did not move since its last completed scan.
+                _branch_scans.inc(self._table_prefix, "cache")
+                commits = self._get_cached_commits(cache_key)
+            elif base_branch is None:
+                _branch_scans.inc(self._table_prefix, "api")
+                commits = self._get_commits(cache_key, lambda since_commit: self._api_client.get_branch_commits(repo, branch, self._json_parser, since_commit))
+            else:
+                _branch_scans.inc(self._table_prefix, "api")
+                commits = self._get_commits(cache_key, lambda x: self._api_client.get_compare_commits(repo, base_branch, branch, self._json_parser, compare_with_parent=repo.is_fork))
 
-            cache_key = self._get_branch_cache_key(repo, branch)
-            for commit in self._get_commits(cache_key, lambda x: self._api_client.get_compare_commits(repo, base_branch, branch, self._json_parser, compare_with_parent=repo.is_fork)):
+            for commit in commits:
                 yield commit
 
-    def _get_commits(self, db_key, commit_source) -> Iterable[T]:
+            if not self._cache_only:
+                scan_state_db[branch_state_key] = branch.sha
+
+        if not self._cache_only and repo.pushed_at is not None:
+            scan_state_db[repo_state_key] = repo.pushed_at
+
+    def _get_commits(self, db_key, commit_source, stop_at_cached=True) -> Iterable[T]:
         if self._cache_only:
             return self._get_cached_commits(db_key)
         else:
-            return self._get_new_and_cached_commits(db_key, commit_source)
+            return self._get_new_and_cached_commits(db_key, commit_source, stop_at_cached)
 
     def _get_cached_commits(self, db_key) -> Iterable[T]:
         with self._get_db(self._table_prefix, db_key) as db:
             for commit in db.itervalues():
+                _commits.inc(self._table_prefix, "cache")
                 yield commit
 
-    def _get_new_and_cached_commits(self, db_key, new_commit_source) -> Iterable[T]:
+    def _get_new_and_cached_commits(self, db_key, new_commit_source, stop_at_cached=True) -> Iterable[T]:
         with self._get_db(self._table_prefix, db_key, auto_commit=True) as db:
             since_commit = None
 
             for commit in db.itervalues():
                 since_commit = commit
+                _commits.inc(self._table_prefix, "cache")
                 yield commit
 
             for commit in new_commit_source(since_commit):
                 if commit.sha in db:
-                    break
+                    if stop_at_cached:
+                        break
+                    continue
                 db[commit.sha] = commit
+                _commits.inc(self._table_prefix, "api")
                 yield commit
 
     def _get_db(self, prefix, key, auto_commit=False) -> SqliteDict:
-        h = hashlib.sha1()
-        h.update(key.encode("utf-8"))
-        table_name = "%s_%s" % (prefix, h.hexdigest())
-        return SqliteDict(self._db_file, tablename=table_name, autocommit=auto_commit, decode=legacy_decode)
+        return SqliteDict(self._db_file, tablename=get_table_name(prefix, key), autocommit=auto_commit, decode=legacy_decode)
 
     @staticmethod
-    def _get_branch_cache_key(repo: GithubRepository, branch: GithubBranch):
+    def get_branch_cache_key(repo: GithubRepository, branch: GithubBranch):
         return repo.name + "/" + branch.name
@@ -0,0 +1,100 @@
+import logging
+from typing import Iterable, Dict, Optional
+
+from .github_api_client import GithubApiClient
+from .models import GithubRepository, GithubBranch, GITHUB_API_URL
+from ..util.fast_json import decode_response
+
+_branches_fragment = """
+fragment branches on Repository {
+  refs(first: 100, refPrefix: "refs/heads/", after: $branchesCursor) {
+    pageInfo { hasNextPage endCursor }
+    nodes { name target { oid } }
+  }
+}
+"""
+
+_repositories_query = """
+query($organization: String!, $cursor: String, $branchesCursor: String) {
+  organization(login: $organization) {
+    repositories(first: 25, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        nameWithOwner isFork pushedAt
+        defaultBranchRef { name }
+        parent { nameWithOwner isFork pushedAt defaultBranchRef { name } }
+        ...branches
+      }
+    }
+  }
+}
+""" + _branches_fragment
+
+_branches_query = """
+query($owner: String!, $name: String!, $branchesCursor: String) {
+  repository(owner: $owner, name: $name) {
+    ...branches
+  }
+}
+""" + _branches_fragment
+
+
+class GithubGraphqlApiClient(GithubApiClient):
+    # Lists the repositories of an organization, with their fork parent and branches, in a single query for many repositories.
+    def __init__(self, api_tokens, api_url=GITHUB_API_URL):
+        super().__init__(api_tokens, api_url)
+        self._prefetched_branches = {}
+
+    def get_organization_repositories(self, organization, checkpoint=None) -> Iterable[GithubRepository]:
+        listing_key = "graphql:%s" % organization
+        cursor = checkpoint.get_page(listing_key) if checkpoint else None
+        while True:
+            data = self._query(_repositories_query, {"organization": organization, "cursor": cursor})
+            if data is None or data.get("organization") is None:
+                return
+
+            repositories = data["organization"]["repositories"]
+            for repo_json in repositories["nodes"]:
+                repo = GithubRepository.from_graphql_json(repo_json)
+                refs = repo_json["refs"]
+                if not refs["pageInfo"]["hasNextPage"]:
+                    # All the branches were returned with the repository.
+                    self._prefetched_branches[repo.name] = [GithubBranch.from_graphql_json(b) for b in refs["nodes"]]
+                yield repo
+
+            if not repositories["pageInfo"]["hasNextPage"]:
+                return
+            cursor = repositories["pageInfo"]["endCursor"]
+            if checkpoint:
+                checkpoint.set_page(listing_key, cursor)
+
+    def get_repository_branches(self, repo: GithubRepository) -> Iterable[GithubBranch]:
+        if repo.name in self._prefetched_branches:
+            for branch in self._prefetched_branches.pop(repo.name):
+                yield branch
+            return
+
+        owner, name = repo.name.split("/", 1)
+        cursor = None
+        while True:
+            data = self._query(_branches_query, {"owner": owner, "name": name, "branchesCursor": cursor})
+            if data is None or data.get("repository") is None:
+                return
+
+            refs = data["repository"]["refs"]
+            for branch_json in refs["nodes"]:
+                yield GithubBranch.from_graphql_json(branch_json)
+
+            if not refs["pageInfo"]["hasNextPage"]:
+                return
+            cursor = refs["pageInfo"]["endCursor"]
+
+    def _query(self, query, variables) -> Optional[Dict]:
+        response = self._graphql_requester.post(self._graphql_url, {"query": query, "variables": variables})
+        if not response:
+            return None
+
+        json_response = decode_response(response)
+        if json_response.get("errors"):
+            logging.error("GraphQL query failed: %s" % "; ".join(e.get("message", "") for e in json_response["errors"]))
+        return json_response.get("data")
@@ -0,0 +1,71 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from .github_rate_limited_requester import GithubRateLimitedRequester
+from .models import GITHUB_API_URL
+from ..util.metrics import registry as metrics
+
+_cached_requests = metrics.counter("github_request_cache_total", "GET requests served by the response cache, shared with an identical request, or made.", ["result"])
+
+
+class GithubMemoizingRequester(GithubRateLimitedRequester):
+    # Forks re-list the branches of their parent, and both commit fetchers read the same listings.
+    # Identical GETs made at the same time share a single request, and their responses are reused until they expire.
+    def __init__(self, tokens, ttl=300, max_entries=1024, max_response_size=1000000, api_url=GITHUB_API_URL):
+        super().__init__(tokens, api_url)
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_response_size = max_response_size
+        self._responses = OrderedDict()
+        self._in_progress = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, url):
+        with self._lock:
+            cached = self._responses.get(url)
+            if cached is not None and cached[1] > time.monotonic():
+                self._responses.move_to_end(url)
+                self.hits += 1
+                _cached_requests.inc("hit")
+                return cached[0]
+
+            future = self._in_progress.get(url)
+            if future is not None:
+                self.coalesced += 1
+                _cached_requests.inc("coalesced")
+                return_future = True
+            else:
+                self.misses += 1
+                _cached_requests.inc("miss")
+                future = self._in_progress[url] = Future()
+                return_future = False
+
+        if return_future:
+            return future.result()
+
+        try:
+            response = super().get(url)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_progress[url]
+                # Failed requests are not cached, so they are retried by the next caller. Large commits are rarely read twice.
+                if future.exception() is None and future.result() is not None and len(future.result().content) <= self._max_response_size:
+                    self._responses[url] = (future.result(), time.monotonic() + self._ttl)
+                    while len(self._responses) > self._max_entries:
+                        self._responses.popitem(last=False)
+
+    def log_statistics(self):
+        total = self.hits + self.misses + self.coalesced
+        if total > 0:
+            logging.info("Request cache: %d hits, %d coalesced, %d misses (%.0f%% served from memory)." % (self.hits, self.coalesced, self.misses, 100 * (self.hits + self.coalesced) / total))
@@ -3,43 +3,93 @@ import operator
 import time
 import urllib.parse as urlparse
 from datetime import datetime
+from typing import Optional
 from urllib.parse import urlencode
 
-import requests
-from requests import RequestException
-
+from .adaptive_concurrency_controller import AdaptiveConcurrencyController
 from .github_token_rate_limit_information import GithubTokenRateLimitInformation
+from .models import GITHUB_API_URL
+from ..util.fast_json import decode_response
+from ..util.metrics import registry as metrics
+from ..util.profiler import profiler
+
+_requests = metrics.counter("github_requests_total", "Requests made to the Github API.", ["token", "resource", "status"])
+_request_duration = metrics.histogram("github_request_duration_seconds", "Duration of the requests made to the Github API.", ["resource"])
+_wait_seconds = metrics.counter("github_wait_seconds_total", "Time spent waiting for the rate limits and retries of the Github API.", ["reason"])
+_remaining_calls = metrics.gauge("github_rate_limit_remaining", "Remaining calls of each token before its rate limit.", ["token"])
 
 
 class GithubRateLimitedRequester(object):
     _max_retries = 5
-    _throttle_messages = ["API rate limit exceeded", "abuse detection mechanism"]
+    _max_throttled_retries = 20
+    _throttle_messages = ["API rate limit exceeded", "abuse detection mechanism", "secondary rate limit"]
 
-    def __init__(self, tokens):
+    def __init__(self, tokens, api_url=GITHUB_API_URL):
         self._token_infos = []
-        for t in tokens:
-            self._token_infos.append(GithubTokenRateLimitInformation(t))
+        for i, t in enumerate(tokens):
+            self._token_infos.append(GithubTokenRateLimitInformation(t, str(i)))
+        self._concurrency = AdaptiveConcurrencyController()
+        self._api_url = api_url.rstrip("/")
 
     def get(self, url):
+        return self._request("get", url)
+
+    def post(self, url, json):
+        return self._request("post", url, json=json)
+
+    def _request(self, method, url, **kwargs):
+        # requests takes a while to import, and is not needed by the commands that only read the database.
+        import requests
+
+        url = self._get_api_url(url)
+        resource = self._get_resource(url)
         retry = 1
+        throttled_retry = 0
         while True:
             status_codes = []
-            for token_info in sorted(self._token_infos, key=operator.attrgetter("remaining"), reverse=True):
-                if token_info.remaining == 0 and token_info.reset_time > datetime.utcnow():
-                    continue
+            throttled = False
+            tried_tokens = []
+            while True:
+                available_tokens = [t for t in sorted(self._token_infos, key=operator.attrgetter("remaining"), reverse=True)
+                                    if t not in tried_tokens and not (t.remaining == 0 and t.reset_time > datetime.utcnow())]
+                if not available_tokens:
+                    break
 
+                wait_start = time.perf_counter()
+                with profiler.time("token_wait"):
+                    token_info = self._concurrency.acquire(available_tokens, resource)
+                _wait_seconds.inc("concurrency", amount=time.perf_counter() - wait_start)
+                tried_tokens.append(token_info)
+                token_throttled = False
+                retry_after = None
                 try:
-                    response = requests.get(url, headers={'Accept': 'application/vnd.github.cloak-preview', 'Authorization': "token " + token_info.token})
+                    with _request_duration.time(resource):
+                        response = requests.request(method, url, headers={'Accept': 'application/vnd.github.cloak-preview', 'Authorization': "token " + token_info.token}, **kwargs)
                     status_codes.append(response.status_code)
+                    _requests.inc(token_info.label, resource, str(response.status_code))
                     token_info.update(response)
+                    _remaining_calls.set(token_info.remaining, token_info.label)
+
+                    token_throttled = self._is_throttled(response)
+                    if token_throttled:
+                        throttled = True
+                        retry_after = self._get_retry_after(response)
 
                     if response.status_code == 200:
                         return response
 
                     if response.status_code == 404:
                         return None
-                except RequestException:
+                except requests.RequestException:
+                    _requests.inc(token_info.label, resource, "error")
                     continue
+                finally:
+                    self._concurrency.release(token_info, resource, token_throttled, retry_after)
+
+            # Secondary rate limits pause the tokens in the concurrency controller, which waits for them.
+            if throttled and throttled_retry < self._max_throttled_retries:
+                throttled_retry += 1
+                continue
 
             if retry >= self._max_retries:
                 logging.error("Could not get %s. Skipping." % url)
@@ -47,29 +97,69 @@ class GithubRateLimitedRequester(object):
             if all(t.remaining == 0 for t in self._token_infos):
                 # Assume the calls failed because of a timeout.
                 sleep_time = (min([t.reset_time for t in self._token_infos]) - datetime.utcnow()).total_seconds() + 1
+                sleep_reason = "rate_limit"
                 logging.warning("Rate limit reached. Sleeping %d seconds." % sleep_time)
             else:
                 sleep_time = retry * 5
+                sleep_reason = "error"
                 logging.error("Unhandled error. Retrying in %d seconds." % sleep_time)
 
             retry += 1
             if sleep_time > 0:
-                time.sleep(sleep_time)
+                _wait_seconds.inc(sleep_reason, amount=sleep_time)
+                with profiler.time(sleep_reason + "_sleep"):
+                    time.sleep(sleep_time)
+
+    def _is_throttled(self, response):
+        # Primary rate limits are handled with the remaining calls of the tokens.
+        if response.status_code not in (403, 429) or response.headers.get("X-RateLimit-Remaining") == "0":
+            return False
+        return "Retry-After" in response.headers or any(m in response.text for m in self._throttle_messages)
 
-    def paginated_get(self, url, items_selector, max_results=-1, reverse=False):
+    @staticmethod
+    def _get_retry_after(response) -> Optional[float]:
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return None
+
+    def _get_api_url(self, url):
+        # The URLs also name the cached tables, so they keep the address of the public API until they are requested, e.g. from a local stand-in.
+        if self._api_url != GITHUB_API_URL and url.startswith(GITHUB_API_URL + "/"):
+            return self._api_url + url[len(GITHUB_API_URL):]
+        return url
+
+    def _get_resource(self, url):
+        # Secondary rate limits differ between the search, GraphQL and other endpoints.
+        path = urlparse.urlparse(url).path
+        api_path = urlparse.urlparse(self._api_url).path
+        if api_path and path.startswith(api_path + "/"):
+            path = path[len(api_path):]
+        if path.startswith("/search/"):
+            return "search"
+        if path.startswith("/graphql"):
+            return "graphql"
+        return "core"
+
+    def paginated_get(self, url, items_selector, max_results=-1, reverse=False, checkpoint=None):
         url = self._add_url_params(url, {"page": "1", "per_page": 100})
         if reverse:
+            # Reversed listings are resumed by the caller using the newest commit that was already cached.
             return self._paginated_get_reverse(url, items_selector, max_results)
         else:
-            return self._paginated_get_normal(url, items_selector, max_results)
+            return self._paginated_get_normal(url, items_selector, max_results, checkpoint)
+
+    def _paginated_get_normal(self, url, items_selector, max_results, checkpoint=None):
+        first_url = url
+        if checkpoint:
+            url = checkpoint.get_page(first_url) or url
 
-    def _paginated_get_normal(self, url, items_selector, max_results):
         while True:
             response = self.get(url)
             if not response:
                 break
 
-            json_response = response.json()
+            json_response = decode_response(response)
             if max_results != -1 and json_response["total_count"] > max_results:
                 break
 
@@ -78,6 +168,8 @@ class GithubRateLimitedRequester(object):
 
             if "next" in response.links:
                 url = response.links["next"]["url"]
+                if checkpoint:
+                    checkpoint.set_page(first_url, url)
             else:
                 break
 
@@ -86,7 +178,7 @@ class GithubRateLimitedRequester(object):
         first_response = self.get(url)
         if not first_response:
             return
-        first_json_response = first_response.json()
+        first_json_response = decode_response(first_response)
         if max_results != -1 and first_json_response["total_count"] > max_results:
             return
 
@@ -98,7 +190,7 @@ class GithubRateLimitedRequester(object):
                 response = self.get(url)
                 if not response:
                     break
-                json_response = response.json()
+                json_response = decode_response(response)
             else:
                 response = first_response
                 json_response = first_json_response
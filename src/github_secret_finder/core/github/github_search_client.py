@@ -1,21 +1,21 @@
 from typing import Iterable, TypeVar, Callable, Dict
 
 from .github_rate_limited_requester import GithubRateLimitedRequester
-from .models import BaseGithubCommit
+from .models import BaseGithubCommit, GITHUB_API_URL
 
 TCommit = TypeVar('TCommit', bound=BaseGithubCommit)
 
 
 class GithubSearchClient(object):
-    def __init__(self, api_tokens):
-        self._requester = GithubRateLimitedRequester(api_tokens)
+    def __init__(self, api_tokens, api_url=GITHUB_API_URL):
+        self._requester = GithubRateLimitedRequester(api_tokens, api_url)
 
-    def search_commits(self, query, parser: Callable[[Dict], TCommit], max_results=-1) -> Iterable[TCommit]:
-        for item in self._query_commits(query, max_results):
+    def search_commits(self, query, parser: Callable[[Dict], TCommit], max_results=-1, checkpoint=None) -> Iterable[TCommit]:
+        for item in self._query_commits(query, max_results, checkpoint):
             yield parser(item)
 
-    def _query_commits(self, query, max_results=-1):
-        return self._requester.paginated_get("https://api.github.com/search/commits?sort=committer-date&order=desc&q=" + query.replace(" ", "+"), lambda x: x["items"], max_results)
+    def _query_commits(self, query, max_results=-1, checkpoint=None):
+        return self._requester.paginated_get(GITHUB_API_URL + "/search/commits?sort=committer-date&order=desc&q=" + query.replace(" ", "+"), lambda x: x["items"], max_results, checkpoint=checkpoint)
 
     @staticmethod
     def _update_counts(counts_dict, key):
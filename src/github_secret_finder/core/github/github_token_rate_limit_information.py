@@ -1,15 +1,17 @@
-import email.utils as eut
 from datetime import datetime, timedelta
 
 
 class GithubTokenRateLimitInformation(object):
-    def __init__(self, token):
+    def __init__(self, token, label=None):
         self.token = token
+        self.label = label  # Identifies the token in the metrics, without exposing it.
         self.limit = 30
         self.remaining = 30
         self.reset_time = datetime.now() + timedelta(seconds=60)
 
     def update(self, response):
+        import email.utils as eut
+
         server_now = datetime(*eut.parsedate(response.headers["date"])[:6])
 
         if "X-RateLimit-Reset" in response.headers:
@@ -1,5 +1,24 @@
 from datetime import datetime, timedelta
 
+# The URLs are built with the address of the public API, and sent to the configured API by the requester.
+GITHUB_API_URL = "https://api.github.com"
+
+
+class SlottedModel(object):
+    # Commits and users are built by the thousands, so they have no __dict__. Their state is pickled as a dict, like the objects
+    # cached by previous versions, whose missing attributes are set to None.
+    __slots__ = ()
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for cls in type(self).__mro__ for name in getattr(cls, "__slots__", ()) if hasattr(self, name))
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            state = dict(state[0] or {}, **(state[1] or {}))
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                object.__setattr__(self, name, state.get(name))
+
 
 class GithubBranch(object):
     def __init__(self, name, sha):
@@ -7,7 +26,7 @@ class GithubBranch(object):
         self.name = name
 
     def get_commits_url(self, repo: 'GithubRepository', since: datetime = None):
-        url = "https://api.github.com/repos/%s/commits?sha=%s" % (repo.name, self.sha)
+        url = "%s/repos/%s/commits?sha=%s" % (GITHUB_API_URL, repo.name, self.sha)
         if since is not None:
             url += "&since=" + since.strftime("%Y-%m-%dT%H:%M:%SZ")
         return url
@@ -16,55 +35,90 @@ class GithubBranch(object):
     def from_json(json) -> 'GithubBranch':
         return GithubBranch(json["name"], json["commit"]["sha"])
 
+    @staticmethod
+    def from_graphql_json(json) -> 'GithubBranch':
+        return GithubBranch(json["name"], json["target"]["oid"])
+
 
 class GithubRepository(object):
-    def __init__(self, name: str, default_branch: str, is_fork: bool, parent: 'GithubRepository'):
+    pushed_at = None  # Not available on repositories cached by previous versions.
+
+    def __init__(self, name: str, default_branch: str, is_fork: bool, parent: 'GithubRepository', pushed_at: str = None):
         self.name = name
         self.default_branch = default_branch
         self.parent = parent
         self.is_fork = is_fork
+        self.pushed_at = pushed_at
 
     def get_branches_url(self):
-        return "https://api.github.com/repos/%s/branches" % self.name
+        return "%s/repos/%s/branches" % (GITHUB_API_URL, self.name)
 
     def get_contributors_url(self):
-        return "https://api.github.com/repos/%s/contributors" % self.name
+        return "%s/repos/%s/contributors" % (GITHUB_API_URL, self.name)
 
     def get_compare_url(self, base: GithubBranch, head: GithubBranch, compare_with_parent=False):
         if compare_with_parent:
-            return "https://api.github.com/repos/%s/compare/%s...%s:%s" % (self.parent.name, base.name, self.name.split("/")[0], head.name)
+            return "%s/repos/%s/compare/%s...%s:%s" % (GITHUB_API_URL, self.parent.name, base.name, self.name.split("/")[0], head.name)
         else:
-            return "https://api.github.com/repos/%s/compare/%s...%s" % (self.name, base.name, head.name)
+            return "%s/repos/%s/compare/%s...%s" % (GITHUB_API_URL, self.name, base.name, head.name)
 
     @staticmethod
     def from_json(json) -> 'GithubRepository':
         parent = None
         if "parent" in json:
             parent = GithubRepository.from_json(json["parent"])
-        return GithubRepository(json["full_name"], json["default_branch"], json["fork"], parent)
+        return GithubRepository(json["full_name"], json["default_branch"], json["fork"], parent, json.get("pushed_at"))
 
+    @staticmethod
+    def from_graphql_json(json) -> 'GithubRepository':
+        parent = None
+        if json.get("parent"):
+            parent = GithubRepository.from_graphql_json(json["parent"])
+        default_branch = json["defaultBranchRef"]["name"] if json.get("defaultBranchRef") else None
+        return GithubRepository(json["nameWithOwner"], default_branch, json["isFork"], parent, json.get("pushedAt"))
 
-class BaseGithubCommit(object):
-    def __init__(self, sha, api_url, date: datetime):
+
+class BaseGithubCommit(SlottedModel):
+    __slots__ = ("sha", "api_url", "date", "parents")
+
+    def __init__(self, sha, api_url, date: datetime, parents=None):
         self.date = date
         self.api_url = api_url
         self.sha = sha
+        self.parents = parents
+
+    def is_merge(self):
+        return self.parents is not None and len(self.parents) > 1
+
+    def get_compare_url(self, base_sha):
+        # The API URL of a commit is https://api.github.com/repos/<owner>/<name>/commits/<sha>.
+        return "%s/compare/%s...%s" % (self.api_url.rsplit("/commits/", 1)[0], base_sha, self.sha)
+
+    @staticmethod
+    def _parse_parents(json):
+        if "parents" not in json:
+            return None
+        return [p["sha"] for p in json["parents"]]
 
     @staticmethod
     def _parse_date(s):
+        # The dates are either 2020-01-31T12:00:00Z or 2020-01-31T12:00:00-05:00. Slicing is much faster than strptime.
         try:
+            date = datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]))
             if len(s) >= 25:
-                return datetime.strptime(s[:19], "%Y-%m-%dT%H:%M:%S") + (1 if s[19] == '-' else -1) * timedelta(
-                    hours=int(s[20:22]), minutes=int(s[23:25]))
-            else:
-                return datetime.strptime(s, "%Y-%m-%dT%H:%M:%SZ")
-        except ValueError:
+                date += (1 if s[19] == '-' else -1) * timedelta(hours=int(s[20:22]), minutes=int(s[23:25]))
+            elif s[19:] != "Z":
+                return datetime.min
+            return date
+        except (ValueError, IndexError, TypeError):
             return datetime.min
 
 
 class GithubCommit(BaseGithubCommit):
-    def __init__(self, sha, api_url, html_url, date: datetime):
-        super().__init__(sha, api_url, date)
+    __slots__ = ("html_url",)
+
+    def __init__(self, sha, api_url, html_url, date: datetime, parents=None):
+        super().__init__(sha, api_url, date, parents)
         self.html_url = html_url
 
     def __str__(self):
@@ -72,14 +126,17 @@ class GithubCommit(BaseGithubCommit):
 
     @staticmethod
     def from_json(json) -> 'GithubCommit':
-        return GithubCommit(json["sha"], json["url"], json["html_url"], BaseGithubCommit._parse_date(json["commit"]["committer"]["date"]))
+        return GithubCommit(json["sha"], json["url"], json["html_url"], BaseGithubCommit._parse_date(json["commit"]["committer"]["date"]), BaseGithubCommit._parse_parents(json))
 
 
-class GithubUser(object):
+class GithubUser(SlottedModel):
+    __slots__ = ("login", "name", "email", "fetched_at")
+
     def __init__(self, login, name, email):
         self.login = login.lower() if login else None
         self.name = name.lower() if name else None
         self.email = email.lower() if email else None
+        self.fetched_at = None  # Only set on the users fetched from their profile.
 
     def __hash__(self):
         return hash((self.login, self.email, self.name))
@@ -89,7 +146,9 @@ class GithubUser(object):
 
     @staticmethod
     def from_user_json(json) -> 'GithubUser':
-        return GithubUser(json["login"], json["name"], json["email"])
+        user = GithubUser(json["login"], json["name"], json["email"])
+        user.fetched_at = datetime.utcnow()
+        return user
 
     @staticmethod
     def from_commit_json(json, user_type) -> 'GithubUser':
@@ -101,8 +160,10 @@ class GithubUser(object):
 
 
 class GithubCommitWithUsers(BaseGithubCommit):
-    def __init__(self, sha, api_url, date: datetime, committer: GithubUser, author: GithubUser):
-        super().__init__(sha, api_url, date)
+    __slots__ = ("committer", "author")
+
+    def __init__(self, sha, api_url, date: datetime, committer: GithubUser, author: GithubUser, parents=None):
+        super().__init__(sha, api_url, date, parents)
         self.author = author
         self.committer = committer
 
@@ -111,4 +172,4 @@ class GithubCommitWithUsers(BaseGithubCommit):
         commit = json["commit"]
         author = GithubUser.from_commit_json(json, "author")
         committer = GithubUser.from_commit_json(json, "committer")
-        return GithubCommitWithUsers(json["sha"], json["url"], BaseGithubCommit._parse_date(commit["committer"]["date"]), committer, author)
+        return GithubCommitWithUsers(json["sha"], json["url"], BaseGithubCommit._parse_date(commit["committer"]["date"]), committer, author, BaseGithubCommit._parse_parents(json))
@@ -0,0 +1,92 @@
+import queue
+import threading
+from typing import Callable, Iterable, Union
+
+from .models import GithubRepository, BaseGithubCommit
+
+_end = object()
+
+
+class _RepositoryCompleted(object):
+    def __init__(self, repository: GithubRepository):
+        self.repository = repository
+
+
+class RepositoryCommitWalker(object):
+    # Each repository is walked by a single worker, so a large repository holds one worker while the others continue.
+    # Workers blocked on the full commit queue are woken in the order they blocked, which interleaves the repositories.
+    # Callables returned with the commits of a repository are called by the consumer, in order with the commits.
+    def __init__(self, get_repository_commits: Callable[[GithubRepository], Iterable[Union[BaseGithubCommit, Callable]]], workers=8, queue_size=64):
+        self._get_repository_commits = get_repository_commits
+        self._workers = workers
+        self._queue_size = queue_size
+
+    def walk(self, repositories: Iterable[GithubRepository], on_repository_completed: Callable[[GithubRepository], None] = None) -> Iterable[BaseGithubCommit]:
+        repository_queue = queue.Queue(self._workers)
+        commit_queue = queue.Queue(self._queue_size)
+        aborted = threading.Event()
+        errors = []
+
+        def feed():
+            try:
+                for repository in repositories:
+                    if aborted.is_set():
+                        return
+                    repository_queue.put(repository)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                for _ in range(self._workers):
+                    repository_queue.put(_end)
+
+        def work():
+            try:
+                while not aborted.is_set():
+                    repository = repository_queue.get()
+                    if repository is _end:
+                        break
+                    for commit in self._get_repository_commits(repository):
+                        if aborted.is_set():
+                            return
+                        commit_queue.put(commit)
+                    commit_queue.put(_RepositoryCompleted(repository))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                commit_queue.put(_end)
+
+        threads = [threading.Thread(target=feed, daemon=True)] + [threading.Thread(target=work, daemon=True) for _ in range(self._workers)]
+        for t in threads:
+            t.start()
+
+        try:
+            running_workers = self._workers
+            while running_workers > 0:
+                item = commit_queue.get()
+                if item is _end:
+                    running_workers -= 1
+                    if errors:
+                        break
+                elif isinstance(item, _RepositoryCompleted):
+                    # Reached after every commit of the repository was consumed.
+                    if on_repository_completed:
+                        on_repository_completed(item.repository)
+                elif callable(item):
+                    item()
+                else:
+                    yield item
+        finally:
+            # Also reached when the consumer stops iterating. The queues are drained to unblock the threads.
+            aborted.set()
+            while any(t.is_alive() for t in threads):
+                for q in (commit_queue, repository_queue):
+                    try:
+                        while True:
+                            q.get_nowait()
+                    except queue.Empty:
+                        pass
+                for t in threads:
+                    t.join(0.01)
+
+        if errors:
+            raise errors[0]
@@ -0,0 +1 @@
+from .cache_maintenance import CacheMaintenance
@@ -0,0 +1,250 @@
+import logging
+import os
+import re
+import sqlite3
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from ..github import GithubApi
+from ..github.github_commit_information_fetcher import GithubCommitInformationFetcher, get_table_name, get_scan_state_table_name
+from ..github.models import GithubRepository
+from ..scheduling import QueryScheduler, OperationLeaseQueue
+from ..scheduling.query_scheduler_operation import QuerySchedulerOperation
+from ..secret_finder import SecretFinder
+from ..util.legacy_unpickler import legacy_decode
+
+_hashed_table_pattern = re.compile(r"^(.*)_[0-9a-f]{40}$")
+
+
+def _format_size(size):
+    return "%.1f MB" % (size / 1e6)
+
+
+class CacheSizeReport(object):
+    def __init__(self, file_size, free_size, family_sizes: Dict[str, int], operation_sizes: Dict[str, int], unattributed_size):
+        self.file_size = file_size
+        self.free_size = free_size
+        self.family_sizes = family_sizes
+        self.operation_sizes = operation_sizes
+        self.unattributed_size = unattributed_size
+
+    def __str__(self):
+        lines = ["Database: %s, %s free." % (_format_size(self.file_size), _format_size(self.free_size)), "", "Tables:"]
+        for family, size in sorted(self.family_sizes.items(), key=lambda i: i[1], reverse=True):
+            lines.append("  %-40s %12s" % (family, _format_size(size)))
+
+        # Tables shared by several operations, e.g. the branches of a forked repository, are counted in each of them.
+        lines += ["", "Operations:"]
+        for key, size in sorted(self.operation_sizes.items(), key=lambda i: i[1], reverse=True):
+            lines.append("  %-40s %12s" % (key, _format_size(size)))
+        lines.append("  %-40s %12s" % ("(unattributed)", _format_size(self.unattributed_size)))
+        return "\n".join(lines)
+
+
+class CachePruneResult(object):
+    def __init__(self):
+        self.operation_count = 0
+        self.table_count = 0
+        self.scan_state_count = 0
+        self.analyzed_commit_count = 0
+        self.size = 0
+
+    def __str__(self):
+        return "Pruned %d operations: %d tables (%s), %d scan states and %d analyzed commits." % (
+            self.operation_count, self.table_count, _format_size(self.size), self.scan_state_count, self.analyzed_commit_count)
+
+
+class CacheMaintenance(object):
+    # The cached tables are named after a hash of their key, so they are attributed to the operations by computing the keys of each operation.
+    # An entry is a whole table, or the keys of a scan state table.
+    _query_functions = {
+        QueryScheduler.USER_QUERY_TYPE: SecretFinder.get_username_queries,
+        QueryScheduler.EMAIL_QUERY_TYPE: SecretFinder.get_email_queries,
+        QueryScheduler.NAME_QUERY_TYPE: SecretFinder.get_name_queries
+    }
+
+    def __init__(self, db_file):
+        self._db_file = db_file
+        self._table_names = set()
+
+    def __enter__(self):
+        if not hasattr(self, '_connection') or self._connection is None:
+            # Whole tables are dropped and their keys compared in bulk, which SqliteDict does not provide.
+            self._connection = sqlite3.connect(self._db_file, timeout=60, isolation_level=None)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._connection.close()
+        self._connection = None
+
+    def get_size_report(self) -> CacheSizeReport:
+        self._get_table_names()
+        table_sizes = self._get_table_sizes()
+        family_sizes = defaultdict(int)
+        for table, size in table_sizes.items():
+            family_sizes[self._get_family(table)] += size
+
+        operation_sizes = {}
+        attributed_tables = set()
+        for operation in self._get_operations():
+            tables = [t for t, keys in self._get_operation_entries(operation).items() if keys is None]
+            operation_sizes[operation.key] = sum(table_sizes.get(t, 0) for t in tables)
+            attributed_tables.update(tables)
+
+        unattributed_size = sum(size for table, size in table_sizes.items() if _hashed_table_pattern.match(table) and table not in attributed_tables)
+        page_size = self._connection.execute("PRAGMA page_size").fetchone()[0]
+        free_size = self._connection.execute("PRAGMA freelist_count").fetchone()[0] * page_size
+        return CacheSizeReport(os.path.getsize(self._db_file), free_size, family_sizes, operation_sizes, unattributed_size)
+
+    def get_stale_operations(self, monitored_keys: Optional[Set[str]] = None, max_age: timedelta = None) -> List[QuerySchedulerOperation]:
+        # Operations are stale when they are no longer monitored, or did not start within max_age. Without monitored keys, every operation is monitored.
+        self._get_table_names()
+        stale_operations = []
+        for operation in self._get_operations():
+            if monitored_keys is not None and operation.key not in monitored_keys:
+                stale_operations.append(operation)
+            elif max_age is not None and operation.last_started < datetime.utcnow() - max_age:
+                stale_operations.append(operation)
+        return stale_operations
+
+    def prune(self, operations: Iterable[QuerySchedulerOperation]) -> CachePruneResult:
+        result = CachePruneResult()
+        with OperationLeaseQueue(self._db_file) as lease_queue:
+            leased_keys = lease_queue.get_leased_keys()
+
+        stale_keys = set()
+        for operation in operations:
+            if operation.key in leased_keys:
+                logging.warning("%s is being executed by a worker. It is not pruned." % operation.key)
+            else:
+                stale_keys.add(operation.key)
+
+        table_names = self._get_table_names()
+        stale_entries = {}
+        kept_entries = {}
+        for operation in self._get_operations():
+            entries = stale_entries if operation.key in stale_keys else kept_entries
+            self._merge_entries(entries, self._get_operation_entries(operation))
+
+        # Entries shared with a kept operation are kept.
+        table_sizes = self._get_table_sizes()
+        dropped_tables = [t for t, keys in stale_entries.items() if keys is None and t not in kept_entries and t in table_names]
+        scan_states = {t: keys - kept_entries.get(t, set()) for t, keys in stale_entries.items() if keys is not None and t in table_names}
+
+        # A repository or branch whose scan state remains is read from its cache only, so its scan state is removed before its tables.
+        for table, keys in scan_states.items():
+            result.scan_state_count += max(0, self._connection.executemany('DELETE FROM "%s" WHERE key = ?' % table, [(k,) for k in keys]).rowcount)
+
+        commit_tables = [t for t in dropped_tables if self._get_family(t) == GithubApi.COMMITS_TABLE_PREFIX]
+        if commit_tables:
+            self._prepare_kept_commits(table_names - set(dropped_tables))
+
+        # The tables that lead to the others are dropped last, so an interrupted prune can still find the remaining tables.
+        drop_order = {GithubApi.BRANCHES_TABLE_PREFIX: 1, GithubApi.REPOS_TABLE_PREFIX: 2}
+        for table in sorted(dropped_tables, key=lambda t: drop_order.get(self._get_family(t), 0)):
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                if table in commit_tables:
+                    result.analyzed_commit_count += self._remove_analyzed_commits(table, table_names)
+                self._connection.execute('DROP TABLE "%s"' % table)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            result.table_count += 1
+            result.size += table_sizes.get(table, 0)
+
+        for table in [QueryScheduler.QUERY_CHECKPOINTS_TABLE, QueryScheduler.QUERY_LOG_TABLE]:
+            if table in table_names:
+                self._connection.executemany('DELETE FROM "%s" WHERE key = ?' % table, [(k,) for k in stale_keys])
+        result.operation_count = len(stale_keys)
+        return result
+
+    def compact(self) -> int:
+        # Rewrites the file without its free pages. Other processes may keep reading and writing; they wait for the end of the compaction.
+        size = os.path.getsize(self._db_file)
+        self._connection.execute("VACUUM")
+        return size - os.path.getsize(self._db_file)
+
+    def _prepare_kept_commits(self, kept_tables):
+        # Analyzed commits are only removed if no kept table references them, otherwise they would be analyzed and reported again.
+        self._connection.execute("CREATE TEMP TABLE IF NOT EXISTS kept_commits (sha TEXT PRIMARY KEY)")
+        self._connection.execute("DELETE FROM kept_commits")
+        for table in kept_tables:
+            if _hashed_table_pattern.match(table) and self._get_family(table) == GithubApi.COMMITS_TABLE_PREFIX:
+                self._connection.execute('INSERT OR IGNORE INTO kept_commits SELECT key FROM "%s"' % table)
+
+    def _remove_analyzed_commits(self, table, table_names) -> int:
+        if SecretFinder.ANALYZED_COMMITS_TABLE not in table_names:
+            return 0
+        cursor = self._connection.execute('DELETE FROM "%s" WHERE key IN (SELECT key FROM "%s") AND key NOT IN (SELECT sha FROM kept_commits)' % (SecretFinder.ANALYZED_COMMITS_TABLE, table))
+        return cursor.rowcount
+
+    def _get_operations(self) -> List[QuerySchedulerOperation]:
+        return list(self._read_values(QueryScheduler.QUERY_LOG_TABLE))
+
+    def _get_operation_entries(self, operation: QuerySchedulerOperation) -> Dict[str, Optional[Set[str]]]:
+        entries = {}
+        if operation.query_type == QueryScheduler.ORGANIZATION_QUERY_TYPE:
+            repos_table = get_table_name(GithubApi.REPOS_TABLE_PREFIX, operation.value)
+            entries[repos_table] = None
+            for repo in self._read_values(repos_table):
+                self._add_repository_entries(entries, repo)
+        else:
+            for query in self._query_functions[operation.query_type](operation.value):
+                for prefix in [GithubApi.COMMITS_TABLE_PREFIX, GithubApi.COMMIT_USERS_TABLE_PREFIX]:
+                    entries[get_table_name(prefix, query)] = None
+        return entries
+
+    def _add_repository_entries(self, entries, repo: GithubRepository):
+        branches_table = get_table_name(GithubApi.BRANCHES_TABLE_PREFIX, repo.get_branches_url())
+        entries[branches_table] = None
+        entries[get_table_name(GithubApi.CONTRIBUTORS_TABLE_PREFIX, repo.get_contributors_url())] = None
+        if repo.is_fork and repo.parent is not None:
+            entries[get_table_name(GithubApi.BRANCHES_TABLE_PREFIX, repo.parent.get_branches_url())] = None
+
+        cache_keys = [GithubCommitInformationFetcher.get_branch_cache_key(repo, branch) for branch in self._read_values(branches_table)]
+        for prefix in [GithubApi.COMMITS_TABLE_PREFIX, GithubApi.COMMIT_USERS_TABLE_PREFIX]:
+            scan_state_keys = entries.setdefault(get_scan_state_table_name(prefix), set())
+            scan_state_keys.add("repo:" + repo.name)
+            for cache_key in cache_keys:
+                entries[get_table_name(prefix, cache_key)] = None
+                scan_state_keys.add("branch:" + cache_key)
+
+    @staticmethod
+    def _merge_entries(entries, other_entries):
+        for table, keys in other_entries.items():
+            if keys is None:
+                entries[table] = None
+            else:
+                entries.setdefault(table, set()).update(keys)
+
+    def _read_values(self, table) -> Iterable:
+        if table not in self._table_names:
+            return []
+        return [legacy_decode(value) for value, in self._connection.execute('SELECT value FROM "%s"' % table)]
+
+    def _get_table_names(self) -> Set[str]:
+        self._table_names = {row[0] for row in self._connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        return self._table_names
+
+    def _get_table_sizes(self) -> Dict[str, int]:
+        try:
+            # The indexes, e.g. on the keys, are counted with their table.
+            rows = self._connection.execute("SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat s JOIN sqlite_master m ON m.name = s.name GROUP BY m.tbl_name").fetchall()
+            return dict(rows)
+        except sqlite3.OperationalError:
+            # SQLite was built without the dbstat table, so only the size of the keys and values is known.
+            sizes = {}
+            for table in self._get_table_names():
+                try:
+                    sizes[table] = self._connection.execute('SELECT COALESCE(SUM(LENGTH(key) + LENGTH(value)), 0) FROM "%s"' % table).fetchone()[0]
+                except sqlite3.OperationalError:
+                    sizes[table] = 0
+            return sizes
+
+    @staticmethod
+    def _get_family(table):
+        match = _hashed_table_pattern.match(table)
+        return match.group(1) if match else table
@@ -1 +1,3 @@
 from .query_scheduler import QueryScheduler
+from .continuous_scheduler import ContinuousScheduler
+from .operation_lease_queue import OperationLeaseQueue
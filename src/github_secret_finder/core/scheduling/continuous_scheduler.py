@@ -0,0 +1,35 @@
+import logging
+import threading
+import time
+from typing import Callable, Tuple, List
+
+from .query_scheduler import QueryScheduler
+
+
+class ContinuousScheduler(object):
+    def __init__(self, scheduler: QueryScheduler, interval, before_cycle: Callable[[], Tuple[List, List, List, List]]):
+        self._scheduler = scheduler
+        self._interval = interval
+        self._before_cycle = before_cycle
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self.stopped():
+            cycle_start = time.monotonic()
+            users, emails, names, organizations = self._before_cycle()
+            self._scheduler.execute(users, emails, names, organizations)
+
+            if self.stopped():
+                break
+
+            sleep_time = self._interval - (time.monotonic() - cycle_start)
+            if sleep_time > 0:
+                logging.info("Cycle completed. Next cycle in %d seconds." % sleep_time)
+                self._stop_event.wait(sleep_time)
+
+    def stop(self):
+        self._stop_event.set()
+        self._scheduler.stop()
+
+    def stopped(self):
+        return self._stop_event.is_set()
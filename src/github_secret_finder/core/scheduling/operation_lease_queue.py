@@ -0,0 +1,86 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Set
+
+
+class OperationLeaseQueue(object):
+    _table_name = "query_leases"
+
+    def __init__(self, db_file, lease_duration=600, worker_id=None):
+        self._db_file = db_file
+        self._lease_duration = lease_duration
+        self.worker_id = worker_id or "%s:%d" % (socket.gethostname(), os.getpid())
+        self._held_keys = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def __enter__(self):
+        if not hasattr(self, '_connection') or self._connection is None:
+            # Leases need atomic compare-and-set across processes, which SqliteDict does not provide.
+            self._connection = sqlite3.connect(self._db_file, timeout=60, isolation_level=None, check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS %s (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)" % self._table_name)
+
+        if not hasattr(self, '_thread') or self._thread is None:
+            self._thread = threading.Thread(target=self._renew_leases, daemon=True)
+            self._thread.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop_event.set()
+        self._thread.join()
+        for key in list(self._held_keys):
+            self.release(key)
+        self._connection.close()
+
+    def claim(self, key, on_lost: Callable[[str], None] = None) -> bool:
+        # Expired leases belong to workers that stopped, so their operations are claimable again.
+        # on_lost is called if the lease is claimed by another worker while this one still runs the operation, e.g. after it was paused.
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._connection.execute("SELECT owner, expires FROM %s WHERE key = ?" % self._table_name, (key,)).fetchone()
+                if row is not None and row[0] != self.worker_id and row[1] > now:
+                    return False
+
+                if row is not None and row[0] != self.worker_id:
+                    logging.warning("Lease on %s from %s expired. Claiming it." % (key, row[0]))
+
+                self._connection.execute("INSERT OR REPLACE INTO %s (key, owner, expires) VALUES (?, ?, ?)" % self._table_name, (key, self.worker_id, now + self._lease_duration))
+                self._held_keys[key] = on_lost
+                return True
+            finally:
+                self._connection.execute("COMMIT")
+
+    def release(self, key):
+        with self._lock:
+            self._connection.execute("DELETE FROM %s WHERE key = ? AND owner = ?" % self._table_name, (key, self.worker_id))
+            self._held_keys.pop(key, None)
+
+    def is_held(self, key) -> bool:
+        with self._lock:
+            return key in self._held_keys
+
+    def get_leased_keys(self) -> Set[str]:
+        # The operations currently executed by a worker, including this one.
+        with self._lock:
+            return {row[0] for row in self._connection.execute("SELECT key FROM %s WHERE expires > ?" % self._table_name, (time.time(),))}
+
+    def _renew_leases(self):
+        while not self._stop_event.wait(self._lease_duration / 3):
+            lost_leases = []
+            with self._lock:
+                for key in list(self._held_keys):
+                    cursor = self._connection.execute("UPDATE %s SET expires = ? WHERE key = ? AND owner = ?" % self._table_name, (time.time() + self._lease_duration, key, self.worker_id))
+                    if cursor.rowcount == 0:
+                        logging.warning("Lease on %s was lost to another worker. Aborting its operation." % key)
+                        lost_leases.append((key, self._held_keys.pop(key)))
+
+            for key, on_lost in lost_leases:
+                if on_lost:
+                    on_lost(key)
@@ -0,0 +1,139 @@
+import copy
+import threading
+import time
+from typing import Iterable, Callable, TypeVar
+
+T = TypeVar('T')
+
+
+class QueryCheckpoint(object):
+    # The whole checkpoint is written at most once every save_interval seconds or max_unsaved_changes changes, and when the operation ends or stops.
+    # A saved checkpoint is only behind, never inconsistent: the commits analyzed since are skipped, and the ones listed since are listed again.
+    save_interval = 5
+    max_unsaved_changes = 500
+
+    def __init__(self, key):
+        self.key = key
+        self.query = None
+        self.repositories_listed = False
+        self.completed_repositories = set()
+        self.repository_checkpoints = {}
+        self.branch = None
+        self.listing_url = None
+        self.page_url = None
+        self.pending_commits = {}
+        self.aborted = False
+        self._on_save = None
+        self._lock = threading.RLock()
+        self._unsaved_changes = 0
+        self._saved_at = time.monotonic()
+
+    def __getstate__(self):
+        # The collections are changed by other threads while the checkpoint is saved. Copying them is atomic.
+        state = self.__dict__.copy()
+        state["pending_commits"] = dict(self.pending_commits)
+        state["completed_repositories"] = set(self.completed_repositories)
+        state["repository_checkpoints"] = dict(self.repository_checkpoints)
+        for name in ["_on_save", "_lock", "_unsaved_changes", "_saved_at"]:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        # Checkpoints saved by previous versions walked the repositories one at a time.
+        self.__dict__.update(state)
+        self.__dict__.setdefault("repositories_listed", False)
+        self.__dict__.setdefault("completed_repositories", set())
+        self.__dict__.setdefault("repository_checkpoints", {})
+        self.__dict__.setdefault("aborted", False)
+        self._on_save = None
+        self._lock = threading.RLock()
+        self._unsaved_changes = 0
+        self._saved_at = time.monotonic()
+
+    def attach(self, on_save: Callable[['QueryCheckpoint'], None]):
+        self._on_save = on_save
+
+    def abort(self):
+        # The operation was given to another worker, which now saves its checkpoint. The operation stops between two commits.
+        with self._lock:
+            self.aborted = True
+            self._on_save = None
+
+    def save(self):
+        with self._lock:
+            if self._on_save:
+                self._on_save(self)
+            self._unsaved_changes = 0
+            self._saved_at = time.monotonic()
+
+    def _changed(self):
+        with self._lock:
+            self._unsaved_changes += 1
+            if self._unsaved_changes >= self.max_unsaved_changes or time.monotonic() - self._saved_at >= self.save_interval:
+                self.save()
+
+    def set_query(self, query):
+        if self.query != query:
+            self.query = query
+            self._reset_branch(None)
+
+    def set_repositories_listed(self):
+        self.repositories_listed = True
+        self._changed()
+
+    def get_repository_checkpoint(self, repository) -> 'QueryCheckpoint':
+        # Repositories are walked concurrently, so each one records its branch and page in its own checkpoint.
+        # A detached copy is returned. It is saved with save_repository_checkpoint.
+        with self._lock:
+            checkpoint = self.repository_checkpoints.get(repository)
+            return copy.copy(checkpoint) if checkpoint else QueryCheckpoint(self.key)
+
+    def save_repository_checkpoint(self, repository, checkpoint: 'QueryCheckpoint'):
+        with self._lock:
+            self.repository_checkpoints[repository] = checkpoint
+            self._changed()
+
+    def complete_repository(self, repository):
+        with self._lock:
+            self.repository_checkpoints.pop(repository, None)
+            self.completed_repositories.add(repository)
+            self._changed()
+
+    def set_branch(self, branch):
+        if self.branch != branch:
+            self._reset_branch(branch)
+
+    def _reset_branch(self, branch):
+        self.branch = branch
+        self.listing_url = None
+        self.page_url = None
+        self._changed()
+
+    def get_page(self, listing_url):
+        if self.listing_url == listing_url:
+            return self.page_url
+        return None
+
+    def set_page(self, listing_url, page_url):
+        self.listing_url = listing_url
+        self.page_url = page_url
+        self._changed()
+
+    def add_pending_commit(self, commit):
+        with self._lock:
+            self.pending_commits[commit.sha] = commit
+            self._changed()
+
+    def remove_pending_commit(self, commit):
+        with self._lock:
+            if self.pending_commits.pop(commit.sha, None) is not None:
+                self._changed()
+
+    def resume_from(self, attribute, items: Iterable[T], key_selector: Callable[[T], str]) -> Iterable[T]:
+        # Skips the items that were completed before the checkpoint. Starts over if the recorded item no longer exists.
+        value = getattr(self, attribute)
+        items = list(items)
+        keys = [key_selector(i) for i in items]
+        if value is None or value not in keys:
+            return items
+        return items[keys.index(value):]
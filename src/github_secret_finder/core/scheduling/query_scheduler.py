@@ -1,11 +1,21 @@
+import logging
 import operator
+import threading
+import time
 from datetime import datetime
-from typing import Iterable
+from typing import Iterable, Set
 
 from sqlitedict import SqliteDict
 
+from .operation_lease_queue import OperationLeaseQueue
+from .query_checkpoint import QueryCheckpoint
 from .query_scheduler_operation import QuerySchedulerOperation
 from ..util.legacy_unpickler import legacy_decode
+from ..util.metrics import registry as metrics
+
+_operation_results = metrics.counter("operation_results_total", "Results reported by each operation.", ["operation"])
+_operation_duration = metrics.histogram("operation_duration_seconds", "Duration of the completed operations, by type.", ["query_type"], buckets=(1, 10, 60, 300, 900, 3600, 4 * 3600, 24 * 3600))
+_operation_completed = metrics.gauge("operation_last_completed_timestamp_seconds", "Time at which each operation last completed.", ["operation"])
 
 
 class QueryScheduler(object):
@@ -13,9 +23,12 @@ class QueryScheduler(object):
     EMAIL_QUERY_TYPE = "email"
     NAME_QUERY_TYPE = "name"
     ORGANIZATION_QUERY_TYPE = "organization"
+    QUERY_LOG_TABLE = "query_log"
+    QUERY_CHECKPOINTS_TABLE = "query_checkpoints"
 
-    def __init__(self, user_query, email_query, name_query, organization_query, result_handler, db_file, cache_only):
+    def __init__(self, user_query, email_query, name_query, organization_query, result_handler, db_file, cache_only, lease_queue: OperationLeaseQueue = None):
         self.cache_only = cache_only
+        self.lease_queue = lease_queue
         self.result_handler = result_handler
         self.db_file = db_file
         self.name_query = name_query
@@ -29,9 +42,19 @@ class QueryScheduler(object):
             QueryScheduler.NAME_QUERY_TYPE: self.name_query,
             QueryScheduler.ORGANIZATION_QUERY_TYPE: self.organization_query
         }
+        self._stop_event = threading.Event()
+        self._checkpoint = None
+
+    def stop(self):
+        # The current operation is left incomplete and will be resumed from its checkpoint.
+        self._stop_event.set()
+
+    def stopped(self):
+        return self._stop_event.is_set()
 
     def execute(self, users, emails, names, organizations):
-        with SqliteDict(self.db_file, tablename="query_log", autocommit=True, decode=legacy_decode) as db:
+        with SqliteDict(self.db_file, tablename=self.QUERY_LOG_TABLE, autocommit=True, decode=legacy_decode) as db, \
+                SqliteDict(self.db_file, tablename=self.QUERY_CHECKPOINTS_TABLE, autocommit=True, decode=legacy_decode) as checkpoints_db:
             operations = self._get_operations(db, users, emails, names, organizations)
 
             if self.cache_only:
@@ -40,27 +63,91 @@ class QueryScheduler(object):
                         continue
                     for result in self._operation_map[operation.query_type](operation.value):
                         self.result_handler(result)
+                        if self.stopped():
+                            return
             else:
                 for operation in sorted(self._get_operations(db, users, emails, names, organizations), key=operator.attrgetter('last_completed')):
+                    if self.lease_queue is None:
+                        self._execute_operation(db, checkpoints_db, operation)
+                    elif self.lease_queue.claim(operation.key, self._abort_operation):
+                        try:
+                            # Another worker may have completed the operation since the operations were sorted.
+                            current_operation = db.get(operation.key, operation)
+                            if current_operation.last_completed == operation.last_completed:
+                                self._execute_operation(db, checkpoints_db, current_operation)
+                        finally:
+                            self.lease_queue.release(operation.key)
 
-                    operation.last_started = datetime.utcnow()
-                    db[operation.key] = operation
+                    if self.stopped():
+                        return
 
-                    for result in self._operation_map[operation.query_type](operation.value):
-                        self.result_handler(result)
+    def _execute_operation(self, db, checkpoints_db, operation):
+        checkpoint = self._checkpoint = self._get_checkpoint(checkpoints_db, operation)
+        if self.lease_queue is not None and not self.lease_queue.is_held(operation.key):
+            checkpoint.abort()
+
+        operation.last_started = datetime.utcnow()
+        db[operation.key] = operation
+
+        try:
+            with _operation_duration.time(operation.query_type):
+                for result in self._operation_map[operation.query_type](operation.value, checkpoint):
+                    _operation_results.inc(operation.key)
+                    self.result_handler(result)
+                    if self.stopped() or checkpoint.aborted:
+                        return
+        finally:
+            # The checkpoint is only saved periodically while the operation runs, so its last changes are written when it ends or stops.
+            checkpoint.save()
+            self._checkpoint = None
+        if self.stopped() or checkpoint.aborted:
+            return
+        del checkpoints_db[operation.key]
+
+        operation.last_completed = datetime.utcnow()
+        db[operation.key] = operation
+        _operation_completed.set(time.time(), operation.key)
+
+    def _abort_operation(self, key):
+        # Called by the lease queue when another worker claimed the operation, so both do not run it.
+        checkpoint = self._checkpoint
+        if checkpoint is not None and checkpoint.key == key:
+            checkpoint.abort()
 
-                    operation.last_completed = datetime.utcnow()
-                    db[operation.key] = operation
+    @staticmethod
+    def _get_checkpoint(checkpoints_db, operation) -> QueryCheckpoint:
+        # A checkpoint is only used if the previous run of the operation was interrupted.
+        if operation.key in checkpoints_db and operation.last_started > operation.last_completed:
+            checkpoint = checkpoints_db[operation.key]
+            logging.info("Resuming %s from checkpoint." % operation.key)
+        else:
+            checkpoint = QueryCheckpoint(operation.key)
+
+        checkpoint.attach(lambda c: checkpoints_db.__setitem__(c.key, c))
+        checkpoint.save()
+        return checkpoint
+
+    @staticmethod
+    def get_operation_key(query_type, value):
+        return query_type + "_" + value
+
+    @staticmethod
+    def get_operation_keys(users, emails, names, organizations) -> Set[str]:
+        return {QueryScheduler.get_operation_key(query_type, i) for query_type, items in QueryScheduler._get_inputs_by_type(users, emails, names, organizations) for i in items}
+
+    @staticmethod
+    def _get_inputs_by_type(users, emails, names, organizations):
+        return [(QueryScheduler.USER_QUERY_TYPE, users),
+                (QueryScheduler.EMAIL_QUERY_TYPE, emails),
+                (QueryScheduler.NAME_QUERY_TYPE, names),
+                (QueryScheduler.ORGANIZATION_QUERY_TYPE, organizations)]
 
     @staticmethod
     def _get_operations(db, users, emails, names, organizations) -> Iterable[QuerySchedulerOperation]:
         operations = {}
-        for query_type, items in [(QueryScheduler.USER_QUERY_TYPE, users),
-                                  (QueryScheduler.EMAIL_QUERY_TYPE, emails),
-                                  (QueryScheduler.NAME_QUERY_TYPE, names),
-                                  (QueryScheduler.ORGANIZATION_QUERY_TYPE, organizations)]:
+        for query_type, items in QueryScheduler._get_inputs_by_type(users, emails, names, organizations):
             for i in items:
-                operation_key = query_type + "_" + i
+                operation_key = QueryScheduler.get_operation_key(query_type, i)
                 if operation_key not in db:
                     operations[operation_key] = QuerySchedulerOperation(operation_key, i, query_type, datetime.min, datetime.min)
                 else:
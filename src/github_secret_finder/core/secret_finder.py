@@ -1,80 +1,214 @@
+import itertools
 import logging
-from typing import Iterable
+import threading
+from typing import Iterable, List
 
 from sqlitedict import SqliteDict
 
-from .analysis import PatchAnalyzer
+from .analysis import PatchAnalyzer, get_conflict_resolution_patch
 from .findings import FindingsDatabase
 from .findings.finding import Finding
-from .github import GithubApiClient, GithubSearchClient, GithubApi
+from .github import GithubApiClient, GithubGraphqlApiClient, GithubSearchClient, GithubApi
+from .github.models import GITHUB_API_URL
 from .util.legacy_unpickler import legacy_decode
+from .util.metrics import registry as metrics
+from .util.profiler import profiler
+from .util.staged_pipeline import StagedPipeline, PipelineStage
+
+_analysis_duration = metrics.histogram("commit_analysis_duration_seconds", "Time spent analyzing the patch of a commit.")
+_analyzed_commits = metrics.counter("analyzed_commits_total", "Commits analyzed, by whether their patch could be fetched.", ["patch"])
+_findings = metrics.counter("findings_total", "New findings, by secret type.", ["secret_type"])
 
 
 class SecretFinder(object):
-    def __init__(self, tokens, db_file, blacklist_file, cache_only):
+    MERGE_COMMITS_ANALYZE = "analyze"
+    MERGE_COMMITS_SKIP = "skip"
+    MERGE_COMMITS_CONFLICTS = "conflicts"
+    ANALYZED_COMMITS_TABLE = "analyzed_commits"
+    _fetch_workers = 4
+    _queue_size = 16
+
+    def __init__(self, tokens, db_file, blacklist_file, cache_only, graphql=False, merge_commit_policy=MERGE_COMMITS_ANALYZE, patch_archive=None, secret_verifier=None,
+                 repository_workers=8, api_url=GITHUB_API_URL):
         self._cache_only = cache_only
+        self._patch_archive = patch_archive
+        self._secret_verifier = secret_verifier
+        self._merge_commit_policy = merge_commit_policy
+        self.skipped_merge_commits = 0
+        self.reduced_merge_commits = 0
+        self._counters_lock = threading.Lock()
         self._db_file = db_file
-        self._api = GithubApi(GithubApiClient(tokens), GithubSearchClient(tokens), db_file, cache_only)
+        api_client = GithubGraphqlApiClient(tokens, api_url) if graphql else GithubApiClient(tokens, api_url)
+        self._api = GithubApi(api_client, GithubSearchClient(tokens, api_url), db_file, cache_only, repository_workers)
         self._patch_analyzer = PatchAnalyzer(blacklist_file)
+        self._stop_event = threading.Event()
 
     def __enter__(self):
         if not hasattr(self, '_commits_db') or self._commits_db is None:
-            self._commits_db = SqliteDict(self._db_file, tablename="analyzed_commits", autocommit=True, decode=legacy_decode)
+            self._commits_db = SqliteDict(self._db_file, tablename=self.ANALYZED_COMMITS_TABLE, autocommit=True, decode=legacy_decode)
 
         if not hasattr(self, '_findings_db') or self._findings_db is None:
             self._findings_db = FindingsDatabase(self._db_file)
+            if not self._cache_only:
+                self._findings_db.index_fingerprints()
 
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self._commits_db.close()
         self._findings_db.close()
+        self._api.log_statistics()
 
-    def find_by_username(self, username) -> Iterable[Finding]:
-        for qualifier in ["committer", "author"]:
-            for r in self._find_by_query("%s:%s" % (qualifier, username)):
-                yield r
+        if self.skipped_merge_commits > 0 or self.reduced_merge_commits > 0:
+            logging.info("Merge commits: %d skipped, %d reduced to their conflict resolution." % (self.skipped_merge_commits, self.reduced_merge_commits))
 
-    def find_by_name(self, name) -> Iterable[Finding]:
-        for qualifier in ["committer-name", "author-name"]:
-            for r in self._find_by_query("%s:\"%s\"" % (qualifier, name)):
-                yield r
+    def stop(self):
+        # Stops between two commits, so a commit is never left partially analyzed.
+        self._stop_event.set()
 
-    def find_by_email(self, email) -> Iterable[Finding]:
-        for qualifier in ["committer-email", "author-email"]:
-            for r in self._find_by_query("%s:%s" % (qualifier, email)):
-                yield r
+    def reload_blacklist(self, blacklist_file):
+        self._patch_analyzer = PatchAnalyzer(blacklist_file)
+
+    def find_by_username(self, username, checkpoint=None) -> Iterable[Finding]:
+        return self._find_by_queries(self.get_username_queries(username), checkpoint)
+
+    def find_by_name(self, name, checkpoint=None) -> Iterable[Finding]:
+        return self._find_by_queries(self.get_name_queries(name), checkpoint)
+
+    def find_by_email(self, email, checkpoint=None) -> Iterable[Finding]:
+        return self._find_by_queries(self.get_email_queries(email), checkpoint)
 
-    def find_by_organization(self, organization) -> Iterable[Finding]:
+    @staticmethod
+    def get_username_queries(username) -> List[str]:
+        return ["%s:%s" % (qualifier, username) for qualifier in ["committer", "author"]]
+
+    @staticmethod
+    def get_name_queries(name) -> List[str]:
+        return ["%s:\"%s\"" % (qualifier, name) for qualifier in ["committer-name", "author-name"]]
+
+    @staticmethod
+    def get_email_queries(email) -> List[str]:
+        return ["%s:%s" % (qualifier, email) for qualifier in ["committer-email", "author-email"]]
+
+    def find_by_organization(self, organization, checkpoint=None) -> Iterable[Finding]:
         logging.info("Organization: %s" % organization)
-        return self._find_secrets(self._api.get_organization_commits(organization))
+        return self._find_secrets(self._api.get_organization_commits(organization, checkpoint), checkpoint)
+
+    def _find_by_queries(self, queries, checkpoint=None) -> Iterable[Finding]:
+        if checkpoint:
+            queries = checkpoint.resume_from("query", queries, lambda q: q)
+
+        for query in queries:
+            if checkpoint and checkpoint.aborted:
+                return
+            if checkpoint:
+                checkpoint.set_query(query)
+            for r in self._find_by_query(query, checkpoint):
+                yield r
 
-    def _find_by_query(self, query) -> Iterable[Finding]:
+    def _find_by_query(self, query, checkpoint=None) -> Iterable[Finding]:
         logging.info("Query: %s" % query)
-        return self._find_secrets(self._api.search_commits(query))
+        return self._find_secrets(self._api.search_commits(query, checkpoint), checkpoint)
 
-    def _find_secrets(self, commit_source) -> Iterable[Finding]:
+    def _find_secrets(self, commit_source, checkpoint=None) -> Iterable[Finding]:
         if self._cache_only:
             return self._find_secrets_from_cache(commit_source)
         else:
-            return self._find_secrets_from_api(commit_source)
+            return self._find_secrets_from_api(commit_source, checkpoint)
 
     def _find_secrets_from_cache(self, commit_source) -> Iterable[Finding]:
-        commits = set(commit.sha for commit in commit_source)
-        return self._findings_db.get_findings(lambda x: x.commit.sha in commits)
+        return self._findings_db.get_findings_by_commits(commit.sha for commit in commit_source)
+
+    def _find_secrets_from_api(self, commit_source, checkpoint=None) -> Iterable[Finding]:
+        # The patches are fetched, analyzed and persisted by separate stages, with bounded queues between them.
+        in_progress = set()
+        stages = [
+            PipelineStage("fetch", self._fetch_patch, workers=self._fetch_workers, queue_size=self._queue_size),
+            PipelineStage("analysis", self._find_commit_secrets, queue_size=self._queue_size)
+        ]
+        if self._secret_verifier is not None:
+            stages.append(PipelineStage("verification", self._verify_secrets, workers=self._secret_verifier.workers, queue_size=self._queue_size))
+        stages.append(PipelineStage("persistence", lambda item: self._persist_findings(item, in_progress, checkpoint), queue_size=self._queue_size))
+        pipeline = StagedPipeline(stages)
+        for findings in pipeline.run(self._get_commits_to_analyze(commit_source, in_progress, checkpoint)):
+            for finding in findings:
+                yield finding
+
+    def _get_commits_to_analyze(self, commit_source, in_progress, checkpoint=None):
+        if checkpoint:
+            # Commits that were fetched but not analyzed before the previous run was interrupted.
+            commit_source = itertools.chain(list(checkpoint.pending_commits.values()), commit_source)
 
-    def _find_secrets_from_api(self, commit_source) -> Iterable[Finding]:
         for commit in commit_source:
-            if commit.sha in self._commits_db:
+            if self._stop_event.is_set() or (checkpoint and checkpoint.aborted):
+                return
+            if commit.sha in self._commits_db or commit.sha in in_progress:
                 continue
 
-            patch = self._api.get_commit_patch(commit.api_url)
+            in_progress.add(commit.sha)
+            if checkpoint:
+                checkpoint.add_pending_commit(commit)
+            yield commit
+
+    def _fetch_patch(self, commit):
+        with profiler.commit(commit), profiler.time("get_commit_patch"):
+            return commit, self._get_commit_patch(commit)
+
+    def _find_commit_secrets(self, item):
+        commit, patch = item
+        with profiler.commit(commit), profiler.time("analysis"), _analysis_duration.time():
+            secrets = list(self._patch_analyzer.find_secrets(patch)) if patch else []
+        return commit, patch, secrets, {}
+
+    def _verify_secrets(self, item):
+        commit, patch, secrets, _ = item
+        with profiler.commit(commit), profiler.time("verification"):
+            verifications = self._secret_verifier.verify_secrets(secrets, patch) if secrets else {}
+        return commit, patch, secrets, verifications
+
+    def _persist_findings(self, item, in_progress, checkpoint=None):
+        commit, patch, secrets, verifications = item
+        findings = []
+        with profiler.commit(commit):
             if patch:
                 logging.info(commit.html_url + " " + commit.date.isoformat())
-
-                for secret in self._patch_analyzer.find_secrets(patch):
-                    yield self._findings_db.create(commit, secret)
-
-            self._commits_db[commit.sha] = None
-
-
+                if self._patch_archive is not None:
+                    with profiler.time("patch_archive"):
+                        self._patch_archive.add(commit, patch)
+
+                with profiler.time("sqlite_writes"):
+                    for secret in secrets:
+                        finding = self._findings_db.create(commit, secret, verifications.get(secret.get_fingerprint()))
+                        if finding:
+                            _findings.inc(secret.secret_type)
+                            findings.append(finding)
+
+            _analyzed_commits.inc("fetched" if patch else "missing")
+            with profiler.time("sqlite_writes"):
+                self._commits_db[commit.sha] = None
+        profiler.finish_commit(commit, patch)
+        in_progress.discard(commit.sha)
+
+        if checkpoint:
+            checkpoint.remove_pending_commit(commit)
+        return findings or None
+
+    def _get_commit_patch(self, commit):
+        if not commit.is_merge() or self._merge_commit_policy == self.MERGE_COMMITS_ANALYZE:
+            return self._api.get_commit_patch(commit.api_url)
+
+        # The changes of a merge commit were already analyzed in the merged commits.
+        if self._merge_commit_policy == self.MERGE_COMMITS_SKIP:
+            with self._counters_lock:
+                self.skipped_merge_commits += 1
+            return None
+
+        # The patch of a commit is compared with its first parent.
+        patch = self._api.get_commit_patch(commit.api_url)
+        other_parent_patches = [self._api.get_commit_patch(commit.get_compare_url(p)) for p in commit.parents[1:]]
+        if not patch or any(p is None for p in other_parent_patches):
+            return patch
+
+        with self._counters_lock:
+            self.reduced_merge_commits += 1
+        return get_conflict_resolution_patch(patch, other_parent_patches)
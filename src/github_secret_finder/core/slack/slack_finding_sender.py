@@ -1,69 +1,137 @@
 import itertools
-from typing import Iterable
-
-import requests
+import logging
+import time
+from typing import Iterable, List, Tuple
 
 from .stoppable_thread import StoppableThread
 from ..findings import FindingsDatabase
 from ..findings.finding import Finding
+from ..util.metrics import registry as metrics
+
+_request_duration = metrics.histogram("slack_request_duration_seconds", "Duration of the requests to the Slack webhook.")
+_messages = metrics.counter("slack_messages_total", "Slack messages, by whether they could be sent.", ["result"])
 
 
 class SlackFindingSender(object):
-    min_time_between_messages = 20 * 60
+    min_time_between_messages = 30
+    max_time_between_messages = 20 * 60
     max_ish_message_length = 6000
+    max_findings_per_batch = 500
+    max_retries = 6
 
     def __init__(self, slack_webhook, db_file):
         self._db_file = db_file
         self._slack_webhook = slack_webhook
+        self._time_between_messages = self.min_time_between_messages
+        self._last_send_time = 0
 
     def __enter__(self):
         if not hasattr(self, '_findings_db') or self._findings_db is None:
             self._findings_db = FindingsDatabase(self._db_file)
+            self._findings_db.enqueue_unsent_findings()
 
         if not hasattr(self, '_thread') or self._thread is None:
-            self._thread = StoppableThread(self._send_new_findings, self._on_stop, self.min_time_between_messages)
+            self._thread = StoppableThread(self._send_new_findings, self._on_stop, lambda: self._time_between_messages)
             self._thread.start()
 
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        # The thread sends the remaining findings before stopping.
         self._thread.stop()
+        self._thread.join()
+
+    def notify(self):
+        # Called when a finding is created, so it is sent without waiting for the full interval.
+        self._thread.wake()
 
     def _on_stop(self):
         self._findings_db.close()
 
     def _send_new_findings(self):
-        findings = list(self._findings_db.get_findings(lambda f: not f.notification_sent))
-        if len(findings) == 0:
-            return
+        # Findings that arrive shortly after a message was sent are grouped in the next message.
+        time_since_last_send = time.monotonic() - self._last_send_time
+        if time_since_last_send < self.min_time_between_messages:
+            self._thread.sleep(self.min_time_between_messages - time_since_last_send)
+
+        sent_count = 0
+        while True:
+            findings = list(self._findings_db.get_unsent_findings(self.max_findings_per_batch))
+            if len(findings) == 0:
+                break
+
+            sent_findings = self._send_findings(findings)
+            sent_count += len(sent_findings)
+            if len(sent_findings) < len(findings):
+                break  # The remaining findings are retried on the next send.
+
+        if sent_count > 0:
+            self._last_send_time = time.monotonic()
+            self._time_between_messages = self.min_time_between_messages
+        else:
+            self._time_between_messages = min(self._time_between_messages * 2, self.max_time_between_messages)
+
+    def _send_findings(self, findings: List[Finding]) -> List[Finding]:
+        sent_findings = []
+        for message, message_findings in self._findings_to_messages(findings):
+            if not self._send_slack_message("New Github secrets found.", message):
+                break
+
+            # Only mark the findings once Slack confirmed the message was received.
+            for f in message_findings:
+                self._findings_db.mark_notification_sent(f)
+            sent_findings.extend(message_findings)
+        return sent_findings
+
+    def _send_slack_message(self, message, attachment=None) -> bool:
+        import requests
 
-        for message in self._findings_to_messages(findings):
-            self._send_slack_message("New Github secrets found.", message)
-
-        for f in findings:
-            f.notification_sent = True
-            self._findings_db.update(f)
-
-    def _send_slack_message(self, message, attachment=None):
         payload = {"text": message}
         if attachment is not None:
             payload["attachments"] = [{"text": attachment}]
-        requests.post(self._slack_webhook, json=payload)
 
-    def _findings_to_messages(self, findings: Iterable[Finding]):
+        retry_delay = 1
+        for retry in range(self.max_retries):
+            try:
+                with _request_duration.time():
+                    response = requests.post(self._slack_webhook, json=payload, timeout=30)
+                if response.status_code == 200:
+                    _messages.inc("sent")
+                    return True
+
+                if response.status_code == 429:
+                    retry_delay = max(retry_delay, float(response.headers.get("Retry-After", retry_delay)))
+                    logging.warning("Slack rate limit reached. Retrying in %d seconds." % retry_delay)
+                elif response.status_code < 500:
+                    logging.error("Could not send the Slack message (%d): %s" % (response.status_code, response.text))
+                    _messages.inc("failed")
+                    return False
+                else:
+                    logging.warning("Slack returned %d. Retrying in %d seconds." % (response.status_code, retry_delay))
+            except requests.RequestException as e:
+                logging.warning("Could not reach Slack (%s). Retrying in %d seconds." % (e, retry_delay))
+
+            time.sleep(retry_delay)
+            retry_delay *= 2
+
+        logging.error("Could not send the Slack message after %d attempts." % self.max_retries)
+        _messages.inc("failed")
+        return False
+
+    def _findings_to_messages(self, findings: Iterable[Finding]) -> Iterable[Tuple[str, List[Finding]]]:
         message = ""
+        message_findings = []
 
         for findings_by_commit in [list(f) for c, f in itertools.groupby(findings, lambda f: f.commit.sha)]:
             commit = findings_by_commit[0].commit
             commit_header = "%s\n" % commit.html_url
             commit_header_added = False
 
-            commit_secrets = [f.secret for f in findings_by_commit]
-            for file, secrets in [(f, list(s)) for f, s in itertools.groupby(commit_secrets, lambda s: s.file_name)]:
+            for file, file_findings in [(f, list(s)) for f, s in itertools.groupby(findings_by_commit, lambda f: f.secret.file_name)]:
                 file_header = "*%s*\n" % file
                 file_header_added = False
 
-                for secret in secrets:
+                for finding in file_findings:
                     if not commit_header_added:
                         message += commit_header
                         commit_header_added = True
@@ -72,11 +140,20 @@ class SlackFindingSender(object):
                         message += file_header
                         file_header_added = True
 
-                    message += "> • %s: %s\n" % (secret.secret_type, secret.to_slack_string())
+                    message += "> • %s%s: %s\n" % (self._get_verification_label(finding), finding.secret.secret_type, finding.secret.to_slack_string())
+                    message_findings.append(finding)
                     if len(message) > self.max_ish_message_length:
-                        yield message
+                        yield message, message_findings
                         message = ""
+                        message_findings = []
                         commit_header_added = False
                         file_header_added = False
 
-        yield message
+        if len(message_findings) > 0:
+            yield message, message_findings
+
+    @staticmethod
+    def _get_verification_label(finding: Finding):
+        if finding.verified is None:
+            return ""
+        return "*[LIVE]* " if finding.verified else "[revoked] "
@@ -9,15 +9,26 @@ class StoppableThread(threading.Thread):
         self._stop_action = stop_action
         self._sleep = sleep
         self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
 
     def run(self):
         while not self.stopped():
-            self._stop_event.wait(self._sleep)
+            # The sleep time can be a function, called before each wait.
+            self._wake_event.wait(self._sleep() if callable(self._sleep) else self._sleep)
+            self._wake_event.clear()
             self._action()
         self._stop_action()
 
+    def wake(self):
+        self._wake_event.set()
+
     def stop(self):
         self._stop_event.set()
+        self._wake_event.set()
+
+    def sleep(self, seconds):
+        # Returns early if the thread is stopped.
+        self._stop_event.wait(seconds)
 
     def stopped(self):
-        return self._stop_event.isSet()
+        return self._stop_event.is_set()
@@ -0,0 +1,47 @@
+from typing import Dict, List, Hashable
+
+
+class DisjointSet(object):
+    def __init__(self):
+        self._parents = {}
+        self._sizes = {}
+
+    def __contains__(self, item):
+        return item in self._parents
+
+    def __len__(self):
+        return len(self._parents)
+
+    def add(self, item) -> bool:
+        if item in self._parents:
+            return False
+        self._parents[item] = item
+        self._sizes[item] = 1
+        return True
+
+    def find(self, item):
+        # Path halving, to avoid recursion on large sets.
+        parents = self._parents
+        while parents[item] != item:
+            parents[item] = parents[parents[item]]
+            item = parents[item]
+        return item
+
+    def union(self, a, b):
+        root_a = self.find(a)
+        root_b = self.find(b)
+        if root_a == root_b:
+            return root_a
+
+        # The smallest set is attached to the largest one.
+        if self._sizes[root_a] < self._sizes[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parents[root_b] = root_a
+        self._sizes[root_a] += self._sizes.pop(root_b)
+        return root_a
+
+    def get_groups(self) -> Dict[Hashable, List]:
+        groups = {}
+        for item in self._parents:
+            groups.setdefault(self.find(item), []).append(item)
+        return groups
@@ -0,0 +1,17 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(content):
+    # orjson is optional. It decodes the pages of commits several times faster than the json module.
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def decode_response(response):
+    return loads(response.content)
@@ -0,0 +1,16 @@
+import os
+
+
+class FileWatcher(object):
+    def __init__(self, *file_names):
+        self._file_names = [f for f in file_names if f]
+        self._modification_times = self._get_modification_times()
+
+    def has_changed(self):
+        modification_times = self._get_modification_times()
+        changed = modification_times != self._modification_times
+        self._modification_times = modification_times
+        return changed
+
+    def _get_modification_times(self):
+        return dict((f, os.stat(f).st_mtime if os.path.exists(f) else None) for f in self._file_names)
@@ -0,0 +1,238 @@
+import bisect
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+class _Timer(object):
+    def __init__(self, histogram: 'Histogram', label_values):
+        self._histogram = histogram
+        self._label_values = label_values
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._histogram.observe(time.perf_counter() - self._start, *self._label_values)
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, registry: 'MetricsRegistry', name, description, label_names: List[str]):
+        self._registry = registry
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def get_samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, self._get_labels(k), v) for k, v in self._values.items()]
+
+    def get_summary(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return [(self._registry.format_series(self.name, self._get_labels(k)), "%g" % v) for k, v in sorted(self._values.items())]
+
+    def _get_labels(self, label_values) -> Dict[str, str]:
+        return dict(zip(self.label_names, label_values))
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *label_values, amount=1):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, *label_values):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, *label_values, amount=1):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class _HistogramValue(object):
+    def __init__(self, bucket_count):
+        self.bucket_counts = [0] * bucket_count
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class Histogram(Metric):
+    type = "histogram"
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, registry, name, description, label_names, buckets=default_buckets):
+        super().__init__(registry, name, description, label_names)
+        self.buckets = list(buckets)
+
+    def observe(self, value, *label_values):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            histogram_value = self._values.get(label_values)
+            if histogram_value is None:
+                histogram_value = self._values[label_values] = _HistogramValue(len(self.buckets))
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram_value.bucket_counts[index] += 1
+            histogram_value.count += 1
+            histogram_value.sum += value
+            histogram_value.max = max(histogram_value.max, value)
+
+    def time(self, *label_values):
+        # Observes the duration of a with block, in seconds.
+        if not self._registry.enabled:
+            return _null_timer
+        return _Timer(self, label_values)
+
+    def get_samples(self):
+        samples = []
+        with self._lock:
+            for label_values, histogram_value in self._values.items():
+                labels = self._get_labels(label_values)
+                cumulative_count = 0
+                for bucket, bucket_count in zip(self.buckets, histogram_value.bucket_counts):
+                    cumulative_count += bucket_count
+                    samples.append((self.name + "_bucket", dict(labels, le="%g" % bucket), cumulative_count))
+                samples.append((self.name + "_bucket", dict(labels, le="+Inf"), histogram_value.count))
+                samples.append((self.name + "_sum", labels, histogram_value.sum))
+                samples.append((self.name + "_count", labels, histogram_value.count))
+        return samples
+
+    def get_summary(self):
+        with self._lock:
+            return [(self._registry.format_series(self.name, self._get_labels(k)), "count %d, mean %.3g, max %.3g, total %.3g" % (v.count, v.sum / v.count, v.max, v.sum))
+                    for k, v in sorted(self._values.items()) if v.count > 0]
+
+
+class MetricsRegistry(object):
+    # Metrics are declared when their module is imported, but only recorded once the registry is enabled, so they cost a single check otherwise.
+    def __init__(self, prefix="github_secret_finder_"):
+        self._prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.enabled = False
+
+    def counter(self, name, description, label_names: List[str] = ()) -> Counter:
+        return self._register(Counter(self, self._prefix + name, description, list(label_names)))
+
+    def gauge(self, name, description, label_names: List[str] = ()) -> Gauge:
+        return self._register(Gauge(self, self._prefix + name, description, list(label_names)))
+
+    def histogram(self, name, description, label_names: List[str] = (), buckets=Histogram.default_buckets) -> Histogram:
+        return self._register(Histogram(self, self._prefix + name, description, list(label_names), buckets))
+
+    def _register(self, metric: Metric):
+        with self._lock:
+            if metric.name not in self._metrics:
+                self._metrics[metric.name] = metric
+            return self._metrics[metric.name]
+
+    def to_prometheus_text(self) -> str:
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            samples = metric.get_samples()
+            if not samples:
+                continue
+            lines.append("# HELP %s %s" % (metric.name, metric.description.replace("\\", "\\\\").replace("\n", "\\n")))
+            lines.append("# TYPE %s %s" % (metric.name, metric.type))
+            for name, labels, value in samples:
+                lines.append("%s %s" % (self.format_series(name, labels), repr(float(value))))
+        return "\n".join(lines) + "\n"
+
+    def write(self, file_name):
+        # Written to a temporary file first, so a collector never reads a partial file.
+        temporary_file_name = "%s.%d.tmp" % (file_name, os.getpid())
+        with open(temporary_file_name, "w") as f:
+            f.write(self.to_prometheus_text())
+        os.replace(temporary_file_name, file_name)
+
+    def get_summary(self) -> str:
+        rows = [row for metric in sorted(self._metrics.values(), key=lambda m: m.name) for row in metric.get_summary()]
+        if not rows:
+            return "No metrics were recorded."
+        width = max(len(series) for series, _ in rows)
+        return "\n".join("%-*s  %s" % (width, series[len(self._prefix):], value) for series, value in rows)
+
+    @staticmethod
+    def format_series(name, labels: Dict[str, str]):
+        if not labels:
+            return name
+        escaped_labels = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for k, v in labels.items())
+        return "%s{%s}" % (name, escaped_labels)
+
+
+class MetricsServer(object):
+    # Serves the metrics to Prometheus in long-running mode. Only listens on the local interface by default.
+    def __init__(self, registry: MetricsRegistry, port, host="127.0.0.1"):
+        self._registry = registry
+        self._port = port
+        self._host = host
+
+    def __enter__(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self._registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                content = registry.to_prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self._host, self._port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+registry = MetricsRegistry()
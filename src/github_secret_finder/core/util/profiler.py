@@ -0,0 +1,215 @@
+import heapq
+import itertools
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_null_timer = _NullTimer()
+_file_header_pattern = re.compile(r"^--- .*\n\+\+\+ ", re.MULTILINE)
+
+
+class CommitProfile(object):
+    def __init__(self, sha, url):
+        self.sha = sha
+        self.url = url
+        self.patch_size = 0
+        self.file_count = 0
+        self.stages = {}
+
+    @property
+    def total(self):
+        return sum(v for k, v in self.stages.items() if k not in Profiler.nested_stages)
+
+
+class _StageTimer(object):
+    def __init__(self, profiler: 'Profiler', stage):
+        self._profiler = profiler
+        self._stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._profiler.add(self._stage, time.perf_counter() - self._start)
+
+
+class _CommitScope(object):
+    # The stages of a commit run in the threads of the pipeline, so the commit is attached to the thread of each stage in turn.
+    def __init__(self, profiler: 'Profiler', commit):
+        self._profiler = profiler
+        self._commit = commit
+
+    def __enter__(self):
+        self._previous = getattr(self._profiler._current, "commit", None)
+        self._profiler._current.commit = self._profiler._get_commit_profile(self._commit)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._profiler._current.commit = self._previous
+
+
+class Profiler(object):
+    # Like the metrics, the stages are timed only once the profiler is enabled, so they cost a single check otherwise.
+    # The nested stages are part of the time of another stage, e.g. the waits of the requester are part of get_commit_patch.
+    nested_stages = {"scan_diff", "parse_patch", "blacklist", "token_wait", "rate_limit_sleep", "error_sleep"}
+
+    def __init__(self, top_count=20):
+        self.enabled = False
+        self.top_count = top_count
+        self._current = threading.local()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._in_progress = {}
+        self._slowest_commits = []
+        self._commit_count = 0
+        self._sequence = itertools.count()
+
+    def time(self, stage):
+        if not self.enabled:
+            return _null_timer
+        return _StageTimer(self, stage)
+
+    def commit(self, commit):
+        if not self.enabled:
+            return _null_timer
+        return _CommitScope(self, commit)
+
+    def add(self, stage, seconds):
+        commit_profile = getattr(self._current, "commit", None)
+        with self._lock:
+            count, total, maximum = self._stages.get(stage, (0, 0.0, 0.0))
+            self._stages[stage] = (count + 1, total + seconds, max(maximum, seconds))
+            if commit_profile is not None:
+                commit_profile.stages[stage] = commit_profile.stages.get(stage, 0.0) + seconds
+
+    def finish_commit(self, commit, patch):
+        # Only the slowest commits are kept, so the memory used does not grow with the number of commits.
+        if not self.enabled:
+            return
+        with self._lock:
+            commit_profile = self._in_progress.pop(commit.sha, None)
+            if commit_profile is None:
+                return
+            self._commit_count += 1
+            commit_profile.patch_size = len(patch) if patch else 0
+            commit_profile.file_count = len(_file_header_pattern.findall(patch)) if patch else 0
+            entry = (commit_profile.total, next(self._sequence), commit_profile)
+            if len(self._slowest_commits) < self.top_count:
+                heapq.heappush(self._slowest_commits, entry)
+            elif entry[0] > self._slowest_commits[0][0]:
+                heapq.heapreplace(self._slowest_commits, entry)
+
+    def get_slowest_commits(self) -> List[CommitProfile]:
+        with self._lock:
+            return [p for _, _, p in sorted(self._slowest_commits, key=lambda e: e[0], reverse=True)]
+
+    def get_report(self) -> str:
+        with self._lock:
+            stages = sorted(self._stages.items(), key=lambda s: s[1][1], reverse=True)
+            commit_count = self._commit_count
+        if not stages:
+            return "No stages were profiled."
+
+        lines = ["%-18s %8s %10s %10s %10s" % ("Stage", "Count", "Total (s)", "Mean (ms)", "Max (ms)")]
+        for stage, (count, total, maximum) in stages:
+            lines.append("%-18s %8d %10.2f %10.2f %10.1f" % (stage, count, total, total / count * 1e3, maximum * 1e3))
+
+        slowest_commits = self.get_slowest_commits()
+        if slowest_commits:
+            stage_names = [s for s, _ in stages if any(s in p.stages for p in slowest_commits)]
+            lines.append("")
+            lines.append("%d slowest of %d commits, in ms:" % (len(slowest_commits), commit_count))
+            lines.append("%8s %10s %6s  %s  %s" % ("Total", "Patch (B)", "Files", "  ".join("%*s" % (max(len(s), 8), s) for s in stage_names), "Commit"))
+            for p in slowest_commits:
+                stage_values = "  ".join("%*.1f" % (max(len(s), 8), p.stages.get(s, 0.0) * 1e3) for s in stage_names)
+                lines.append("%8.1f %10d %6d  %s  %s" % (p.total * 1e3, p.patch_size, p.file_count, stage_values, p.url))
+        return "\n".join(lines)
+
+    def _get_commit_profile(self, commit) -> CommitProfile:
+        with self._lock:
+            commit_profile = self._in_progress.get(commit.sha)
+            if commit_profile is None:
+                commit_profile = self._in_progress[commit.sha] = CommitProfile(commit.sha, commit.html_url)
+            return commit_profile
+
+
+class RunProfiler(object):
+    # Profiles every thread of the run, either with cProfile or by sampling their stacks, which costs less and is written as collapsed stacks for flame graphs.
+    def __init__(self, stats_file=None, samples_file=None, sampling_interval=0.005):
+        self._stats_file = stats_file
+        self._samples_file = samples_file
+        self._sampling_interval = sampling_interval
+        self._profiles = []
+        self._samples = Counter()
+        self._stopped = threading.Event()
+
+    def __enter__(self):
+        if self._stats_file:
+            import cProfile
+
+            def profile_thread(frame, event, arg):
+                profile = cProfile.Profile()
+                self._profiles.append(profile)
+                profile.enable()
+
+            main_profile = cProfile.Profile()
+            self._profiles.append(main_profile)
+            threading.setprofile(profile_thread)
+            main_profile.enable()
+
+        if self._samples_file:
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._stats_file:
+            import pstats
+
+            threading.setprofile(None)
+            for profile in self._profiles:
+                profile.disable()
+            stats = pstats.Stats(*self._profiles)
+            stats.dump_stats(self._stats_file)
+
+        if self._samples_file:
+            self._stopped.set()
+            self._sampler.join()
+            with open(self._samples_file, "w") as f:
+                for stack, count in sorted(self._samples.items()):
+                    f.write("%s %d\n" % (stack, count))
+
+    def _sample(self):
+        sampler_id = threading.get_ident()
+        while not self._stopped.wait(self._sampling_interval):
+            thread_names = dict((t.ident, t.name) for t in threading.enumerate())
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                self._samples[self._get_stack(thread_names.get(thread_id, "unknown"), frame)] += 1
+
+    @staticmethod
+    def _get_stack(thread_name, frame) -> str:
+        functions = []
+        while frame is not None:
+            code = frame.f_code
+            functions.append("%s (%s:%d)" % (code.co_name, code.co_filename.rsplit("/", 1)[-1], code.co_firstlineno))
+            frame = frame.f_back
+        # The numbers of the thread names are removed, so the stacks of the workers of a stage are merged, e.g. Thread-3 (_work).
+        return ";".join([re.sub(r"-[\d_]+$", "", thread_name.split(" ")[0])] + functions[::-1])
+
+
+profiler = Profiler()
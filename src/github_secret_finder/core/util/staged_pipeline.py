@@ -0,0 +1,133 @@
+import logging
+import queue
+import threading
+from typing import Callable, Iterable, List
+
+from .metrics import registry as metrics
+
+_end = object()
+_processed_items = metrics.counter("pipeline_processed_items_total", "Items processed by each stage of the pipelines.", ["stage"])
+_queue_depth = metrics.gauge("pipeline_queue_depth", "Items waiting in the queue of each stage of the pipelines.", ["stage"])
+
+
+class PipelineStage(object):
+    # The function returns the item passed to the next stage, or None to drop it.
+    def __init__(self, name, function: Callable, workers=1, queue_size=16):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.queue = queue.Queue(queue_size)
+        self.processed_count = 0
+        self.max_depth = 0
+        self._running_workers = 0
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def __str__(self):
+        return "%s: %d processed, queue depth %d (max %d of %d)" % (self.name, self.processed_count, self.depth, self.max_depth, self.queue.maxsize)
+
+
+class StagedPipeline(object):
+    # Bounded queues block the previous stage when a stage falls behind, so the number of items in memory stays bounded.
+    def __init__(self, stages: List[PipelineStage], output_queue_size=16):
+        self.stages = stages
+        self._output = queue.Queue(output_queue_size)
+        self._aborted = threading.Event()
+        self._error = None
+
+    def run(self, source: Iterable) -> Iterable:
+        threads = [threading.Thread(target=self._feed, args=(source,), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            next_queue = self.stages[i + 1].queue if i + 1 < len(self.stages) else self._output
+            next_workers = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            stage._running_workers = stage.workers
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(stage, next_queue, next_workers), daemon=True))
+
+        for t in threads:
+            t.start()
+
+        try:
+            while True:
+                item = self._get(self._output)
+                if item is _end or item is None:
+                    break
+                yield item
+        finally:
+            # Also reached when the consumer stops iterating.
+            self._aborted.set()
+            for t in threads:
+                t.join()
+            logging.info("Pipeline: %s." % ", ".join(str(s) for s in self.stages))
+
+        if self._error is not None:
+            raise self._error
+
+    def get_queue_depths(self):
+        return dict((s.name, s.depth) for s in self.stages)
+
+    def _feed(self, source: Iterable):
+        first_stage = self.stages[0]
+        try:
+            for item in source:
+                if not self._put(first_stage, first_stage.queue, item):
+                    return
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            for _ in range(first_stage.workers):
+                self._put(first_stage, first_stage.queue, _end)
+
+    def _work(self, stage: PipelineStage, next_queue: queue.Queue, next_workers):
+        next_stage = self.stages[self.stages.index(stage) + 1] if next_queue is not self._output else None
+        try:
+            while True:
+                item = self._get(stage.queue)
+                if item is _end or item is None:
+                    break
+
+                _queue_depth.set(stage.depth, stage.name)
+                result = stage.function(item)
+                with stage._lock:
+                    stage.processed_count += 1
+                _processed_items.inc(stage.name)
+                if result is not None and not self._put(next_stage, next_queue, result):
+                    break
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # The last worker of a stage ends the next one.
+            with stage._lock:
+                stage._running_workers -= 1
+                last_worker = stage._running_workers == 0
+            if last_worker:
+                for _ in range(next_workers):
+                    self._put(next_stage, next_queue, _end)
+
+    def _put(self, stage, target_queue: queue.Queue, item) -> bool:
+        while not self._aborted.is_set() or item is _end:
+            try:
+                target_queue.put(item, timeout=0.1)
+                if stage is not None:
+                    stage.max_depth = max(stage.max_depth, target_queue.qsize())
+                return True
+            except queue.Full:
+                if item is _end and self._aborted.is_set():
+                    return False
+        return False
+
+    def _get(self, source_queue: queue.Queue):
+        while not self._aborted.is_set():
+            try:
+                return source_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._aborted.set()
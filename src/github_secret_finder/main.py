@@ -3,12 +3,22 @@
 import argparse
 import logging
 import shutil
+import signal
 from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
 
-from core.scheduling import QueryScheduler
+from core.analysis import SecretVerifier
+from core.archive import PatchArchive, PatchRescanner
+from core.findings import FindingsDatabase
+from core.github.models import GITHUB_API_URL
+from core.maintenance import CacheMaintenance
+from core.scheduling import QueryScheduler, ContinuousScheduler, OperationLeaseQueue
 from core.secret_finder import SecretFinder
 from core.slack import SlackFindingSender
+from core.util.file_watcher import FileWatcher
+from core.util.metrics import registry as metrics, MetricsServer
+from core.util.profiler import profiler, RunProfiler
 
 
 def create_list_from_args(file_name, single_value = None):
@@ -27,6 +37,18 @@ def print_result(result):
     print("=" * 15)
     print(result.commit.html_url)
     print(result.secret.to_terminal_string(width))
+    print("Fingerprint: %s" % result.secret.get_fingerprint())
+    if result.verified is not None:
+        print("Verified: %s" % ("live" if result.verified else "revoked"))
+
+
+def print_occurrences(db_file, fingerprint):
+    findings_db = FindingsDatabase(db_file)
+    try:
+        for occurrence in findings_db.get_occurrences(fingerprint):
+            print("%s %s:%d" % (occurrence.commit.html_url, occurrence.file_name, occurrence.line_number))
+    finally:
+        findings_db.close()
 
 
 def create_slack_finding_sender(args, db_file):
@@ -36,9 +58,140 @@ def create_slack_finding_sender(args, db_file):
         return contextmanager(lambda: iter([None]))()
 
 
+def create_lease_queue(args, db_file):
+    if args.worker:
+        return OperationLeaseQueue(db_file, args.lease_duration)
+    else:
+        return contextmanager(lambda: iter([None]))()
+
+
+def create_patch_archive(args):
+    if args.patch_archive and not args.cache_only:
+        max_size = args.archive_max_size * 1000000 if args.archive_max_size else None
+        max_age = timedelta(days=args.archive_max_age) if args.archive_max_age else None
+        return PatchArchive(args.patch_archive, max_size, max_age)
+    else:
+        return contextmanager(lambda: iter([None]))()
+
+
+def rescan(args, db_file, slack_sender):
+    findings_db = FindingsDatabase(db_file)
+    try:
+        with create_patch_archive(args) as archive:
+            rescanner = PatchRescanner(archive, findings_db, args.blacklist_file)
+            for finding in rescanner.rescan():
+                print_result(finding)
+                if slack_sender:
+                    slack_sender.notify()
+
+            print("=" * 15)
+            print("Rescanned %d patches: %d findings added, %d retired, %d restored." % (rescanner.analyzed_count, rescanner.added_count, rescanner.retired_count, rescanner.restored_count))
+            print("Archive: %s" % archive.get_statistics())
+    finally:
+        findings_db.close()
+
+
+def create_secret_verifier(args, db_file):
+    if args.verify and not args.cache_only:
+        return SecretVerifier(db_file, args.verification_config)
+    else:
+        return contextmanager(lambda: iter([None]))()
+
+
+@contextmanager
+def collect_metrics(args):
+    if not (args.metrics or args.metrics_file or args.metrics_port):
+        yield
+        return
+
+    metrics.enabled = True
+    with MetricsServer(metrics, args.metrics_port) if args.metrics_port else contextmanager(lambda: iter([None]))():
+        try:
+            yield
+        finally:
+            if args.metrics_file:
+                metrics.write(args.metrics_file)
+            print("=" * 15)
+            print(metrics.get_summary())
+
+
+@contextmanager
+def profile_run(args):
+    if not (args.profile or args.profile_stats or args.profile_samples):
+        yield
+        return
+
+    profiler.enabled = True
+    profiler.top_count = args.profile_top
+    with RunProfiler(args.profile_stats, args.profile_samples):
+        try:
+            yield
+        finally:
+            print("=" * 15)
+            print(profiler.get_report())
+
+
+def get_inputs(args):
+    emails = create_list_from_args(args.emails, args.email)
+    names = create_list_from_args(args.names, args.name)
+    users = create_list_from_args(args.users, args.user)
+    organizations = create_list_from_args(args.organizations, args.organization)
+    return users, emails, names, organizations
+
+
+def run_maintenance(args, db_file):
+    with CacheMaintenance(db_file) as maintenance:
+        print(maintenance.get_size_report())
+        print("=" * 15)
+
+        # Without inputs, the monitored operations are unknown, so only the retention applies.
+        users, emails, names, organizations = get_inputs(args)
+        monitored_keys = None
+        if users or emails or names or organizations:
+            monitored_keys = QueryScheduler.get_operation_keys(users, emails, names, organizations)
+        max_age = timedelta(days=args.retention) if args.retention else None
+
+        operations = maintenance.get_stale_operations(monitored_keys, max_age)
+        for operation in operations:
+            print("Stale: %s (last started %s)" % (operation.key, "never" if operation.last_started == datetime.min else operation.last_started.strftime("%Y-%m-%d")))
+        if args.dry_run:
+            return
+
+        print(maintenance.prune(operations))
+        print("Compaction reclaimed %.1f MB." % (maintenance.compact() / 1e6))
+
+
+def run_daemon(args, finder, scheduler):
+    inputs_watcher = FileWatcher(args.users, args.emails, args.names, args.organizations)
+    blacklist_watcher = FileWatcher(args.blacklist_file)
+    inputs = get_inputs(args)
+
+    def before_cycle():
+        nonlocal inputs
+        if args.metrics_file:
+            metrics.write(args.metrics_file)
+        if inputs_watcher.has_changed():
+            logging.info("Reloading the monitored users, emails, names and organizations.")
+            inputs = get_inputs(args)
+        if blacklist_watcher.has_changed():
+            logging.info("Reloading the blacklist.")
+            finder.reload_blacklist(args.blacklist_file)
+        return inputs
+
+    daemon = ContinuousScheduler(scheduler, args.interval, before_cycle)
+
+    def stop(signum, frame):
+        logging.warning("Stopping after the current commit.")
+        daemon.stop()
+        finder.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    daemon.run()
+
+
 def main():
     default_blacklist = Path(__file__).parent / "data/default-blacklist.json"
-    database_file_name = "github-secret-finder.sqlite"
 
     parser = argparse.ArgumentParser(description='Github Secret Finder')
     parser.add_argument('--users', '-U', action='store', dest='users', help='File containing Github users to monitor.')
@@ -53,25 +206,88 @@ def main():
     parser.add_argument('--blacklist', '-B', action='store', dest='blacklist_file', default=default_blacklist, help='File containing regexes to blacklist file names. Defaults to default-blacklist.json')
     parser.add_argument('--slack-webhook', '-w', action="store", dest='slack_webhook', default=None, help="Slack webhook to send messages when secrets are found.")
     parser.add_argument('--results', '-r', action="store_true", dest='cache_only', default=False, help="Shows the previously found results.")
+    parser.add_argument('--occurrences', action="store", dest='fingerprint', default=None, help="Shows every commit containing the secret with this fingerprint.")
+    parser.add_argument('--daemon', '-d', action="store_true", dest='daemon', default=False, help="Keeps running and monitors continuously.")
+    parser.add_argument('--interval', '-i', action="store", dest='interval', type=int, default=3600, help="Minimum number of seconds between the start of two monitoring cycles in daemon mode. Defaults to 3600.")
+    parser.add_argument('--worker', '-W', action="store_true", dest='worker', default=False, help="Shares the operations with the other workers using the same database by leasing them.")
+    parser.add_argument('--lease-duration', action="store", dest='lease_duration', type=int, default=600, help="Number of seconds after which the operation of a worker that stopped responding is given to another worker. Defaults to 600.")
+    parser.add_argument('--merge-commits', action="store", dest='merge_commits', default=SecretFinder.MERGE_COMMITS_ANALYZE,
+                        choices=[SecretFinder.MERGE_COMMITS_ANALYZE, SecretFinder.MERGE_COMMITS_SKIP, SecretFinder.MERGE_COMMITS_CONFLICTS],
+                        help="Whether merge commits are analyzed, skipped or only analyzed for the lines added while resolving conflicts. Defaults to analyze.")
+    parser.add_argument('--graphql', '-G', action="store_true", dest='graphql', default=False, help="Lists the repositories and branches of organizations with the GraphQL API, which needs fewer calls.")
+    parser.add_argument('--patch-archive', '-P', action="store", dest='patch_archive', default=None, help="SQLite file in which the analyzed patches are archived, so they can be rescanned.")
+    parser.add_argument('--archive-max-size', action="store", dest='archive_max_size', type=int, default=None, help="Maximum size of the compressed patches in MB. The oldest patches are evicted first.")
+    parser.add_argument('--archive-max-age', action="store", dest='archive_max_age', type=int, default=None, help="Number of days after which an archived patch is evicted.")
+    parser.add_argument('--rescan', action="store_true", dest='rescan', default=False, help="Analyzes the archived patches again without calling the Github API, e.g. after changing the blacklist.")
+    parser.add_argument('--verify', action="store_true", dest='verify', default=False, help="Checks with their provider whether the secrets found are live.")
+    parser.add_argument('--verification-config', action="store", dest='verification_config', default=None, help="JSON file containing the rate (calls per second) and timeout (seconds) of the verifications by secret type.")
+    parser.add_argument('--repository-workers', action="store", dest='repository_workers', type=int, default=8, help="Maximum number of repositories of an organization scanned at the same time. Defaults to 8.")
+    parser.add_argument('--maintenance', action="store_true", dest='maintenance', default=False,
+                        help="Reports the size of the database, prunes the cache of the operations that are not in the inputs or older than the retention, and compacts the database.")
+    parser.add_argument('--retention', action="store", dest='retention', type=int, default=None, help="Number of days after which the cache of an operation that did not run is pruned by --maintenance.")
+    parser.add_argument('--dry-run', action="store_true", dest='dry_run', default=False, help="Only reports what --maintenance would prune.")
+    parser.add_argument('--metrics', action="store_true", dest='metrics', default=False, help="Collects metrics and prints a summary at the end of the run.")
+    parser.add_argument('--metrics-file', action="store", dest='metrics_file', default=None, help="File in which the metrics are written in the Prometheus text format, at the end of the run and of each daemon cycle.")
+    parser.add_argument('--metrics-port', action="store", dest='metrics_port', type=int, default=None, help="Local port on which the metrics are served in the Prometheus text format, at /metrics.")
+    parser.add_argument('--profile', action="store_true", dest='profile', default=False,
+                        help="Times each stage of the analysis of the commits, and prints the time of the stages and the slowest commits at the end of the run.")
+    parser.add_argument('--profile-top', action="store", dest='profile_top', type=int, default=20, help="Number of the slowest commits printed by --profile. Defaults to 20.")
+    parser.add_argument('--profile-stats', action="store", dest='profile_stats', default=None, help="File in which the cProfile statistics of the whole run are written, e.g. for pstats.")
+    parser.add_argument('--profile-samples', action="store", dest='profile_samples', default=None,
+                        help="File in which the stacks of every thread, sampled during the whole run, are written in the collapsed format of flame graphs.")
+    parser.add_argument('--api-url', action="store", dest='api_url', default=GITHUB_API_URL, help="Base URL of the Github API, e.g. a local stand-in for load tests. Defaults to %s" % GITHUB_API_URL)
+    parser.add_argument('--database', '-D', action="store", dest='database_file', default="github-secret-finder.sqlite", help="SQLite database file. Defaults to github-secret-finder.sqlite")
     parser.add_argument('--verbose', '-v', action="store_true", dest='verbose', default=False, help="Increases output verbosity.")
 
     args = parser.parse_args()
+    if args.daemon and args.cache_only:
+        parser.error("--daemon cannot be used with --results.")
+    if args.worker and args.cache_only:
+        parser.error("--worker cannot be used with --results.")
+    if args.rescan and not args.patch_archive:
+        parser.error("--rescan requires --patch-archive.")
+    if args.rescan and (args.cache_only or args.daemon):
+        parser.error("--rescan cannot be used with --results or --daemon.")
+
+    if args.maintenance and (args.cache_only or args.daemon or args.worker or args.rescan):
+        parser.error("--maintenance cannot be used with --results, --daemon, --worker or --rescan.")
+    if args.profile_top < 1:
+        parser.error("--profile-top must be at least 1.")
 
     if args.verbose:
         logging.getLogger("sqlitedict").setLevel(logging.ERROR)
         logging.getLogger().setLevel(logging.INFO)
 
-    emails = create_list_from_args(args.emails, args.email)
-    names = create_list_from_args(args.names, args.name)
-    users = create_list_from_args(args.users, args.user)
-    organizations = create_list_from_args(args.organizations, args.organization)
-
     tokens = [t.strip() for t in args.tokens.split(",")]
 
-    with create_slack_finding_sender(args, database_file_name):
-        with SecretFinder(tokens, database_file_name, args.blacklist_file, args.cache_only) as finder:
-            scheduler = QueryScheduler(finder.find_by_username, finder.find_by_email, finder.find_by_name, finder.find_by_organization, print_result, database_file_name, args.cache_only)
-            scheduler.execute(users, emails, names, organizations)
+    database_file_name = args.database_file
+    if args.fingerprint:
+        print_occurrences(database_file_name, args.fingerprint)
+        return
+
+    if args.maintenance:
+        run_maintenance(args, database_file_name)
+        return
+
+    if args.rescan:
+        with collect_metrics(args), profile_run(args), create_slack_finding_sender(args, database_file_name) as slack_sender:
+            rescan(args, database_file_name, slack_sender)
+        return
+
+    with collect_metrics(args), profile_run(args), create_slack_finding_sender(args, database_file_name) as slack_sender, create_lease_queue(args, database_file_name) as lease_queue, \
+            create_patch_archive(args) as patch_archive, create_secret_verifier(args, database_file_name) as secret_verifier:
+        def handle_result(result):
+            print_result(result)
+            if slack_sender:
+                slack_sender.notify()
+
+        with SecretFinder(tokens, database_file_name, args.blacklist_file, args.cache_only, args.graphql, args.merge_commits, patch_archive, secret_verifier,
+                          args.repository_workers, args.api_url) as finder:
+            scheduler = QueryScheduler(finder.find_by_username, finder.find_by_email, finder.find_by_name, finder.find_by_organization, handle_result, database_file_name, args.cache_only, lease_queue)
+            if args.daemon:
+                run_daemon(args, finder, scheduler)
+            else:
+                scheduler.execute(*get_inputs(args))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,44 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# The modules import each other from the core package, like when main.py is run.
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "github_secret_finder"))
+
+fixtures = Path(__file__).parent / "fixtures"
+
+
+def _get_key(method, url, body):
+    # GraphQL requests are told apart by their variables.
+    variables = body.get("variables") if isinstance(body, dict) else body
+    return method.lower(), url, json.dumps(variables, sort_keys=True)
+
+
+@pytest.fixture
+def recorded_api(monkeypatch):
+    # Replays the Github API responses recorded in a fixture. A request that was not recorded fails the test.
+    requested = []
+
+    def replay(fixture_name):
+        responses = dict((_get_key(e["method"], e["url"], e.get("body")), e) for e in json.loads((fixtures / fixture_name).read_text()))
+
+        def request(method, url, **kwargs):
+            entry = responses.get(_get_key(method, url, kwargs.get("json")))
+            assert entry is not None, "Not recorded: %s %s %s" % (method, url, kwargs.get("json"))
+            requested.append(entry)
+            response = requests.Response()
+            response.status_code = entry["status"]
+            response.headers = CaseInsensitiveDict(entry["headers"])
+            response.url = url
+            response.encoding = "utf-8"
+            response._content = json.dumps(entry["json"]).encode("utf-8")
+            return response
+
+        monkeypatch.setattr(requests, "request", request)
+        return requested
+
+    return replay
@@ -0,0 +1,51 @@
+from core.github import GithubGraphqlApiClient
+from core.scheduling.query_checkpoint import QueryCheckpoint
+
+
+def test_lists_repositories_of_all_pages(recorded_api):
+    recorded_api("graphql_organization.json")
+    client = GithubGraphqlApiClient(["token"])
+
+    repositories = list(client.get_organization_repositories("acme"))
+
+    assert [r.name for r in repositories] == ["acme/payments-api", "acme/web-storefront", "acme/infra-scripts", "acme/mobile-app", "acme/http-client"]
+    fork = repositories[-1]
+    assert fork.is_fork and fork.default_branch == "main" and fork.pushed_at == "2023-04-17T17:08:00Z"
+    assert fork.parent.name == "upstream-labs/http-client" and not fork.parent.is_fork
+
+
+def test_branches_listed_with_the_repositories_are_not_requested_again(recorded_api):
+    requested = recorded_api("graphql_organization.json")
+    client = GithubGraphqlApiClient(["token"])
+    repositories = dict((r.name, r) for r in client.get_organization_repositories("acme"))
+    request_count = len(requested)
+
+    branches = [(b.name, b.sha) for b in client.get_repository_branches(repositories["acme/mobile-app"])]
+
+    assert branches == [("main", "2a1dc72d8c0345b48def6bc14121af35d54530e1"), ("hotfix/login-crash", "361f8dc29d0dc7aaa960510ef5a391524b710ca7")]
+    assert len(requested) == request_count
+
+
+def test_branches_of_repositories_with_more_branches_and_of_fork_parents_are_queried(recorded_api):
+    requested = recorded_api("graphql_organization.json")
+    client = GithubGraphqlApiClient(["token"])
+    repositories = dict((r.name, r) for r in client.get_organization_repositories("acme"))
+
+    branches = [b.name for b in client.get_repository_branches(repositories["acme/payments-api"])]
+    parent_branches = [b.name for b in client.get_repository_branches(repositories["acme/http-client"].parent)]
+
+    assert branches == ["main", "feature/stripe-webhooks", "release/2.4"]
+    assert parent_branches == ["main"]
+    assert [r["body"]["variables"].get("name") for r in requested[-2:]] == ["payments-api", "http-client"]
+
+
+def test_repository_listing_resumes_from_the_checkpoint_cursor(recorded_api):
+    recorded_api("graphql_organization.json")
+    checkpoint = QueryCheckpoint("organization_acme")
+    listing = GithubGraphqlApiClient(["token"]).get_organization_repositories("acme", checkpoint)
+    for _ in range(4):
+        next(listing)
+
+    resumed = [r.name for r in GithubGraphqlApiClient(["token"]).get_organization_repositories("acme", checkpoint)]
+
+    assert resumed == ["acme/mobile-app", "acme/http-client"]
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import signal
+import time
+
+from sqlitedict import SqliteDict
+
+from core.scheduling import OperationLeaseQueue, QueryScheduler
+
+
+def test_lease_is_held_by_a_single_worker_until_released(tmp_path):
+    db_file = str(tmp_path / "leases.sqlite")
+    with OperationLeaseQueue(db_file, worker_id="a") as a, OperationLeaseQueue(db_file, worker_id="b") as b:
+        assert a.claim("organization_acme")
+        assert not b.claim("organization_acme")
+        assert a.get_leased_keys() == {"organization_acme"}
+
+        a.release("organization_acme")
+
+        assert b.claim("organization_acme")
+        assert not a.is_held("organization_acme")
+
+
+def test_expired_lease_is_claimable_by_another_worker(tmp_path):
+    db_file = str(tmp_path / "leases.sqlite")
+    a = OperationLeaseQueue(db_file, lease_duration=0.2, worker_id="a")
+    a.__enter__()
+    # The renewal of the leases stops, like in a worker that stopped responding.
+    a._stop_event.set()
+    a._thread.join()
+    with OperationLeaseQueue(db_file, worker_id="b") as b:
+        assert a.claim("organization_acme")
+        assert not b.claim("organization_acme")
+
+        time.sleep(0.3)
+
+        assert b.claim("organization_acme")
+    a._connection.close()
+
+
+def test_renewed_lease_does_not_expire(tmp_path):
+    db_file = str(tmp_path / "leases.sqlite")
+    with OperationLeaseQueue(db_file, lease_duration=0.3, worker_id="a") as a, OperationLeaseQueue(db_file, worker_id="b") as b:
+        assert a.claim("organization_acme")
+        time.sleep(0.6)
+
+        assert not b.claim("organization_acme")
+        assert a.is_held("organization_acme")
+
+
+def test_lost_lease_is_reported(tmp_path):
+    db_file = str(tmp_path / "leases.sqlite")
+    lost_keys = []
+    with OperationLeaseQueue(db_file, lease_duration=0.3, worker_id="a") as a:
+        assert a.claim("organization_acme", lost_keys.append)
+        with OperationLeaseQueue(db_file, worker_id="b") as b:
+            # Another worker claims the lease, e.g. after this one was paused longer than the lease.
+            b._connection.execute("UPDATE query_leases SET owner = 'b'")
+            time.sleep(0.3)
+
+        assert lost_keys == ["organization_acme"]
+        assert not a.is_held("organization_acme")
+
+
+def _run_worker(db_file, results_file, started_event):
+    def organization_query(organization, checkpoint):
+        # Like SecretFinder, stops between two commits once the operation is aborted.
+        for i in range(60):
+            if checkpoint.aborted:
+                return
+            started_event.set()
+            time.sleep(0.05)
+            yield i
+
+    def write_result(result):
+        with open(results_file, "a") as f:
+            f.write("%d\n" % result)
+
+    with OperationLeaseQueue(db_file, lease_duration=1) as lease_queue:
+        QueryScheduler(None, None, None, organization_query, write_result, db_file, False, lease_queue).execute([], [], [], ["acme"])
+
+
+def test_worker_that_lost_its_lease_aborts_the_operation(tmp_path):
+    db_file = str(tmp_path / "workers.sqlite")
+    paused_results, other_results = str(tmp_path / "paused.txt"), str(tmp_path / "other.txt")
+    context = multiprocessing.get_context("fork")
+    paused_started, other_started = context.Event(), context.Event()
+    paused_worker = context.Process(target=_run_worker, args=(db_file, paused_results, paused_started))
+    paused_worker.start()
+    assert paused_started.wait(10)
+
+    # The worker is paused for longer than its lease, so the other worker claims the operation.
+    os.kill(paused_worker.pid, signal.SIGSTOP)
+    time.sleep(1.5)
+    other_worker = context.Process(target=_run_worker, args=(db_file, other_results, other_started))
+    other_worker.start()
+    assert other_started.wait(10)
+    paused_result_count = len(open(paused_results).readlines())
+    os.kill(paused_worker.pid, signal.SIGCONT)
+
+    paused_worker.join(10)
+    other_worker.join(10)
+    assert paused_worker.exitcode == 0 and other_worker.exitcode == 0
+    # The paused worker stops within a renewal of its lease, while the other worker runs the whole operation.
+    assert len(open(paused_results).readlines()) - paused_result_count <= 10
+    assert len(open(other_results).readlines()) == 60
+    with SqliteDict(db_file, tablename=QueryScheduler.QUERY_LOG_TABLE) as db:
+        assert db["organization_acme"].last_completed > db["organization_acme"].last_started - (db["organization_acme"].last_started - db["organization_acme"].last_completed)
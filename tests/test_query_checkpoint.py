@@ -0,0 +1,86 @@
+import pickle
+from datetime import datetime
+
+from core.github.models import GithubCommit
+from core.scheduling import QueryScheduler
+from core.scheduling.query_checkpoint import QueryCheckpoint
+
+
+def create_commit(i):
+    sha = "%040x" % i
+    return GithubCommit(sha, "https://api.github.com/repos/acme/api/commits/" + sha, "https://github.com/acme/api/commit/" + sha, datetime(2023, 1, 1))
+
+
+def test_pending_commits_are_saved_periodically():
+    saves = []
+    checkpoint = QueryCheckpoint("organization_acme")
+    checkpoint.save_interval = 3600
+    checkpoint.attach(lambda c: saves.append(pickle.dumps(c)))
+
+    for i in range(1000):
+        checkpoint.add_pending_commit(create_commit(i))
+        checkpoint.remove_pending_commit(create_commit(i))
+
+    assert len(saves) == 2000 // QueryCheckpoint.max_unsaved_changes
+
+
+def test_changes_are_saved_after_the_save_interval(monkeypatch):
+    saves = []
+    now = [0]
+    monkeypatch.setattr("core.scheduling.query_checkpoint.time.monotonic", lambda: now[0])
+    checkpoint = QueryCheckpoint("organization_acme")
+    checkpoint.attach(saves.append)
+
+    checkpoint.set_page("https://api.github.com/repos/acme/api/commits", "https://api.github.com/repos/acme/api/commits?page=2")
+    now[0] = QueryCheckpoint.save_interval
+    checkpoint.set_page("https://api.github.com/repos/acme/api/commits", "https://api.github.com/repos/acme/api/commits?page=3")
+
+    assert len(saves) == 1
+
+
+def test_saved_checkpoint_keeps_its_progress():
+    checkpoint = QueryCheckpoint("organization_acme")
+    checkpoint.set_repositories_listed()
+    checkpoint.complete_repository("acme/web")
+    repository_checkpoint = checkpoint.get_repository_checkpoint("acme/api")
+    repository_checkpoint.set_branch("main")
+    repository_checkpoint.set_page("https://api.github.com/repos/acme/api/commits", "https://api.github.com/repos/acme/api/commits?page=2")
+    checkpoint.save_repository_checkpoint("acme/api", repository_checkpoint)
+    checkpoint.add_pending_commit(create_commit(1))
+    checkpoint.attach(lambda c: None)
+
+    loaded = pickle.loads(pickle.dumps(checkpoint))
+
+    assert loaded.repositories_listed and loaded.completed_repositories == {"acme/web"}
+    assert list(loaded.pending_commits) == [create_commit(1).sha]
+    resumed_repository = loaded.get_repository_checkpoint("acme/api")
+    assert resumed_repository.branch == "main"
+    assert resumed_repository.get_page("https://api.github.com/repos/acme/api/commits") == "https://api.github.com/repos/acme/api/commits?page=2"
+
+
+def test_interrupted_operation_resumes_from_its_checkpoint(tmp_path):
+    db_file = str(tmp_path / "scheduler.sqlite")
+    pages = ["page1", "page2", "page3"]
+    received_checkpoints = []
+
+    def organization_query(organization, checkpoint):
+        received_checkpoints.append(checkpoint)
+        for page in checkpoint.resume_from("query", pages, lambda p: p):
+            checkpoint.set_query(page)
+            checkpoint.add_pending_commit(create_commit(pages.index(page)))
+            yield page
+
+    results = []
+
+    def stop_after_second_page(result):
+        results.append(result)
+        if result == "page2":
+            scheduler.stop()
+
+    scheduler = QueryScheduler(None, None, None, organization_query, stop_after_second_page, db_file, False)
+    scheduler.execute([], [], [], ["acme"])
+    scheduler = QueryScheduler(None, None, None, organization_query, results.append, db_file, False)
+    scheduler.execute([], [], [], ["acme"])
+
+    assert results == ["page1", "page2", "page2", "page3"]
+    assert set(received_checkpoints[1].pending_commits) == {create_commit(0).sha, create_commit(1).sha, create_commit(2).sha}